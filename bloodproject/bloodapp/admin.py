@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Marker, HealthCondition, BloodTestReport, MarkerReading
+from .models import Marker, HealthCondition, BloodTestReport, MarkerReading, LLMUsage
 
 class MarkerAdmin(admin.ModelAdmin):
     list_display = ['name', 'display_name', 'standard_min', 'standard_max', 'standard_unit']
@@ -32,7 +32,25 @@ class HealthConditionAdmin(admin.ModelAdmin):
         })
     )
 
+class LLMUsageAdmin(admin.ModelAdmin):
+    """Read-only: usage rows are append-only."""
+    list_display = ['created_at', 'user', 'stage', 'call_site', 'model', 'prompt_tokens', 'completion_tokens',
+                    'latency_ms', 'cache_hit', 'succeeded']
+    list_filter = ['stage', 'call_site', 'model', 'cache_hit', 'succeeded']
+    search_fields = ['user__username']
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 admin.site.register(Marker, MarkerAdmin)
 admin.site.register(HealthCondition, HealthConditionAdmin)
 admin.site.register(BloodTestReport)
-admin.site.register(MarkerReading)
\ No newline at end of file
+admin.site.register(MarkerReading)
+admin.site.register(LLMUsage, LLMUsageAdmin)
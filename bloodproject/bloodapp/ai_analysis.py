@@ -0,0 +1,312 @@
+"""
+LLM calls of the patient flow: likely conditions from the marker analysis,
+per-condition risk scores and the treatment plan (blocking and streamed), each
+parsed against its schema in bloodapp.llm_json.
+
+Importing this module has no side effects; the LLM client, and the OpenAI SDK
+behind it, is created on the first call (bloodapp.llm). The a-prefixed
+coroutines are the async views' variants of the same calls.
+"""
+
+import json
+import time
+from typing import Dict, List, Optional
+
+from .condition_markers import find_health_condition
+from .llm import get_async_llm_client, get_llm_client
+from .llm_json import (
+    LLMJSONError,
+    JSONObjectSectionParser,
+    ResponseSchema,
+    HEALTH_CONDITIONS_SCHEMA,
+    RISK_SCORE_SCHEMA,
+    TREATMENT_PLAN_SCHEMA,
+    parse_llm_json,
+    reask_prompt,
+    record_reask,
+)
+from .llm_usage import record_llm_usage
+from .metrics import observe_llm_call
+from .models import HealthCondition
+from .profiling import profile_section
+
+
+def get_risk_score_for_condition(prompt, condition_name=None):
+    """
+    Calculate risk score for a condition, optionally including expert comments
+    
+    Args:
+        prompt: The analysis prompt
+        condition_name: Optional condition name to include expert comments
+    """
+    client = get_llm_client()
+    
+    # Get expert comments if condition is provided
+    expert_context = ""
+    if condition_name:
+        condition = find_health_condition(condition_name)
+        if condition and condition.expert_comment_markers:
+            expert_context = f"\n\nEXPERT COMMENTARY (IFM CP Functional Medicine Practitioner):\n{condition.expert_comment_markers}\n\nUse this expert commentary to weight the importance of different markers when calculating the risk score."
+    
+    system_prompt = "You are a medical assistant calculating risk scores."
+    if expert_context:
+        system_prompt += expert_context
+    
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt}
+    ]
+    return chat_json(client, messages, RISK_SCORE_SCHEMA, call_site='risk_score')
+
+
+def _record_call(call_site: str, model: str, started: float, succeeded: bool, usage=None):
+    seconds = time.perf_counter() - started
+    observe_llm_call(call_site, seconds, succeeded, usage)
+    record_llm_usage(call_site, model, seconds, usage, succeeded=succeeded)
+
+
+def complete(client, call_site: str, **kwargs):
+    """One chat completion, timed into the request profile, the LLM metrics and the usage table."""
+    started = time.perf_counter()
+    response = None
+    try:
+        with profile_section('llm'):
+            response = client.chat.completions.create(**kwargs)
+        return response
+    finally:
+        _record_call(call_site, kwargs.get('model'), started, response is not None, getattr(response, 'usage', None))
+
+
+async def acomplete(client, call_site: str, **kwargs):
+    """complete() for an async client."""
+    started = time.perf_counter()
+    response = None
+    try:
+        with profile_section('llm'):
+            response = await client.chat.completions.create(**kwargs)
+        return response
+    finally:
+        _record_call(call_site, kwargs.get('model'), started, response is not None, getattr(response, 'usage', None))
+
+
+def chat_json(client, messages: List[Dict], schema: ResponseSchema, call_site: str, model: str = "gpt-4o-mini"):
+    """
+    Run a chat completion and parse the reply against ``schema``.
+
+    Replies are repaired where possible; only unrepairable output triggers one
+    targeted re-ask that shows the model its previous reply. Raises LLMJSONError
+    if the re-ask is unusable too.
+    """
+    response = complete(client, call_site, model=model, messages=messages)
+    content = response.choices[0].message.content
+    try:
+        return parse_llm_json(content, schema, call_site)
+    except LLMJSONError as e:
+        started = time.monotonic()
+        retry_messages = messages + [
+            {"role": "assistant", "content": content or ""},
+            {"role": "user", "content": reask_prompt(schema, e)},
+        ]
+        response = complete(client, call_site, model=model, messages=retry_messages)
+        record_reask(call_site, time.monotonic() - started)
+        return parse_llm_json(response.choices[0].message.content, schema, call_site)
+
+
+async def achat_json(client, messages: List[Dict], schema: ResponseSchema, call_site: str, model: str = "gpt-4o-mini"):
+    """chat_json() for an async client: same parsing and single re-ask, awaiting the completions."""
+    response = await acomplete(client, call_site, model=model, messages=messages)
+    content = response.choices[0].message.content
+    try:
+        return parse_llm_json(content, schema, call_site)
+    except LLMJSONError as e:
+        started = time.monotonic()
+        retry_messages = messages + [
+            {"role": "assistant", "content": content or ""},
+            {"role": "user", "content": reask_prompt(schema, e)},
+        ]
+        response = await acomplete(client, call_site, model=model, messages=retry_messages)
+        record_reask(call_site, time.monotonic() - started)
+        return parse_llm_json(response.choices[0].message.content, schema, call_site)
+
+
+def safe_json_loads(content, schema: Optional[ResponseSchema] = None, call_site: str = 'safe_json_loads'):
+    """
+    Cleans GPT response (code fences, surrounding prose, single quotes, truncation) and loads JSON safely.
+    """
+    return parse_llm_json(content, schema, call_site)
+
+
+def _health_conditions_messages(analysis_text, condition_ids, candidates=None):
+    """Build the chat messages shared by the blocking and async health conditions calls."""
+    system_prompt = (
+        "You are a medical reasoning assistant. "
+        "Given a blood analysis, predict likely conditions ONLY from this EXACT list of condition IDs: "
+        f"{condition_ids}. "
+        "CRITICAL: You MUST use the EXACT condition_id values from this list. "
+        "Do not modify, misspell, or create variations of these IDs. "
+        "If you need to reference a condition that's not in this list, include it as-is in your response "
+        "but note that it will be handled separately. "
+        "Return JSON like: [{'condition_id': 'hypothyroidism', 'level_of_risk': 'High', 'explanation': '...'}]."
+    )
+    user_prompt = f"Here is the analysis:\n\n{analysis_text}"
+    if candidates:
+        system_prompt += (
+            " The conditions were pre-screened from the patient's marker deviations and are ranked by score; "
+            "drop any the analysis does not support and explain the rest."
+        )
+        ranking = "\n".join(
+            f"- {c.condition_id} (score {c.score}): " + ", ".join(f"{name} {direction}" for name, direction, _ in c.hits)
+            for c in candidates
+        )
+        user_prompt += f"\n\nPre-screen ranking:\n{ranking}"
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def get_health_conditions_from_analysis(analysis_text, candidates=None):
+    """
+    Ask the LLM which known conditions the analysis points to; returns a list of condition dicts.
+
+    candidates: optional ranked shortlist from screening.screen_conditions(). When given, the LLM
+    only chooses among (and explains) those conditions instead of the whole catalog.
+    """
+    client = get_llm_client()
+
+    if candidates:
+        condition_ids = [c.condition_id for c in candidates]
+    else:
+        condition_ids = [cid for cid in HealthCondition.objects.values_list('condition_id', flat=True) if cid]
+
+    messages = _health_conditions_messages(analysis_text, condition_ids, candidates)
+    return chat_json(client, messages, HEALTH_CONDITIONS_SCHEMA, call_site='health_conditions')
+
+
+async def aget_health_conditions_from_analysis(analysis_text, candidates=None):
+    """Async variant of get_health_conditions_from_analysis (async ORM and LLM client)."""
+    client = get_async_llm_client()
+
+    if candidates:
+        condition_ids = [c.condition_id for c in candidates]
+    else:
+        condition_ids = [cid async for cid in HealthCondition.objects.values_list('condition_id', flat=True) if cid]
+
+    messages = _health_conditions_messages(analysis_text, condition_ids, candidates)
+    return await achat_json(client, messages, HEALTH_CONDITIONS_SCHEMA, call_site='health_conditions')
+
+
+def _treatment_plan_messages(detailed_analyses, supplement_list, other_conditions=None):
+    """Build the chat messages shared by the blocking and streaming treatment plan calls."""
+    system_prompt = (
+        "You are a medical assistant creating personalized treatment plans. "
+        "Given the patient's detailed risk analyses for each condition (with explanations and risk scores), "
+        "any additional conditions that couldn't be matched to our database, "
+        "and a list of supplements (with names and links), return a JSON object with three parts: "
+        "1. Nutrition: bullet points (with an option to expand for context), "
+        "2. Lifestyle changes: bullet points (with an option to expand for context), "
+        "3. Supplements: a table with supplement name, link, and regularity (e.g., morning, after [specific meal], before bed, twice daily, etc.). "
+        "Consider ALL conditions mentioned, including the 'other conditions' when creating the treatment plan. "
+        "Respond ONLY with JSON."
+    )
+    
+    user_prompt_parts = [
+        f"Detailed analyses: {json.dumps(detailed_analyses, ensure_ascii=False)}",
+        f"Supplements: {json.dumps(supplement_list, ensure_ascii=False)}"
+    ]
+    
+    if other_conditions:
+        user_prompt_parts.append(f"Other conditions to consider: {json.dumps(other_conditions, ensure_ascii=False)}")
+    
+    user_prompt = "\n".join(user_prompt_parts)
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def get_treatment_plan(detailed_analyses, supplement_list, other_conditions=None):
+    """
+    Calls OpenAI to generate a treatment plan in JSON with Nutrition, Lifestyle changes, and Supplements.
+    detailed_analyses: list of dicts, each with condition_id, risk_score, detailed_explanation
+    supplement_list: list of dicts, each with name, link
+    other_conditions: list of dicts, each with name, level_of_risk, explanation (for unmatched conditions)
+    """
+    client = get_llm_client()
+    messages = _treatment_plan_messages(detailed_analyses, supplement_list, other_conditions)
+    return chat_json(client, messages, TREATMENT_PLAN_SCHEMA, call_site='treatment_plan')
+
+
+async def aget_treatment_plan(detailed_analyses, supplement_list, other_conditions=None):
+    """Async variant of get_treatment_plan."""
+    client = get_async_llm_client()
+    messages = _treatment_plan_messages(detailed_analyses, supplement_list, other_conditions)
+    return await achat_json(client, messages, TREATMENT_PLAN_SCHEMA, call_site='treatment_plan')
+
+
+def stream_treatment_plan(detailed_analyses, supplement_list, other_conditions=None):
+    """
+    Streaming variant of get_treatment_plan.
+
+    Yields (section_name, value) pairs (e.g. "Nutrition", "Lifestyle changes",
+    "Supplements") as soon as each top-level section of the JSON plan has been
+    received, instead of waiting for the whole completion.
+    """
+    client = get_llm_client()
+    model = "gpt-4o-mini"
+    started = time.perf_counter()
+    succeeded = False
+    usage = None
+    try:
+        stream = client.chat.completions.create(
+            model=model,
+            messages=_treatment_plan_messages(detailed_analyses, supplement_list, other_conditions),
+            stream=True,
+            # The API then ends the stream with a chunk carrying the token usage (and no choices)
+            stream_options={"include_usage": True},
+        )
+        parser = JSONObjectSectionParser()
+        for chunk in stream:
+            usage = getattr(chunk, 'usage', None) or usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield from parser.feed(delta)
+        # Recover sections the incremental pass could not close (e.g. truncated output)
+        yield from parser.finish()
+        succeeded = True
+    finally:
+        # Timed to the last section
+        _record_call('treatment_plan_stream', model, started, succeeded, usage)
+
+
+async def astream_treatment_plan(detailed_analyses, supplement_list, other_conditions=None):
+    """Async variant of stream_treatment_plan (an async generator of the same pairs)."""
+    client = get_async_llm_client()
+    model = "gpt-4o-mini"
+    started = time.perf_counter()
+    succeeded = False
+    usage = None
+    try:
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=_treatment_plan_messages(detailed_analyses, supplement_list, other_conditions),
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        parser = JSONObjectSectionParser()
+        async for chunk in stream:
+            usage = getattr(chunk, 'usage', None) or usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                for item in parser.feed(delta):
+                    yield item
+        for item in parser.finish():
+            yield item
+        succeeded = True
+    finally:
+        _record_call('treatment_plan_stream', model, started, succeeded, usage)
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class BloodappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bloodapp'
+
+    def ready(self):
+        from .catalog import connect_catalog_signals
+        from .db_connections import connect_db_connection_signals
+        from .profiling import connect_profiling_signals
+        connect_catalog_signals()
+        connect_db_connection_signals()
+        connect_profiling_signals()
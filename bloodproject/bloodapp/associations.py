@@ -0,0 +1,132 @@
+"""
+Compiled condition x marker association matrix.
+
+HealthCondition.associated_markers_low / associated_markers_high are compiled
+into one sparse matrix with a sign per entry (LOW = -1, HIGH = +1), stored
+CSR-style (row pointers into flat column/sign arrays) for "which markers does
+this condition involve", plus the same entries column-major (CSC) for reverse
+lookups such as "which conditions involve this marker deviating high".
+
+It is built from two bulk queries, one per through table, and cached per
+catalog version (see bloodapp.catalog), so callers never walk the M2M
+relations one condition at a time.
+"""
+
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .catalog import get_versioned
+
+LOW = -1
+HIGH = 1
+_SIGNS = {'low': LOW, 'high': HIGH}
+
+
+def _sign_for(direction: Optional[str]) -> Optional[int]:
+    if direction is None:
+        return None
+    try:
+        return _SIGNS[direction.lower()]
+    except KeyError:
+        raise ValueError(f"direction must be 'low' or 'high', got {direction!r}")
+
+
+class AssociationMatrix:
+    """Sparse conditions x markers matrix; rows and columns are condition / marker primary keys."""
+
+    def __init__(self, entries: Iterable[Tuple[int, str, int, str, int]]):
+        """entries: (condition pk, condition_id, marker pk, marker name, sign), in display order."""
+        rows: Dict[int, List[Tuple[int, int]]] = {}
+        self.condition_ids: Dict[int, str] = {}
+        self.marker_names: Dict[int, str] = {}
+        for condition_pk, condition_id, marker_pk, marker_name, sign in entries:
+            rows.setdefault(condition_pk, []).append((marker_pk, sign))
+            self.condition_ids[condition_pk] = condition_id
+            self.marker_names[marker_pk] = marker_name
+        self.condition_pks: Dict[str, int] = {cid: pk for pk, cid in self.condition_ids.items() if cid}
+        self.marker_pks: Dict[str, int] = {name: pk for pk, name in self.marker_names.items()}
+
+        # CSR: row r spans indices[indptr[r]:indptr[r + 1]]
+        self.row_keys: List[int] = list(rows)
+        self.row_of: Dict[int, int] = {pk: r for r, pk in enumerate(self.row_keys)}
+        self.indptr = array('l', [0])
+        self.indices = array('l')
+        self.signs = array('b')
+        for pk in self.row_keys:
+            for marker_pk, sign in rows[pk]:
+                self.indices.append(marker_pk)
+                self.signs.append(sign)
+            self.indptr.append(len(self.indices))
+
+        # CSC: column c spans col_rows[col_indptr[c]:col_indptr[c + 1]]
+        columns: Dict[int, List[Tuple[int, int]]] = {}
+        for r, pk in enumerate(self.row_keys):
+            for i in range(self.indptr[r], self.indptr[r + 1]):
+                columns.setdefault(self.indices[i], []).append((pk, self.signs[i]))
+        self.col_keys: List[int] = sorted(columns)
+        self.col_of: Dict[int, int] = {pk: c for c, pk in enumerate(self.col_keys)}
+        self.col_indptr = array('l', [0])
+        self.col_rows = array('l')
+        self.col_signs = array('b')
+        for marker_pk in self.col_keys:
+            for condition_pk, sign in columns[marker_pk]:
+                self.col_rows.append(condition_pk)
+                self.col_signs.append(sign)
+            self.col_indptr.append(len(self.col_rows))
+
+    @property
+    def nnz(self) -> int:
+        return len(self.indices)
+
+    def row(self, condition_pk: int) -> List[Tuple[int, int]]:
+        """(marker pk, sign) entries of a condition."""
+        r = self.row_of.get(condition_pk)
+        if r is None:
+            return []
+        start, end = self.indptr[r], self.indptr[r + 1]
+        return list(zip(self.indices[start:end], self.signs[start:end]))
+
+    def column(self, marker_pk: int) -> List[Tuple[int, int]]:
+        """(condition pk, sign) entries of a marker."""
+        c = self.col_of.get(marker_pk)
+        if c is None:
+            return []
+        start, end = self.col_indptr[c], self.col_indptr[c + 1]
+        return list(zip(self.col_rows[start:end], self.col_signs[start:end]))
+
+    def marker_pks_for(self, condition_pk: int, direction: Optional[str] = None) -> List[int]:
+        sign = _sign_for(direction)
+        return [m for m, s in self.row(condition_pk) if sign is None or s == sign]
+
+    def markers_for(self, condition_id: str, direction: Optional[str] = None) -> List[str]:
+        """Names of the markers associated with a condition, optionally only its 'low' or 'high' side."""
+        pk = self.condition_pks.get(condition_id)
+        if pk is None:
+            return []
+        return [self.marker_names[m] for m in self.marker_pks_for(pk, direction)]
+
+    def conditions_for(self, marker_name: str, direction: Optional[str] = None) -> List[str]:
+        """condition_ids involving a marker, optionally only when it deviates 'low' or 'high'."""
+        pk = self.marker_pks.get(marker_name)
+        if pk is None:
+            return []
+        sign = _sign_for(direction)
+        return [self.condition_ids[c] for c, s in self.column(pk) if sign is None or s == sign]
+
+
+def _build_association_matrix() -> AssociationMatrix:
+    from .models import HealthCondition
+
+    entries = []
+    for sign, through in ((LOW, HealthCondition.associated_markers_low.through),
+                          (HIGH, HealthCondition.associated_markers_high.through)):
+        rows = through.objects.order_by('healthcondition_id', 'marker_id').values_list(
+            'healthcondition_id', 'healthcondition__condition_id', 'marker_id', 'marker__name')
+        entries.extend((condition_pk, condition_id, marker_pk, marker_name, sign)
+                       for condition_pk, condition_id, marker_pk, marker_name in rows)
+    return AssociationMatrix(entries)
+
+
+def get_association_matrix() -> AssociationMatrix:
+    """Process-wide association matrix for the current catalog version."""
+    return get_versioned('association_matrix', _build_association_matrix)
@@ -0,0 +1,204 @@
+"""
+Two-tier cache: a per-process LRU in front of the shared Django cache.
+
+Each TwoTierCache is a namespace. Reads check the process-local LRU first,
+then the shared backend (CACHES['default']: local memory, a directory shared
+by the workers, or Redis; see SHARED_CACHE in settings), and fill the LRU from
+it. get_or_set() recomputes a missing value once: concurrent callers in the
+same process wait for the thread already building it, and across processes a
+short lock in the shared cache lets one worker build while the others poll
+for its result (stampede protection).
+
+Namespaces created with versioned=True put the catalog version into every
+key, so an import or admin edit of markers/conditions (bump_catalog_version)
+switches every process to fresh keys; the old entries simply expire. Values
+must be treated as read-only: the local tier hands out the cached object
+itself, and a delete() only reaches other processes' LRUs when their local
+entry expires (local_timeout). Hits and misses per tier are counted per
+namespace (cache_stats()).
+"""
+
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .catalog import get_catalog_version
+
+_MISSING = object()
+_registry: Dict[str, 'TwoTierCache'] = {}
+_registry_lock = threading.Lock()
+
+
+class LocalLRU:
+    """Thread-safe LRU of (expires_at, value) with a maximum entry count."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[0] < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, timeout: float):
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TwoTierCache:
+    """A cache namespace backed by a per-process LRU and the shared Django cache."""
+
+    def __init__(self, namespace: str, timeout: Optional[int] = None, local_timeout: Optional[int] = None,
+                 local_max_entries: Optional[int] = None, versioned: bool = False, alias: str = 'default'):
+        self.namespace = namespace
+        self.timeout = timeout if timeout is not None else getattr(settings, 'TWO_TIER_CACHE_TIMEOUT', 3600)
+        self.local_timeout = local_timeout if local_timeout is not None else getattr(
+            settings, 'TWO_TIER_CACHE_LOCAL_TIMEOUT', 300)
+        self.versioned = versioned
+        self.alias = alias
+        self.local = LocalLRU(local_max_entries or getattr(settings, 'TWO_TIER_CACHE_LOCAL_MAX_ENTRIES', 1000))
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+        self._building: Dict[str, threading.Event] = {}
+        self._building_lock = threading.Lock()
+        with _registry_lock:
+            _registry[namespace] = self
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def make_key(self, key) -> str:
+        if self.versioned:
+            return f'{self.namespace}:v{get_catalog_version()}:{key}'
+        return f'{self.namespace}:{key}'
+
+    def get(self, key, default=None):
+        full_key = self.make_key(key)
+        value = self.local.get(full_key)
+        if value is not _MISSING:
+            self._count('local_hits')
+            return value
+        value = self.shared.get(full_key, _MISSING)
+        if value is not _MISSING:
+            self._count('shared_hits')
+            self.local.set(full_key, value, self.local_timeout)
+            return value
+        self._count('misses')
+        return default
+
+    def set(self, key, value, timeout: Optional[int] = None):
+        full_key = self.make_key(key)
+        self.shared.set(full_key, value, timeout if timeout is not None else self.timeout)
+        self.local.set(full_key, value, min(self.local_timeout, timeout or self.timeout))
+
+    def delete(self, key):
+        full_key = self.make_key(key)
+        self.local.delete(full_key)
+        self.shared.delete(full_key)
+
+    def get_or_set(self, key, builder: Callable, timeout: Optional[int] = None, lock_timeout: float = 30):
+        """Cached value for key, building it with builder() once on a miss (single-flight)."""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        full_key = self.make_key(key)
+
+        # In this process: one thread builds, the others wait for it
+        with self._building_lock:
+            event = self._building.get(full_key)
+            leader = event is None
+            if leader:
+                event = self._building[full_key] = threading.Event()
+        if not leader:
+            self._count('waits')
+            event.wait(lock_timeout)
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+            return self._build(key, builder, timeout)
+
+        try:
+            # Across processes: whoever adds the lock key builds; the others poll for the result
+            lock_key = f'{full_key}:building'
+            if not self.shared.add(lock_key, 1, lock_timeout):
+                self._count('waits')
+                deadline = time.monotonic() + lock_timeout
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    value = self.shared.get(full_key, _MISSING)
+                    if value is not _MISSING:
+                        self.local.set(full_key, value, self.local_timeout)
+                        return value
+                return self._build(key, builder, timeout)
+            try:
+                return self._build(key, builder, timeout)
+            finally:
+                self.shared.delete(lock_key)
+        finally:
+            with self._building_lock:
+                self._building.pop(full_key, None)
+            event.set()
+
+    def _build(self, key, builder: Callable, timeout: Optional[int]):
+        self._count('builds')
+        value = builder()
+        self.set(key, value, timeout)
+        return value
+
+    def clear_local(self):
+        self.local.clear()
+
+    def snapshot(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        lookups = sum(stats.get(name, 0) for name in ('local_hits', 'shared_hits', 'misses'))
+        hits = stats.get('local_hits', 0) + stats.get('shared_hits', 0)
+        return {
+            **{name: stats.get(name, 0) for name in ('local_hits', 'shared_hits', 'misses', 'builds', 'waits')},
+            'hit_ratio': round(hits / lookups, 4) if lookups else None,
+            'local_hit_ratio': round(stats.get('local_hits', 0) / lookups, 4) if lookups else None,
+            'local_entries': len(self.local),
+        }
+
+
+def cache_stats() -> Dict[str, Dict]:
+    """Per-namespace hit/miss counters of this process."""
+    with _registry_lock:
+        namespaces = dict(_registry)
+    return {name: namespaces[name].snapshot() for name in sorted(namespaces)}
+
+
+# Namespaces used by the app
+catalog_cache = TwoTierCache('catalog', versioned=True, timeout=86400)
+report_cache = TwoTierCache('report', timeout=getattr(settings, 'REPORT_CACHE_TIMEOUT', 3600))
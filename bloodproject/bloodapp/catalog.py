@@ -0,0 +1,93 @@
+"""
+Catalog version for the reference data (markers, health conditions and the
+links between them).
+
+Structures derived from the catalog (the condition matcher, for example) are
+built once per version with get_versioned() instead of on every request. The
+version lives in a single CatalogVersion row so a bump made by an import
+command or an admin edit reaches every worker; each process re-reads it at
+most every CATALOG_VERSION_TTL seconds.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.models import F
+
+_state = {'version': None, 'checked_at': 0.0}
+_built = {}
+_lock = threading.Lock()
+_batch = threading.local()
+
+
+def _ttl() -> float:
+    return float(getattr(settings, 'CATALOG_VERSION_TTL', 5))
+
+
+def get_catalog_version() -> int:
+    """Current catalog version, re-read from the database at most once per TTL."""
+    now = time.monotonic()
+    if _state['version'] is not None and now - _state['checked_at'] < _ttl():
+        return _state['version']
+    from .models import CatalogVersion
+    version = CatalogVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+    _state['version'] = version
+    _state['checked_at'] = now
+    return version
+
+
+def bump_catalog_version() -> int:
+    """Invalidate everything derived from the catalog, in every process."""
+    from .models import CatalogVersion
+    if not CatalogVersion.objects.filter(pk=1).update(version=F('version') + 1):
+        CatalogVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+    _state['version'] = None
+    return get_catalog_version()
+
+
+@contextmanager
+def catalog_batch():
+    """Bump the version once at the end of a bulk edit instead of once per saved row."""
+    depth = getattr(_batch, 'depth', 0)
+    _batch.depth = depth + 1
+    try:
+        yield
+    finally:
+        _batch.depth = depth
+        if depth == 0:
+            bump_catalog_version()
+
+
+def get_versioned(name: str, builder):
+    """Return builder() memoized per process for the current catalog version."""
+    version = get_catalog_version()
+    entry = _built.get(name)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    with _lock:
+        entry = _built.get(name)
+        if entry is None or entry[0] != version:
+            entry = (version, builder())
+            _built[name] = entry
+    return entry[1]
+
+
+def _on_catalog_change(sender, **kwargs):
+    if kwargs.get('raw') or getattr(_batch, 'depth', 0):
+        return
+    if kwargs.get('action', 'post_').startswith('pre_'):
+        return
+    bump_catalog_version()
+
+
+def connect_catalog_signals():
+    from django.db.models.signals import m2m_changed, post_delete, post_save
+    from .models import HealthCondition, Marker
+
+    for model in (Marker, HealthCondition):
+        post_save.connect(_on_catalog_change, sender=model, dispatch_uid=f'catalog_save_{model.__name__}')
+        post_delete.connect(_on_catalog_change, sender=model, dispatch_uid=f'catalog_delete_{model.__name__}')
+    for through in (HealthCondition.associated_markers_low.through, HealthCondition.associated_markers_high.through):
+        m2m_changed.connect(_on_catalog_change, sender=through, dispatch_uid=f'catalog_m2m_{through.__name__}')
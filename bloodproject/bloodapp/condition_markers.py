@@ -0,0 +1,497 @@
+"""
+Condition-marker associations: lookups and edits used by manage_markers.py and
+the expert-comment workflow, and the per-condition marker context that goes
+into risk-score prompts.
+"""
+
+import json
+from typing import Dict, List, Optional
+
+from .associations import get_association_matrix
+from .cache import catalog_cache
+from .models import Marker, HealthCondition, MARKER_NARRATIVE_LOW_FIELDS, MARKER_NARRATIVE_HIGH_FIELDS
+
+
+def load_health_conditions_data():
+    return {"health_conditions": list(HealthCondition.objects.all().values())}
+
+
+def get_all_markers() -> List[Marker]:
+    """Get all available markers"""
+    return Marker.objects.all()
+
+
+def get_all_health_conditions() -> List[HealthCondition]:
+    """Get all health conditions"""
+    return HealthCondition.objects.all()
+
+
+def find_health_condition(condition_name: str) -> Optional[HealthCondition]:
+    """Find a health condition by name or condition_id"""
+    return (
+        HealthCondition.objects.filter(name__icontains=condition_name).first() or
+        HealthCondition.objects.filter(condition_id__icontains=condition_name).first()
+    )
+
+
+def get_health_condition(condition_id: str) -> Optional[HealthCondition]:
+    """Health condition by exact condition_id, cached per catalog version (treat as read-only)."""
+    # Unknown IDs come straight from URLs: answer them from the ID list instead of caching a miss per ID
+    if condition_id not in get_condition_display_names():
+        return None
+    return catalog_cache.get_or_set(
+        f'condition:{condition_id}',
+        lambda: HealthCondition.objects.filter(condition_id=condition_id).first(),
+    )
+
+
+def get_condition_display_names() -> Dict[str, str]:
+    """condition_id -> display name (falling back to name) for the whole catalog, cached per catalog version."""
+    def build():
+        return {
+            cid: display_name or name
+            for cid, display_name, name in HealthCondition.objects.exclude(condition_id__isnull=True).values_list(
+                'condition_id', 'display_name', 'name')
+        }
+    return catalog_cache.get_or_set('condition_display_names', build)
+
+
+def find_marker(marker_name: str) -> Optional[Marker]:
+    """Find a marker by name"""
+    return Marker.objects.filter(name__icontains=marker_name).first()
+
+
+def add_markers_to_condition(
+    condition_name: str, 
+    markers: List[str], 
+    marker_type: str
+) -> Dict[str, any]:
+    """
+    Add markers to a health condition
+    
+    Args:
+        condition_name: Name or ID of the health condition
+        markers: List of marker names to add
+        marker_type: 'low' or 'high'
+    
+    Returns:
+        Dict with success status and details
+    """
+    condition = find_health_condition(condition_name)
+    if not condition:
+        return {
+            'success': False,
+            'error': f'Health condition "{condition_name}" not found'
+        }
+    
+    if marker_type not in ['low', 'high']:
+        return {
+            'success': False,
+            'error': 'marker_type must be "low" or "high"'
+        }
+    
+    marker_field = (
+        condition.associated_markers_low if marker_type == 'low' 
+        else condition.associated_markers_high
+    )
+    
+    markers_to_add = []
+    not_found = []
+    
+    for marker_name in markers:
+        marker = find_marker(marker_name)
+        if marker:
+            markers_to_add.append(marker)
+        else:
+            not_found.append(marker_name)
+    
+    if markers_to_add:
+        marker_field.add(*markers_to_add)
+    
+    return {
+        'success': True,
+        'condition': condition.name or condition.condition_id,
+        'added': [m.name for m in markers_to_add],
+        'not_found': not_found,
+        'total_added': len(markers_to_add)
+    }
+
+
+def remove_markers_from_condition(
+    condition_name: str, 
+    markers: List[str], 
+    marker_type: str
+) -> Dict[str, any]:
+    """
+    Remove markers from a health condition
+    
+    Args:
+        condition_name: Name or ID of the health condition
+        markers: List of marker names to remove
+        marker_type: 'low' or 'high'
+    
+    Returns:
+        Dict with success status and details
+    """
+    condition = find_health_condition(condition_name)
+    if not condition:
+        return {
+            'success': False,
+            'error': f'Health condition "{condition_name}" not found'
+        }
+    
+    if marker_type not in ['low', 'high']:
+        return {
+            'success': False,
+            'error': 'marker_type must be "low" or "high"'
+        }
+    
+    marker_field = (
+        condition.associated_markers_low if marker_type == 'low' 
+        else condition.associated_markers_high
+    )
+    
+    markers_to_remove = []
+    not_found = []
+    
+    for marker_name in markers:
+        marker = find_marker(marker_name)
+        if marker:
+            markers_to_remove.append(marker)
+        else:
+            not_found.append(marker_name)
+    
+    if markers_to_remove:
+        marker_field.remove(*markers_to_remove)
+    
+    return {
+        'success': True,
+        'condition': condition.name or condition.condition_id,
+        'removed': [m.name for m in markers_to_remove],
+        'not_found': not_found,
+        'total_removed': len(markers_to_remove)
+    }
+
+
+def get_condition_markers(condition_name: str) -> Dict[str, any]:
+    """
+    Get all markers associated with a health condition
+    
+    Args:
+        condition_name: Name or ID of the health condition
+    
+    Returns:
+        Dict with low and high markers and expert comments
+    """
+    condition = find_health_condition(condition_name)
+    if not condition:
+        return {
+            'success': False,
+            'error': f'Health condition "{condition_name}" not found'
+        }
+    
+    matrix = get_association_matrix()
+    return {
+        'success': True,
+        'condition': condition.name or condition.condition_id,
+        'low_markers': [matrix.marker_names[pk] for pk in matrix.marker_pks_for(condition.pk, 'low')],
+        'high_markers': [matrix.marker_names[pk] for pk in matrix.marker_pks_for(condition.pk, 'high')],
+        'expert_comment_markers': condition.expert_comment_markers
+    }
+
+
+def list_all_conditions_with_markers() -> List[Dict[str, any]]:
+    """
+    Get all health conditions with their associated markers
+    
+    Returns:
+        List of dicts with condition info, markers, and expert comments
+    """
+    conditions = get_all_health_conditions().only('name', 'condition_id', 'expert_comment_markers')
+    matrix = get_association_matrix()
+    result = []
+    
+    for condition in conditions:
+        result.append({
+            'name': condition.name or condition.condition_id,
+            'condition_id': condition.condition_id,
+            'low_markers': [matrix.marker_names[pk] for pk in matrix.marker_pks_for(condition.pk, 'low')],
+            'high_markers': [matrix.marker_names[pk] for pk in matrix.marker_pks_for(condition.pk, 'high')],
+            'expert_comment_markers': condition.expert_comment_markers
+        })
+    
+    return result
+
+
+def get_expert_comments_for_risk_assessment(condition_name: str) -> Dict[str, any]:
+    """
+    Get expert comments for risk assessment of a specific condition
+    
+    Args:
+        condition_name: Name or ID of the health condition
+    
+    Returns:
+        Dict with expert comments for risk assessment
+    """
+    condition = find_health_condition(condition_name)
+    if not condition:
+        return {
+            'success': False,
+            'error': f'Health condition "{condition_name}" not found'
+        }
+    
+    return {
+        'success': True,
+        'condition': condition.name or condition.condition_id,
+        'expert_comment_markers': condition.expert_comment_markers,
+        'has_expert_comments': bool(condition.expert_comment_markers)
+    }
+
+
+def set_expert_comment(
+    condition_name: str, 
+    comment: str
+) -> Dict[str, any]:
+    """
+    Set expert comment for a health condition's markers
+    
+    Args:
+        condition_name: Name or ID of the health condition
+        comment: Expert comment text
+    
+    Returns:
+        Dict with success status and details
+    """
+    condition = find_health_condition(condition_name)
+    if not condition:
+        return {
+            'success': False,
+            'error': f'Health condition "{condition_name}" not found'
+        }
+    
+    try:
+        condition.expert_comment_markers = comment
+        condition.save()
+        
+        return {
+            'success': True,
+            'condition': condition.name or condition.condition_id,
+            'comment': comment
+        }
+        
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
+def import_markers_from_json(json_file_path: str) -> Dict[str, any]:
+    """
+    Import marker associations from a JSON file
+    
+    Expected JSON format:
+    {
+        "condition_name": {
+            "low_markers": ["marker1", "marker2"],
+            "high_markers": ["marker3", "marker4"],
+            "expert_comment_markers": "Expert comment on marker importance"
+        }
+    }
+    """
+    try:
+        with open(json_file_path, 'r') as f:
+            data = json.load(f)
+        
+        results = []
+        for condition_name, marker_data in data.items():
+            condition_result = {
+                'condition': condition_name,
+                'low_markers': {'success': False, 'error': ''},
+                'high_markers': {'success': False, 'error': ''},
+                'expert_comments': {'success': False, 'error': ''}
+            }
+            
+            # Add low markers
+            if 'low_markers' in marker_data and marker_data['low_markers']:
+                low_result = add_markers_to_condition(
+                    condition_name, 
+                    marker_data['low_markers'], 
+                    'low'
+                )
+                condition_result['low_markers'] = low_result
+            
+            # Add high markers
+            if 'high_markers' in marker_data and marker_data['high_markers']:
+                high_result = add_markers_to_condition(
+                    condition_name, 
+                    marker_data['high_markers'], 
+                    'high'
+                )
+                condition_result['high_markers'] = high_result
+            
+            # Set expert comments
+            if 'expert_comment_markers' in marker_data:
+                comment_result = set_expert_comment(
+                    condition_name, 
+                    marker_data['expert_comment_markers']
+                )
+                condition_result['expert_comments'] = comment_result
+            
+            results.append(condition_result)
+        
+        return {
+            'success': True,
+            'results': results
+        }
+        
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
+# Example usage functions
+def example_add_markers():
+    """Example of how to add markers to a condition"""
+    result = add_markers_to_condition(
+        condition_name="iron_deficiency_anemia",
+        markers=["Ferritin", "Iron"],
+        marker_type="low"
+    )
+    print(f"Result: {result}")
+
+
+def example_list_conditions():
+    """Example of how to list all conditions with markers"""
+    conditions = list_all_conditions_with_markers()
+    for condition in conditions:
+        print(f"\n{condition['name']}:")
+        print(f"  Low markers: {', '.join(condition['low_markers'])}")
+        print(f"  High markers: {', '.join(condition['high_markers'])}")
+
+
+def _resolve_ranges_for_marker(marker: Marker, unit_system: str) -> Dict[str, Optional[float]]:
+    """Helper to pick appropriate normal/optimal ranges based on unit system."""
+    unit_sys = (unit_system or 'standard').lower()
+    if unit_sys == 'international':
+        normal_min = marker.standard_min_international if marker.standard_min_international is not None else marker.standard_min
+        normal_max = marker.standard_max_international if marker.standard_max_international is not None else marker.standard_max
+        optimal_min = marker.optimal_min_international if marker.optimal_min_international is not None else marker.optimal_min
+        optimal_max = marker.optimal_max_international if marker.optimal_max_international is not None else marker.optimal_max
+        unit = marker.international_unit or marker.standard_unit or ''
+    else:
+        normal_min = marker.standard_min_conventional if marker.standard_min_conventional is not None else marker.standard_min
+        normal_max = marker.standard_max_conventional if marker.standard_max_conventional is not None else marker.standard_max
+        optimal_min = marker.optimal_min_conventional if marker.optimal_min_conventional is not None else marker.optimal_min
+        optimal_max = marker.optimal_max_conventional if marker.optimal_max_conventional is not None else marker.optimal_max
+        unit = marker.standard_unit or marker.international_unit or ''
+
+    return {
+        'normal_min': normal_min,
+        'normal_max': normal_max,
+        'optimal_min': optimal_min,
+        'optimal_max': optimal_max,
+        'unit': unit,
+    }
+
+
+def build_condition_marker_context(
+    condition: HealthCondition,
+    patient_values_by_name: Dict[str, float],
+    unit_system_by_name: Dict[str, str],
+    default_unit: str = 'standard'
+) -> str:
+    """
+    Build a comprehensive textual context for all markers associated with the given condition.
+
+    For each associated marker (low/high):
+    - Include patient's value and both optimal and normal ranges (based on per-marker unit system, defaulting to 'standard').
+    - Include marker background and discussion.
+    - Include the relevant high/low narrative depending on the patient's direction:
+        * If patient's value is above optimal → include HIGH narratives only.
+        * If below optimal → include LOW narratives only.
+        * If within optimal → include BOTH high and low narratives.
+      If no patient value is provided, include BOTH for context.
+    - Note the condition's association side for this marker (HIGH/LOW) if applicable.
+    """
+    lines: List[str] = []
+
+    matrix = get_association_matrix()
+    assoc_low = set(matrix.marker_pks_for(condition.pk, 'low'))
+    assoc_high = set(matrix.marker_pks_for(condition.pk, 'high'))
+
+    # The raw narrative columns are only needed to render narrative_low/high on save
+    raw_narrative_fields = [f for f, _ in MARKER_NARRATIVE_LOW_FIELDS + MARKER_NARRATIVE_HIGH_FIELDS]
+    marker_pks = list(dict.fromkeys(matrix.marker_pks_for(condition.pk)))  # low then high, unique
+    markers_by_pk = Marker.objects.defer(*raw_narrative_fields).in_bulk(marker_pks) if marker_pks else {}
+    ordered_markers: List[Marker] = [markers_by_pk[pk] for pk in marker_pks if pk in markers_by_pk]
+
+    if not ordered_markers:
+        return "No associated markers defined for this condition."
+
+    lines.append(f"Condition: {condition.display_name or condition.name or condition.condition_id}")
+    if condition.background:
+        lines.append(f"Condition background: {condition.background}")
+
+    for marker in ordered_markers:
+        val_present = marker.name in patient_values_by_name
+        value = patient_values_by_name.get(marker.name)
+        unit_system = unit_system_by_name.get(marker.name, default_unit)
+        ranges = _resolve_ranges_for_marker(marker, unit_system)
+
+        optimal_min = ranges['optimal_min']
+        optimal_max = ranges['optimal_max']
+        normal_min = ranges['normal_min']
+        normal_max = ranges['normal_max']
+        unit = ranges['unit'] or ''
+
+        # Determine direction vs optimal
+        in_optimal = (
+            optimal_min is not None and optimal_max is not None and
+            val_present and optimal_min <= value <= optimal_max
+        )
+        direction = None
+        if val_present and optimal_min is not None and optimal_max is not None:
+            if value < optimal_min:
+                direction = 'low'
+            elif value > optimal_max:
+                direction = 'high'
+            else:
+                direction = 'optimal'
+
+        # Condition association flags
+        assoc_label_parts: List[str] = []
+        if marker.id in assoc_low:
+            assoc_label_parts.append('LOW')
+        if marker.id in assoc_high:
+            assoc_label_parts.append('HIGH')
+        assoc_label = '/'.join(assoc_label_parts) if assoc_label_parts else '—'
+
+        lines.append(f"\n[Marker: {marker.display_name} ({marker.name})]  Condition association: {assoc_label}")
+        if val_present:
+            lines.append(
+                f" - Patient: {value}{(' ' + unit) if unit else ''} | Optimal: {optimal_min}-{optimal_max} | Normal: {normal_min}-{normal_max}"
+            )
+        else:
+            lines.append(
+                f" - Patient: (no value) | Optimal: {optimal_min}-{optimal_max} | Normal: {normal_min}-{normal_max}"
+            )
+
+        if marker.background:
+            lines.append(f" - Background: {marker.background}")
+        if marker.discussion:
+            lines.append(f" - Discussion: {marker.discussion}")
+
+        # Include relevant narrative (pre-rendered per marker on save)
+        if direction == 'low':
+            blocks = (marker.narrative_low,)
+        elif direction == 'high':
+            blocks = (marker.narrative_high,)
+        else:
+            # within optimal or no value → include both for context
+            blocks = (marker.narrative_low, marker.narrative_high)
+        lines.extend(block for block in blocks if block)
+
+    return "\n".join(lines)
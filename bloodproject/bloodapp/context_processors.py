@@ -0,0 +1,16 @@
+from django.conf import settings
+
+from .catalog import get_catalog_version
+
+
+def catalog(request):
+    """Catalog version and timeout for {% cache %} fragments of reference content.
+
+    Fragments showing only catalog data (marker ranges and backgrounds, condition
+    symptom lists) are keyed by catalog_version, so a reimport switches every
+    page to fresh fragments without clearing the cache.
+    """
+    return {
+        'catalog_version': get_catalog_version(),
+        'fragment_cache_timeout': getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 86400),
+    }
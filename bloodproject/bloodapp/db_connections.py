@@ -0,0 +1,120 @@
+"""
+Database connection churn counters and connection release helpers.
+
+Counts, per process, how many connections Django opened against how many
+requests it served; with persistent or pooled connections
+connections_per_request should stay well below 1. connection_created fires on
+every new connection, or on every checkout with DB_POOL on, where the pool's
+own statistics give the real count. Threads outside the request cycle (risk
+tasks) and async views parked on the LLM give their connections back with
+close_thread_connections() / release_connections(), which are counted too.
+connection_stats() is served to staff by the db_connection_stats view.
+"""
+
+import os
+import threading
+import time
+from collections import Counter
+from typing import Dict
+
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_lock = threading.Lock()
+_counts = Counter()
+_started_at = time.time()
+
+
+def _count(key: str, n: int = 1):
+    with _lock:
+        _counts[key] += n
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _count(f'opened:{connection.alias}')
+
+
+def _on_request_started(sender, **kwargs):
+    _count('requests')
+
+
+def connect_db_connection_signals():
+    connection_created.connect(_on_connection_created, dispatch_uid='bloodapp.db_connections.created')
+    request_started.connect(_on_request_started, dispatch_uid='bloodapp.db_connections.request')
+
+
+def _close(conn, reason: str):
+    was_open = conn.connection is not None
+    conn.close()
+    if was_open:
+        _count(f'closed:{reason}')
+
+
+def close_thread_connections():
+    """Close (or return to the pool) every connection of the calling thread; for threads outside requests."""
+    for conn in connections.all(initialized_only=True):
+        _close(conn, 'background')
+
+
+def release_connections():
+    """Close the calling thread's connections that are not inside a transaction; the next query reopens one."""
+    for conn in connections.all(initialized_only=True):
+        if not conn.in_atomic_block:
+            _close(conn, 'released')
+
+
+def close_connections_before_fork():
+    """Close every connection and shut down connection pools, so forked workers open their own."""
+    for conn in connections.all(initialized_only=True):
+        conn.close()
+        # A pool's maintenance threads don't survive fork(), and its sockets must not be shared
+        close_pool = getattr(conn, 'close_pool', None)
+        if close_pool is not None:
+            close_pool()
+
+
+def _pool_stats(alias: str):
+    conn = connections[alias]
+    if not conn.settings_dict.get('OPTIONS', {}).get('pool'):
+        return None
+    try:
+        return conn.pool.get_stats()
+    except Exception as e:
+        return {'error': str(e)}
+
+
+def connection_stats() -> Dict:
+    """This process's connection counters, plus psycopg pool statistics for pooled aliases."""
+    with _lock:
+        counts = dict(_counts)
+    requests = counts.pop('requests', 0)
+    opened = {key.split(':', 1)[1]: n for key, n in counts.items() if key.startswith('opened:')}
+    closed = {key.split(':', 1)[1]: n for key, n in counts.items() if key.startswith('closed:')}
+    databases = {}
+    total_opened = 0
+    for alias in connections:
+        settings_dict = connections.settings[alias]
+        pool = _pool_stats(alias)
+        entry = {
+            'conn_max_age': settings_dict.get('CONN_MAX_AGE'),
+            'conn_health_checks': settings_dict.get('CONN_HEALTH_CHECKS'),
+            'pool': pool,
+        }
+        if pool is not None:
+            # With a pool connection_created fires per checkout; real connections come from the pool
+            entry['checkouts'] = opened.get(alias, 0)
+            entry['opened'] = pool.get('connections_num', 0)
+        else:
+            entry['opened'] = opened.get(alias, 0)
+        total_opened += entry['opened']
+        databases[alias] = entry
+    return {
+        'pid': os.getpid(),
+        'uptime_seconds': round(time.time() - _started_at, 1),
+        'requests': requests,
+        'connections_opened': total_opened,
+        'connections_per_request': round(total_opened / requests, 3) if requests else None,
+        'connections_closed': closed,
+        'databases': databases,
+    }
@@ -0,0 +1,221 @@
+"""
+Liveness and readiness state for /healthz, /readyz and /health/.
+
+Liveness needs no I/O: a process that can answer is alive. Readiness comes
+from dependency checks that a background thread runs every
+READINESS_REFRESH_INTERVAL seconds; the probe views only read the last
+result, so probes never open a database connection themselves. The process
+is ready when the database answers, every migration is applied, the catalog
+is loaded with this process's matcher and association matrix built for the
+current version (warm-up), and the shared cache answers. Risk task backlog is
+reported but does not affect readiness (tasks run in worker threads, not in
+an external queue).
+
+Gunicorn workers start the checks from the post_worker_init hook and wait
+up to READINESS_STARTUP_WAIT seconds for the first round, so a new or
+recycled worker serves its first probe with a real result; other servers
+(runserver, standalone uvicorn) start them on the first probe. Until the
+first round finishes the status is "starting"; a result older than
+READINESS_TTL (the refresher is stuck, e.g. on a hung database) counts as
+not ready.
+
+/health/ keeps its original meaning, database reachable: it answers from the
+last database check while that is fresh and queries the database itself
+otherwise.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.utils import timezone
+
+from .db_connections import close_thread_connections
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_CHECKS = ('database', 'migrations', 'catalog', 'cache')
+
+_started_at = time.time()
+_status: Optional[Dict] = None
+_refresher_pid: Optional[int] = None
+_refresher_lock = threading.Lock()
+_published = threading.Event()
+_migrations_applied = False
+
+
+def _reset_after_fork():
+    # A forked worker checks its own dependencies and warm-up; nothing is inherited
+    global _started_at, _status, _refresher_pid, _refresher_lock, _published
+    _started_at = time.time()
+    _status = None
+    _refresher_pid = None
+    _refresher_lock = threading.Lock()
+    _published = threading.Event()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def liveness() -> Dict:
+    return {'status': 'alive', 'pid': os.getpid(), 'uptime_seconds': round(time.time() - _started_at, 1)}
+
+
+def check_database() -> Dict:
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    return {'ok': True, 'vendor': connection.vendor}
+
+
+def check_migrations() -> Dict:
+    # Applied migrations stay applied, so the loader only runs until they are
+    global _migrations_applied
+    if not _migrations_applied:
+        from django.db.migrations.executor import MigrationExecutor
+
+        executor = MigrationExecutor(connection)
+        pending = executor.migration_plan(executor.loader.graph.leaf_nodes())
+        if pending:
+            names = [f'{m.app_label}.{m.name}' for m, _ in pending]
+            return {'ok': False, 'pending_count': len(names), 'pending': names[:10]}
+        _migrations_applied = True
+    return {'ok': True}
+
+
+def check_catalog() -> Dict:
+    from .associations import get_association_matrix
+    from .catalog import get_catalog_version
+    from .matching import get_condition_matcher
+    from .models import HealthCondition, Marker
+
+    markers, conditions = Marker.objects.count(), HealthCondition.objects.count()
+    if not markers or not conditions:
+        return {'ok': False, 'markers': markers, 'conditions': conditions, 'reason': 'catalog not imported'}
+    # Builds them on the first round (warm-up), then only after a catalog change
+    get_condition_matcher()
+    get_association_matrix()
+    return {'ok': True, 'markers': markers, 'conditions': conditions, 'version': get_catalog_version()}
+
+
+def check_cache() -> Dict:
+    cache = caches['default']
+    key = f'readiness:{os.getpid()}'
+    cache.set(key, 1, 60)
+    if cache.get(key) != 1:
+        return {'ok': False, 'reason': 'value not read back'}
+    return {'ok': True}
+
+
+def check_risk_tasks() -> Dict:
+    from .models import RiskComputationTask
+
+    stuck_before = timezone.now() - timedelta(seconds=getattr(settings, 'RISK_TASK_STUCK_SECONDS', 600))
+    pending = RiskComputationTask.objects.filter(status__in=['queued', 'running'])
+    return {
+        'ok': True,
+        'queued': pending.filter(status='queued').count(),
+        'running': pending.filter(status='running').count(),
+        'stuck': pending.filter(status='running', updated_at__lt=stuck_before).count(),
+    }
+
+
+CHECKS: Dict[str, Callable[[], Dict]] = {
+    'database': check_database,
+    'migrations': check_migrations,
+    'catalog': check_catalog,
+    'cache': check_cache,
+    'risk_tasks': check_risk_tasks,
+}
+
+
+def refresh_status() -> Dict:
+    """Run every check once and publish the result."""
+    global _status
+    checks = {}
+    for name, check in CHECKS.items():
+        started = time.perf_counter()
+        try:
+            result = check()
+        except Exception as e:
+            logger.warning('Readiness check %s failed: %s', name, e)
+            result = {'ok': False, 'error': type(e).__name__}
+        result['ms'] = round((time.perf_counter() - started) * 1000, 1)
+        checks[name] = result
+    ready = all(checks[name]['ok'] for name in REQUIRED_CHECKS)
+    _status = {'ready': ready, 'checked_at': time.time(), 'checks': checks}
+    _published.set()
+    return _status
+
+
+def _refresh_loop(interval: float):
+    while True:
+        try:
+            refresh_status()
+        finally:
+            # A thread outside the request cycle: give the connection back every round
+            close_thread_connections()
+        time.sleep(interval)
+
+
+def ensure_refresher():
+    """Start this process's background checks if they are not running (each forked worker starts its own)."""
+    global _refresher_pid
+    pid = os.getpid()
+    if _refresher_pid == pid:
+        return
+    with _refresher_lock:
+        if _refresher_pid == pid:
+            return
+        _refresher_pid = pid
+        interval = getattr(settings, 'READINESS_REFRESH_INTERVAL', 5)
+        threading.Thread(target=_refresh_loop, args=(interval,), name='readiness', daemon=True).start()
+
+
+def start_readiness_checks(wait: Optional[float] = None) -> bool:
+    """Start the background checks at worker boot and wait up to ``wait`` seconds for the first result."""
+    ensure_refresher()
+    if wait is None:
+        wait = getattr(settings, 'READINESS_STARTUP_WAIT', 10)
+    return _published.wait(wait)
+
+
+def _fresh_status() -> Optional[Dict]:
+    status = _status
+    if status is None or time.time() - status['checked_at'] > getattr(settings, 'READINESS_TTL', 30):
+        return None
+    return status
+
+
+def database_health() -> Dict:
+    """The database check for /health/: the last background result while fresh, else a query of its own."""
+    ensure_refresher()
+    status = _fresh_status()
+    if status is not None:
+        return status['checks']['database']
+    try:
+        return check_database()
+    except Exception as e:
+        return {'ok': False, 'error': str(e)}
+
+
+def readiness() -> Dict:
+    """The last published readiness, without any I/O; 'status' is ready, starting, not_ready or stale."""
+    ensure_refresher()
+    status = _status
+    if status is None:
+        return {'status': 'starting', 'ready': False, 'uptime_seconds': round(time.time() - _started_at, 1)}
+    age = time.time() - status['checked_at']
+    stale = age > getattr(settings, 'READINESS_TTL', 30)
+    ready = status['ready'] and not stale
+    return {
+        'status': 'ready' if ready else ('stale' if stale else 'not_ready'),
+        'ready': ready,
+        'age_seconds': round(age, 1),
+        'checks': status['checks'],
+    }
@@ -0,0 +1,88 @@
+"""
+Pluggable LLM backend.
+
+All LLM calls go through get_llm_client(), which returns an object exposing the
+OpenAI SDK surface the app uses (``client.chat.completions.create(...)``,
+optionally with ``stream=True``). The backend is picked by ``settings.LLM_BACKEND``:
+
+- ``openai`` (default): the OpenAI SDK, imported lazily. ``OPENAI_BASE_URL`` /
+  ``settings.LLM_BASE_URL`` can point it at any OpenAI-compatible server, such
+  as the stub started by ``manage.py run_llm_stub``.
+- ``fake``: an in-process stand-in (bloodapp.llm_fake) that returns
+  schema-valid responses derived from the prompt, with configurable latency
+  and error rates. No network, no API key.
+
+get_async_llm_client() is the asyncio counterpart used by the async views
+(``await client.chat.completions.create(...)``): AsyncOpenAI, or the fake's
+async variant. Its HTTP connection pool belongs to an event loop, so one
+client is kept per running loop.
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+
+from django.conf import settings
+
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _build_client(backend: str):
+    if backend == 'fake':
+        from .llm_fake import FakeLLMClient
+        return FakeLLMClient.from_settings()
+    if backend == 'openai':
+        from openai import OpenAI
+        return OpenAI(
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            base_url=getattr(settings, 'LLM_BASE_URL', None) or None,
+        )
+    raise ValueError(f"Unknown LLM_BACKEND {backend!r}; expected 'openai' or 'fake'")
+
+
+def _build_async_client(backend: str):
+    if backend == 'fake':
+        from .llm_fake import AsyncFakeLLMClient
+        return AsyncFakeLLMClient.from_settings()
+    if backend == 'openai':
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            base_url=getattr(settings, 'LLM_BASE_URL', None) or None,
+        )
+    raise ValueError(f"Unknown LLM_BACKEND {backend!r}; expected 'openai' or 'fake'")
+
+
+def _client_settings_key():
+    return (
+        getattr(settings, 'LLM_BACKEND', 'openai'),
+        getattr(settings, 'LLM_BASE_URL', None),
+        repr(sorted(getattr(settings, 'LLM_FAKE', {}).items())),
+    )
+
+
+def get_llm_client():
+    """Return the process-wide client for the configured LLM backend."""
+    global _client, _client_key
+    key = _client_settings_key()
+    if _client is None or _client_key != key:
+        with _client_lock:
+            if _client is None or _client_key != key:
+                _client = _build_client(key[0])
+                _client_key = key
+    return _client
+
+
+def get_async_llm_client():
+    """Return the async client for the configured LLM backend, one per running event loop."""
+    loop = asyncio.get_running_loop()
+    key = _client_settings_key()
+    cached = _async_clients.get(loop)
+    if cached is None or cached[0] != key:
+        cached = (key, _build_async_client(key[0]))
+        _async_clients[loop] = cached
+    return cached[1]
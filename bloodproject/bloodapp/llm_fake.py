@@ -0,0 +1,305 @@
+"""
+Offline stand-in for the OpenAI chat completions API.
+
+FakeLLMClient mimics ``client.chat.completions.create(...)`` (blocking and
+``stream=True``) and answers each of the app's four LLM flows with a
+schema-valid reply derived from the prompt (AsyncFakeLLMClient is the
+awaitable variant, like AsyncOpenAI):
+
+- health conditions: picks condition IDs from the list embedded in the system prompt
+- risk score: scores from the out-of-range markers and "Yes" quiz answers in the prompt
+- treatment plan: Nutrition / Lifestyle changes / Supplements built from the inputs
+- PDF marker mapping: finds known marker names followed by a number in the PDF text
+
+Latency, error rate and the share of deliberately malformed (but repairable)
+replies are configurable through ``settings.LLM_FAKE`` so load tests can model
+a realistic provider. Replies are deterministic for a given prompt.
+"""
+
+import ast
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+DEFAULT_FAKE_SETTINGS = {
+    'LATENCY_MS': 0,           # mean latency of a whole completion
+    'LATENCY_JITTER_MS': 0,    # +/- uniform jitter around the mean
+    'ERROR_RATE': 0.0,         # share of calls raising FakeLLMError
+    'MALFORMED_RATE': 0.0,     # share of replies wrapped in prose / single quotes
+    'STREAM_CHUNK_CHARS': 24,  # characters per streamed delta
+    'SEED': None,
+}
+
+
+class FakeLLMError(RuntimeError):
+    """Injected provider failure (stands in for rate limits and 5xx responses)."""
+
+
+def _stable_int(text: str) -> int:
+    return int(hashlib.sha1(text.encode('utf-8')).hexdigest()[:12], 16)
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text or '') // 4)
+
+
+# ---------------------------------------------------------------------------
+# Reply builders, one per call site
+# ---------------------------------------------------------------------------
+
+def _reply_health_conditions(system: str, user: str) -> object:
+    match = re.search(r'condition IDs: (\[.*?\])\.', system, re.DOTALL)
+    try:
+        condition_ids = ast.literal_eval(match.group(1)) if match else []
+    except (ValueError, SyntaxError):
+        condition_ids = []
+    if not condition_ids:
+        return []
+    out_of_range = max(1, user.count('Patient has:'))
+    count = min(len(condition_ids), 1 + out_of_range // 4, 5)
+    seed = _stable_int(user)
+    picked = []
+    for i in range(count):
+        cid = condition_ids[(seed + i * 7919) % len(condition_ids)]
+        if cid not in picked:
+            picked.append(cid)
+    levels = ['High', 'Moderate', 'Low']
+    return [
+        {
+            'condition_id': cid,
+            'level_of_risk': levels[(seed >> i) % 3],
+            'explanation': f"{out_of_range} marker(s) outside range are consistent with {cid.replace('_', ' ')}.",
+        }
+        for i, cid in enumerate(picked)
+    ]
+
+
+def _reply_risk_score(system: str, user: str) -> object:
+    lows = user.count('When LOW')
+    highs = user.count('When HIGH')
+    yes_answers = len(re.findall(r': Yes\b', user))
+    score = min(95, 10 + 6 * yes_answers + 3 * (lows + highs) + _stable_int(user) % 15)
+    return {
+        'risk_score': score,
+        'explanation': f"Estimated from {yes_answers} reported symptom(s) and {lows + highs} marker narrative(s).",
+    }
+
+
+def _reply_treatment_plan(system: str, user: str) -> object:
+    supplements = []
+    match = re.search(r'^Supplements: (.*)$', user, re.MULTILINE)
+    if match:
+        try:
+            supplements = json.loads(match.group(1))
+        except ValueError:
+            supplements = []
+    conditions = re.findall(r'"condition_id": "([^"]+)"', user)
+    focus = ', '.join(c.replace('_', ' ') for c in conditions[:3]) or 'overall wellness'
+    regularity = ['morning', 'with lunch', 'before bed', 'twice daily']
+    return {
+        'Nutrition': [
+            {'title': 'Whole-food base', 'description': f'Build meals around vegetables, legumes and lean protein to support {focus}.'},
+            {'title': 'Limit refined sugar', 'description': 'Keep added sugars and refined carbohydrates low.'},
+        ],
+        'Lifestyle changes': [
+            {'title': 'Daily movement', 'description': 'Aim for 30 minutes of moderate activity most days.'},
+            {'title': 'Sleep', 'description': 'Keep a consistent 7-9 hour sleep schedule.'},
+        ],
+        'Supplements': [
+            {'name': s.get('name'), 'link': s.get('link'), 'regularity': regularity[i % len(regularity)]}
+            for i, s in enumerate(supplements) if isinstance(s, dict)
+        ],
+    }
+
+
+def _reply_pdf_mapping(system: str, user: str) -> object:
+    try:
+        payload = json.loads(user)
+    except ValueError:
+        return []
+    text = payload.get('pdf_text') or ''
+    lowered = text.lower()
+    results = []
+    for meta in payload.get('marker_meta') or []:
+        name = meta.get('name') or ''
+        idx = lowered.find(name.lower()) if name else -1
+        if idx < 0:
+            continue
+        tail = text[idx + len(name):idx + len(name) + 80]
+        number = re.search(r'-?\d+(?:\.\d+)?', tail)
+        if not number:
+            continue
+        intl_unit = ((meta.get('units') or {}).get('international') or '').lower()
+        unit_system = 'international' if intl_unit and intl_unit in tail.lower() else 'standard'
+        results.append({'name': name, 'value': float(number.group(0)), 'unit_system': unit_system})
+    return results
+
+
+_ROUTES = (
+    ('predict likely conditions', _reply_health_conditions),
+    ('calculating risk scores', _reply_risk_score),
+    ('creating personalized treatment plans', _reply_treatment_plan),
+    ('blood markers with their possible unit systems', _reply_pdf_mapping),
+)
+
+
+def fake_reply(messages: List[Dict]) -> str:
+    """Build the reply text for a chat request (ignores earlier assistant turns)."""
+    system = next((m.get('content') or '' for m in messages if m.get('role') == 'system'), '')
+    users = [m.get('content') or '' for m in messages if m.get('role') == 'user']
+    # For re-asks the original request is the first user message
+    user = users[0] if users else ''
+    for needle, builder in _ROUTES:
+        if needle in system:
+            return json.dumps(builder(system, user), ensure_ascii=False)
+    return '{}'
+
+
+def malform(content: str) -> str:
+    """Make a reply look like a sloppy model answer that the tolerant parser can still repair."""
+    return f"Sure! Here is the result:\n```json\n{content.replace(chr(34), chr(39))}\n```\nLet me know if you need more."
+
+
+# ---------------------------------------------------------------------------
+# OpenAI-shaped client
+# ---------------------------------------------------------------------------
+
+class _Completions:
+    def __init__(self, client: 'FakeLLMClient'):
+        self._client = client
+
+    def create(self, model: str = 'fake', messages: Optional[List[Dict]] = None, stream: bool = False,
+               stream_options: Optional[Dict] = None, **kwargs):
+        include_usage = bool((stream_options or {}).get('include_usage'))
+        return self._client.complete(model, messages or [], stream=stream, include_usage=include_usage)
+
+
+class FakeLLMClient:
+    """In-process fake exposing ``chat.completions.create`` like the OpenAI SDK."""
+
+    def __init__(self, latency_ms: float = 0, latency_jitter_ms: float = 0, error_rate: float = 0.0,
+                 malformed_rate: float = 0.0, stream_chunk_chars: int = 24, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.stream_chunk_chars = max(1, int(stream_chunk_chars))
+        self._random = random.Random(seed)
+        self.chat = SimpleNamespace(completions=_Completions(self))
+
+    @classmethod
+    def from_settings(cls) -> 'FakeLLMClient':
+        conf = {**DEFAULT_FAKE_SETTINGS, **getattr(settings, 'LLM_FAKE', {})}
+        return cls(
+            latency_ms=conf['LATENCY_MS'],
+            latency_jitter_ms=conf['LATENCY_JITTER_MS'],
+            error_rate=conf['ERROR_RATE'],
+            malformed_rate=conf['MALFORMED_RATE'],
+            stream_chunk_chars=conf['STREAM_CHUNK_CHARS'],
+            seed=conf['SEED'],
+        )
+
+    def _latency_seconds(self) -> float:
+        jitter = self._random.uniform(-self.latency_jitter_ms, self.latency_jitter_ms) if self.latency_jitter_ms else 0
+        return max(0.0, self.latency_ms + jitter) / 1000.0
+
+    def _reply(self, messages: List[Dict]):
+        """(content, usage) for a request, or None when this call is an injected failure."""
+        if self.error_rate and self._random.random() < self.error_rate:
+            return None
+        content = fake_reply(messages)
+        if self.malformed_rate and self._random.random() < self.malformed_rate:
+            content = malform(content)
+        usage = SimpleNamespace(
+            prompt_tokens=sum(_approx_tokens(m.get('content')) for m in messages),
+            completion_tokens=_approx_tokens(content),
+        )
+        usage.total_tokens = usage.prompt_tokens + usage.completion_tokens
+        return content, usage
+
+    @staticmethod
+    def _completion(completion_id: str, model: str, content: str, usage):
+        return SimpleNamespace(
+            id=completion_id,
+            model=model,
+            created=int(time.time()),
+            choices=[SimpleNamespace(index=0, finish_reason='stop', message=SimpleNamespace(role='assistant', content=content))],
+            usage=usage,
+        )
+
+    def _chunks(self, completion_id: str, model: str, content: str, usage=None):
+        """(delay before the chunk, chunk) pairs of a streamed reply; a usage-only chunk ends it when usage is given."""
+        step = self.stream_chunk_chars
+        pieces = [content[i:i + step] for i in range(0, len(content), step)] or ['']
+        per_piece = self._latency_seconds() / len(pieces)
+        for piece in pieces:
+            yield per_piece, SimpleNamespace(
+                id=completion_id,
+                model=model,
+                choices=[SimpleNamespace(index=0, finish_reason=None, delta=SimpleNamespace(content=piece))],
+            )
+        yield 0, SimpleNamespace(
+            id=completion_id,
+            model=model,
+            choices=[SimpleNamespace(index=0, finish_reason='stop', delta=SimpleNamespace(content=None))],
+        )
+        if usage is not None:
+            yield 0, SimpleNamespace(id=completion_id, model=model, choices=[], usage=usage)
+
+    def complete(self, model: str, messages: List[Dict], stream: bool = False, include_usage: bool = False):
+        """Return an OpenAI-shaped completion (or chunk iterator when ``stream``)."""
+        reply = self._reply(messages)
+        if reply is None:
+            time.sleep(self._latency_seconds() / 4)
+            raise FakeLLMError("Injected fake LLM failure")
+        content, usage = reply
+        completion_id = f"chatcmpl-fake-{uuid.uuid4().hex[:12]}"
+        if stream:
+            return self._stream(completion_id, model, content, usage if include_usage else None)
+        time.sleep(self._latency_seconds())
+        return self._completion(completion_id, model, content, usage)
+
+    def _stream(self, completion_id: str, model: str, content: str, usage=None):
+        for delay, chunk in self._chunks(completion_id, model, content, usage):
+            time.sleep(delay)
+            yield chunk
+
+
+class _AsyncCompletions(_Completions):
+    async def create(self, model: str = 'fake', messages: Optional[List[Dict]] = None, stream: bool = False,
+                     stream_options: Optional[Dict] = None, **kwargs):
+        include_usage = bool((stream_options or {}).get('include_usage'))
+        return await self._client.complete(model, messages or [], stream=stream, include_usage=include_usage)
+
+
+class AsyncFakeLLMClient(FakeLLMClient):
+    """Async variant (``await client.chat.completions.create(...)``, like AsyncOpenAI); waits without blocking the loop."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.chat = SimpleNamespace(completions=_AsyncCompletions(self))
+
+    async def complete(self, model: str, messages: List[Dict], stream: bool = False, include_usage: bool = False):
+        reply = self._reply(messages)
+        if reply is None:
+            await asyncio.sleep(self._latency_seconds() / 4)
+            raise FakeLLMError("Injected fake LLM failure")
+        content, usage = reply
+        completion_id = f"chatcmpl-fake-{uuid.uuid4().hex[:12]}"
+        if stream:
+            return self._stream(completion_id, model, content, usage if include_usage else None)
+        await asyncio.sleep(self._latency_seconds())
+        return self._completion(completion_id, model, content, usage)
+
+    async def _stream(self, completion_id: str, model: str, content: str, usage=None):
+        for delay, chunk in self._chunks(completion_id, model, content, usage):
+            await asyncio.sleep(delay)
+            yield chunk
@@ -0,0 +1,448 @@
+"""
+Structured-output contract for LLM responses.
+
+Every LLM call site declares the shape it expects as a ResponseSchema. Replies
+are parsed with a tolerant JSON reader that repairs the usual model mistakes
+(code fences, prose around the JSON, single quotes, Python literals, trailing
+commas, truncated output) before validating against the schema. Only output
+that still cannot be repaired raises LLMJSONError, which callers answer with a
+targeted re-ask instead of failing the request.
+
+Parse outcomes are counted per call site (see get_parse_stats) so we can see
+where repairs and re-asks are costing latency.
+"""
+
+import json
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_FENCE_RE = re.compile(r'```(?:json)?', re.IGNORECASE)
+_NUMBER_CHARS = set('+-0123456789.eE')
+_LITERALS = {
+    'true': 'true', 'false': 'false', 'null': 'null',
+    'True': 'true', 'False': 'false', 'None': 'null',
+}
+# How much of a bad reply to include in logs
+_LOG_PREVIEW_CHARS = 300
+
+
+class LLMJSONError(ValueError):
+    """Raised when an LLM reply cannot be repaired into JSON matching its schema."""
+
+
+# ---------------------------------------------------------------------------
+# Tolerant parsing
+# ---------------------------------------------------------------------------
+
+def _tokenize(text: str, start: int) -> Tuple[List[str], List[str], bool]:
+    """
+    Re-tokenize the JSON-ish value starting at ``text[start]`` into strict JSON tokens.
+
+    Returns (tokens, open_containers, truncated). Stops as soon as the top-level
+    value is closed, so trailing prose is ignored.
+    """
+    tokens: List[str] = []
+    stack: List[str] = []
+    i = start
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if ch in '"\'':
+            quote = ch
+            j = i + 1
+            buf = []
+            closed = False
+            while j < n:
+                c = text[j]
+                if c == '\\' and j + 1 < n:
+                    nxt = text[j + 1]
+                    # \' is not a valid JSON escape
+                    buf.append("'" if nxt == "'" else c + nxt)
+                    j += 2
+                    continue
+                if c == quote:
+                    closed = True
+                    break
+                if c == '"':
+                    buf.append('\\"')
+                elif c == '\n':
+                    buf.append('\\n')
+                elif c == '\t':
+                    buf.append('\\t')
+                elif c in '\r\\':
+                    # Carriage returns and a dangling trailing backslash
+                    pass
+                else:
+                    buf.append(c)
+                j += 1
+            tokens.append('"' + ''.join(buf) + '"')
+            if not closed:
+                return tokens, stack, True
+            i = j + 1
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+            tokens.append(ch)
+            i += 1
+        elif ch in '}]':
+            if not stack or stack[-1] != ch:
+                raise LLMJSONError(f"Unbalanced '{ch}' at offset {i}")
+            if tokens and tokens[-1] == ',':
+                tokens.pop()
+            tokens.append(stack.pop())
+            i += 1
+            if not stack:
+                return tokens, stack, False
+        elif ch in ',:':
+            tokens.append(ch)
+            i += 1
+        elif ch.isspace():
+            i += 1
+        elif ch in _NUMBER_CHARS:
+            j = i
+            while j < n and text[j] in _NUMBER_CHARS:
+                j += 1
+            if j >= n:
+                # Number cut off by truncation: its digits may be missing
+                return tokens, stack, True
+            tokens.append(text[i:j])
+            i = j
+        elif ch.isalpha():
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == '_'):
+                j += 1
+            word = text[i:j]
+            if word in _LITERALS:
+                tokens.append(_LITERALS[word])
+            elif j >= n and any(lit.startswith(word) for lit in _LITERALS):
+                # Literal cut off by truncation
+                return tokens, stack, True
+            else:
+                raise LLMJSONError(f"Unexpected bare word {word!r} at offset {i}")
+            i = j
+        else:
+            raise LLMJSONError(f"Unexpected character {ch!r} at offset {i}")
+    return tokens, stack, bool(stack)
+
+
+def _close_truncated(tokens: List[str], stack: List[str]) -> str:
+    """Drop a dangling key/separator left by truncation and close open containers."""
+    while tokens:
+        last = tokens[-1]
+        if last in (',', ':'):
+            tokens.pop()
+            continue
+        if last and last[-1] in '.eE+-' and last[0] in _NUMBER_CHARS:
+            tokens[-1] = last.rstrip('.eE+-')
+            if not tokens[-1]:
+                tokens.pop()
+            continue
+        # A string that is an object key with no value yet
+        if (
+            last.startswith('"') and stack and stack[-1] == '}'
+            and len(tokens) >= 2 and tokens[-2] in ('{', ',')
+        ):
+            tokens.pop()
+            continue
+        break
+    return ''.join(tokens) + ''.join(reversed(stack))
+
+
+def loads_tolerant(content: str) -> Tuple[Any, bool]:
+    """
+    Parse JSON from an LLM reply, repairing it if needed.
+
+    Returns (value, repaired) where ``repaired`` is False when the (fence-stripped)
+    content was already strict JSON. Raises LLMJSONError if nothing parseable is found.
+
+    Truncated output is closed rather than rejected. A string cut off mid-way
+    keeps the text that arrived (a partial plan section is still worth
+    showing), but a number or literal that runs into the end of the input is
+    dropped together with its key, since ``8`` may have been ``85`` and ``tru``
+    cannot be trusted; schema validation then treats the member as missing.
+    """
+    if not content or not content.strip():
+        raise LLMJSONError("LLM returned empty content.")
+    cleaned = _FENCE_RE.sub('', content).replace('```', '').strip()
+    try:
+        return json.loads(cleaned), False
+    except json.JSONDecodeError:
+        pass
+
+    last_error: Optional[Exception] = None
+    starts = [m.start() for m in re.finditer(r'[\[{]', cleaned)][:8]
+    for start in starts:
+        try:
+            tokens, stack, truncated = _tokenize(cleaned, start)
+            candidate = _close_truncated(tokens, stack) if truncated else ''.join(tokens)
+            return json.loads(candidate), True
+        except (LLMJSONError, json.JSONDecodeError) as e:
+            last_error = e
+    raise LLMJSONError(f"Could not repair JSON: {last_error or 'no JSON object or array found'}")
+
+
+class JSONObjectSectionParser:
+    """
+    Incrementally parse the top-level members of a streamed JSON object.
+
+    Feed it text chunks as they arrive; every call returns the (key, value) pairs
+    whose values were completed by that chunk. Anything before the opening brace
+    (code fences, prose) is ignored, single-quoted strings are accepted, and
+    finish() recovers whatever complete or truncated members remain.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.pos = 0
+        self.depth = 0
+        self.quote = None
+        self.escaped = False
+        self.object_start = None
+        self.member_start = None
+        self.finished = False
+        self.emitted = set()
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        self.buffer += chunk or ''
+        completed = []
+        while self.pos < len(self.buffer) and not self.finished:
+            ch = self.buffer[self.pos]
+            if self.quote:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == '\\':
+                    self.escaped = True
+                elif ch == self.quote:
+                    self.quote = None
+            elif ch in '"\'':
+                if self.depth > 0:
+                    self.quote = ch
+            elif ch in '{[':
+                self.depth += 1
+                if self.depth == 1:
+                    if ch == '[':
+                        # Top-level arrays have no sections to stream
+                        self.finished = True
+                        break
+                    self.object_start = self.pos
+                    self.member_start = self.pos + 1
+            elif ch in '}]' and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 0:
+                    completed.extend(self._parse_member(self.pos))
+                    self.finished = True
+            elif ch == ',' and self.depth == 1:
+                completed.extend(self._parse_member(self.pos))
+                self.member_start = self.pos + 1
+            self.pos += 1
+        return completed
+
+    def finish(self) -> List[Tuple[str, Any]]:
+        """Return members not emitted yet, repairing a truncated tail if possible."""
+        if self.object_start is None:
+            return []
+        try:
+            value, _ = loads_tolerant(self.buffer[self.object_start:])
+        except LLMJSONError:
+            return []
+        if not isinstance(value, dict):
+            return []
+        return self._new_members(value.items())
+
+    def _parse_member(self, end: int) -> List[Tuple[str, Any]]:
+        member = self.buffer[self.member_start:end].strip()
+        if not member:
+            return []
+        try:
+            value, _ = loads_tolerant('{' + member + '}')
+        except LLMJSONError:
+            return []
+        if not isinstance(value, dict):
+            return []
+        return self._new_members(value.items())
+
+    def _new_members(self, items) -> List[Tuple[str, Any]]:
+        fresh = [(k, v) for k, v in items if k not in self.emitted]
+        self.emitted.update(k for k, _ in fresh)
+        return fresh
+
+
+# ---------------------------------------------------------------------------
+# Response schemas
+# ---------------------------------------------------------------------------
+
+def _coerce_number(value) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        match = re.search(r'-?\d+(?:\.\d+)?', value)
+        if match:
+            number = float(match.group(0))
+            return int(number) if number.is_integer() else number
+    return None
+
+
+@dataclass(frozen=True)
+class ResponseSchema:
+    """
+    Expected shape of one LLM call site's reply.
+
+    ``kind`` is ``dict`` or ``list``. For lists, ``item_validator`` normalizes each
+    item and returns None to drop it. For dicts, ``validator`` normalizes the
+    whole object. Validators raise LLMJSONError for replies that cannot be used.
+    """
+    name: str
+    kind: type
+    description: str
+    validator: Optional[Callable[[Any], Any]] = None
+    item_validator: Optional[Callable[[Any], Any]] = None
+    wrapper_keys: Tuple[str, ...] = field(default_factory=tuple)
+
+    def validate(self, value):
+        if self.kind is list and isinstance(value, dict):
+            # Models sometimes wrap the array: {"conditions": [...]}
+            for key in self.wrapper_keys:
+                if isinstance(value.get(key), list):
+                    value = value[key]
+                    break
+            else:
+                lists = [v for v in value.values() if isinstance(v, list)]
+                if len(lists) == 1:
+                    value = lists[0]
+        if self.kind is dict and isinstance(value, list) and len(value) == 1 and isinstance(value[0], dict):
+            value = value[0]
+        if not isinstance(value, self.kind):
+            raise LLMJSONError(f"{self.name}: expected a JSON {'object' if self.kind is dict else 'array'}")
+        if self.kind is list and self.item_validator:
+            value = [v for v in (self.item_validator(item) for item in value) if v is not None]
+        if self.validator:
+            value = self.validator(value)
+        return value
+
+
+def _validate_condition_item(item):
+    if not isinstance(item, dict):
+        return None
+    condition_id = item.get('condition_id') or item.get('id')
+    if not condition_id or not isinstance(condition_id, str):
+        return None
+    return item
+
+
+def _validate_risk_score(value):
+    score = _coerce_number(value.get('risk_score'))
+    if score is None:
+        raise LLMJSONError("risk_score: missing numeric 'risk_score'")
+    return {**value, 'risk_score': max(0, min(100, score)), 'explanation': value.get('explanation') or ''}
+
+
+def _validate_marker_mapping_item(item):
+    if not isinstance(item, dict) or not item.get('name'):
+        return None
+    number = _coerce_number(item.get('value'))
+    if number is None:
+        return None
+    unit_system = str(item.get('unit_system') or 'standard').lower()
+    if unit_system not in ('standard', 'international'):
+        unit_system = 'standard'
+    return {**item, 'value': number, 'unit_system': unit_system}
+
+
+HEALTH_CONDITIONS_SCHEMA = ResponseSchema(
+    name='health_conditions',
+    kind=list,
+    description="a JSON array of objects with keys condition_id (string), level_of_risk (string) and explanation (string)",
+    item_validator=_validate_condition_item,
+    wrapper_keys=('conditions', 'likely_conditions', 'health_conditions'),
+)
+
+RISK_SCORE_SCHEMA = ResponseSchema(
+    name='risk_score',
+    kind=dict,
+    description="a JSON object with keys risk_score (number from 0 to 100) and explanation (string)",
+    validator=_validate_risk_score,
+)
+
+TREATMENT_PLAN_SCHEMA = ResponseSchema(
+    name='treatment_plan',
+    kind=dict,
+    description='a JSON object with keys "Nutrition", "Lifestyle changes" and "Supplements"',
+)
+
+PDF_MARKER_MAPPING_SCHEMA = ResponseSchema(
+    name='pdf_marker_mapping',
+    kind=list,
+    description="a JSON array of objects with keys name (string), value (number) and unit_system ('standard' or 'international')",
+    item_validator=_validate_marker_mapping_item,
+    wrapper_keys=('markers', 'mappings', 'results'),
+)
+
+
+def reask_prompt(schema: ResponseSchema, error: Exception) -> str:
+    """Follow-up user message asking the model to resend only the JSON."""
+    return (
+        f"Your previous reply could not be used ({error}). "
+        f"Reply again with ONLY {schema.description}. "
+        "Use double quotes, no comments, no code fences and no text outside the JSON."
+    )
+
+
+# ---------------------------------------------------------------------------
+# Per call site parse statistics
+# ---------------------------------------------------------------------------
+
+_stats_lock = threading.Lock()
+_parse_stats: Dict[str, Dict[str, float]] = {}
+
+
+def _record(call_site: str, outcome: str, seconds: float = 0.0):
+    with _stats_lock:
+        stats = _parse_stats.setdefault(call_site, {
+            'calls': 0, 'clean': 0, 'repaired': 0, 'failed': 0, 'reasks': 0, 'reask_seconds': 0.0,
+        })
+        stats[outcome] += 1
+        stats['reask_seconds'] += seconds
+
+
+def record_reask(call_site: str, seconds: float):
+    """Count a re-ask round-trip and the time it took."""
+    _record(call_site, 'reasks', seconds)
+
+
+def get_parse_stats() -> Dict[str, Dict[str, float]]:
+    """Snapshot of parse outcomes per call site, with derived failure and repair rates."""
+    with _stats_lock:
+        snapshot = {site: dict(stats) for site, stats in _parse_stats.items()}
+    for stats in snapshot.values():
+        calls = stats['calls'] or 1
+        stats['failure_rate'] = stats['failed'] / calls
+        stats['repair_rate'] = stats['repaired'] / calls
+    return snapshot
+
+
+def parse_llm_json(content: str, schema: Optional[ResponseSchema] = None, call_site: str = 'unknown'):
+    """
+    Parse and validate an LLM reply for ``call_site``.
+
+    Raises LLMJSONError when the reply cannot be repaired or does not match the schema.
+    """
+    _record(call_site, 'calls')
+    try:
+        value, repaired = loads_tolerant(content)
+        if schema is not None:
+            value = schema.validate(value)
+    except LLMJSONError as e:
+        _record(call_site, 'failed')
+        preview = (content or '')[:_LOG_PREVIEW_CHARS]
+        logger.warning("LLM JSON parse failed at %s: %s (%d chars, starts %r)", call_site, e, len(content or ''), preview)
+        raise
+    _record(call_site, 'repaired' if repaired else 'clean')
+    if repaired:
+        logger.info("LLM JSON repaired at %s", call_site)
+    return value
@@ -0,0 +1,137 @@
+"""
+Per-call LLM usage accounting (the LLMUsage table).
+
+Every chat completion (bloodapp.ai_analysis.complete/acomplete and the
+streamed treatment plan) is recorded with its tokens, latency, model and
+outcome. A stage that an identical resubmission of the panel takes from its
+stored result records a cache hit instead, once per submission rather than
+per page view. The user and stage come from llm_usage_context(), which the
+views and the risk task thread enter around their LLM calls; it is a context
+variable, so it follows async views across awaits.
+
+Recording never touches the database: rows are buffered in memory and a
+background thread writes them with bulk_create every LLM_USAGE_FLUSH_INTERVAL
+seconds, or as soon as LLM_USAGE_BATCH_SIZE rows are waiting. At most
+LLM_USAGE_MAX_BUFFER rows are kept if the database is unreachable (oldest
+dropped). gunicorn.conf.py flushes on worker exit. Aggregates for any time
+window: ``python manage.py llm_usage_report``.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from .db_connections import close_thread_connections
+from .models import LLMUsage
+
+logger = logging.getLogger(__name__)
+
+_context: ContextVar[Tuple[Optional[int], str]] = ContextVar('bloodapp_llm_usage', default=(None, 'other'))
+
+_lock = threading.Lock()
+_buffer: deque = deque(maxlen=getattr(settings, 'LLM_USAGE_MAX_BUFFER', 10000))
+_wake = threading.Event()
+_flusher_pid: Optional[int] = None
+
+
+def _reset_after_fork():
+    global _lock, _wake, _flusher_pid
+    _lock = threading.Lock()
+    _wake = threading.Event()
+    _buffer.clear()
+    _flusher_pid = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+@contextmanager
+def llm_usage_context(user_id: Optional[int], stage: str):
+    """Attribute the LLM calls made inside the block to this user and stage."""
+    token = _context.set((user_id, stage))
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def record_llm_usage(call_site: str, model: str = '', seconds: float = 0.0, usage=None,
+                     succeeded: bool = True, cache_hit: bool = False):
+    """Buffer one usage row for the current user and stage; usage is the API's usage object, if any."""
+    global _flusher_pid
+    user_id, stage = _context.get()
+    row = LLMUsage(
+        user_id=user_id,
+        stage=stage,
+        call_site=call_site,
+        model=model or '',
+        prompt_tokens=getattr(usage, 'prompt_tokens', 0) or 0,
+        completion_tokens=getattr(usage, 'completion_tokens', 0) or 0,
+        latency_ms=round(seconds * 1000, 2),
+        cache_hit=cache_hit,
+        succeeded=succeeded,
+        created_at=timezone.now(),
+    )
+    with _lock:
+        _buffer.append(row)
+        pending = len(_buffer)
+        start_flusher = _flusher_pid != os.getpid()
+        _flusher_pid = os.getpid()
+    if start_flusher:
+        interval = getattr(settings, 'LLM_USAGE_FLUSH_INTERVAL', 5)
+        threading.Thread(target=_flush_loop, args=(interval,), name='llm-usage-flush', daemon=True).start()
+    if pending >= getattr(settings, 'LLM_USAGE_BATCH_SIZE', 100):
+        _wake.set()
+
+
+def record_llm_cache_hit(call_site: str, user_id: Optional[int], stage: str):
+    """Record a stage answered from its stored result instead of calling the LLM."""
+    with llm_usage_context(user_id, stage):
+        record_llm_usage(call_site, cache_hit=True)
+
+
+def _take() -> List:
+    with _lock:
+        rows = list(_buffer)
+        _buffer.clear()
+    return rows
+
+
+def flush_llm_usage() -> int:
+    """Write the buffered rows now; returns how many were written."""
+    rows = _take()
+    if not rows:
+        return 0
+    try:
+        LLMUsage.objects.bulk_create(rows, batch_size=500)
+    except Exception:
+        logger.exception('Writing %d LLM usage rows failed; keeping them for the next flush', len(rows))
+        with _lock:
+            # Put them back ahead of rows recorded meanwhile; a full buffer drops the oldest
+            pending = list(_buffer)
+            _buffer.clear()
+            _buffer.extend(rows + pending)
+        return 0
+    finally:
+        if threading.current_thread().name == 'llm-usage-flush':
+            close_thread_connections()
+    return len(rows)
+
+
+def _flush_loop(interval: float):
+    while True:
+        _wake.wait(interval)
+        _wake.clear()
+        flush_llm_usage()
+
+
+# Rows still buffered when a management command or dev server exits
+atexit.register(flush_llm_usage)
@@ -0,0 +1,322 @@
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.template.backends.django import DjangoTemplates
+from django.template.loader import render_to_string
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from bloodapp.models import AIAnalysisResult, HealthCondition, Marker
+from bloodapp.template_warmup import find_templates
+from bloodapp.views import AT_RISK_SESSION_KEY, build_report_context
+
+from .loadtest import _percentile, build_panel
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmarks of server-side hot paths (template rendering, process startup, ...), one suite at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suite', choices=sorted(self.suites()), default='render',
+                            help='Benchmark suite to run (default: render)')
+        parser.add_argument('--iterations', type=int,
+                            help='Timed iterations per case (default: 50, or 5 for the startup suite)')
+        parser.add_argument('--panel-size', type=int, default=40, help='Markers in the synthetic report')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for the synthetic panel')
+        parser.add_argument('--json', type=str, help='Also write the results as JSON to this path')
+        parser.add_argument('--baseline', type=str,
+                            help='JSON written by an earlier --json run; fail if any case got slower than allowed')
+        parser.add_argument('--max-regression', type=float, default=20.0,
+                            help='Allowed p50 slowdown against --baseline, in percent (default: 20)')
+        parser.add_argument('--budget-ms', type=float,
+                            help='Fail if the p50 of any case is above this many milliseconds')
+
+    @classmethod
+    def suites(cls):
+        return {
+            'render': cls.suite_render,
+            'templates': cls.suite_templates,
+            'startup': cls.suite_startup,
+            'sessions': cls.suite_sessions,
+        }
+
+    def handle(self, *args, **options):
+        self.options = options
+        if options['iterations'] is None:
+            options['iterations'] = 5 if options['suite'] == 'startup' else 50
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1')
+        self.results = []
+        self.suites()[options['suite']](self)
+        self.report()
+        self.check_regressions()
+
+    def measure(self, name, func, setup=None):
+        """Time func() over --iterations runs (after one untimed warm-up); setup() runs untimed before each."""
+        if setup:
+            setup()
+        func()
+        samples = []
+        for _ in range(self.options['iterations']):
+            if setup:
+                setup()
+            started = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - started) * 1000)
+        samples.sort()
+        self.results.append({
+            'case': name,
+            'iterations': len(samples),
+            'mean_ms': statistics.fmean(samples),
+            'p50_ms': _percentile(samples, 50),
+            'p95_ms': _percentile(samples, 95),
+            'max_ms': samples[-1],
+        })
+
+    def report(self):
+        self.stdout.write(self.style.SUCCESS(f"\nBenchmark suite: {self.options['suite']}"))
+        header = f"{'case':<48}{'iters':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in self.results:
+            self.stdout.write(
+                f"{row['case']:<48}{row['iterations']:>7}{row['mean_ms']:>10.2f}"
+                f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['max_ms']:>10.2f}"
+            )
+        if self.options['json']:
+            with open(self.options['json'], 'w', encoding='utf-8') as f:
+                json.dump({'suite': self.options['suite'], 'results': self.results}, f, indent=2)
+
+    def check_regressions(self):
+        """Raise CommandError when a case is over --budget-ms or slower than --baseline allows."""
+        failures = []
+        budget = self.options['budget_ms']
+        if budget is not None:
+            failures += [f"{row['case']}: p50 {row['p50_ms']:.1f}ms over the {budget:.0f}ms budget"
+                         for row in self.results if row['p50_ms'] > budget]
+        if self.options['baseline']:
+            try:
+                with open(self.options['baseline'], encoding='utf-8') as f:
+                    baseline = {row['case']: row for row in json.load(f)['results']}
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Could not read baseline {self.options['baseline']}: {e}")
+            allowed = 1 + self.options['max_regression'] / 100
+            for row in self.results:
+                before = baseline.get(row['case'])
+                if before and row['p50_ms'] > before['p50_ms'] * allowed:
+                    failures.append(f"{row['case']}: p50 {row['p50_ms']:.1f}ms vs {before['p50_ms']:.1f}ms baseline "
+                                    f"(+{(row['p50_ms'] / before['p50_ms'] - 1) * 100:.0f}%)")
+        if failures:
+            raise CommandError('Benchmark regression:\n  ' + '\n  '.join(failures))
+
+    def synthetic_report(self):
+        """(user, report context) for an unsaved user with a random panel; nothing is written to the DB."""
+        rng = random.Random(self.options['seed'])
+        markers = list(Marker.objects.values())
+        if not markers:
+            raise CommandError('No markers in the catalog; run import_markers_from_brg first')
+        by_id = {m['id']: m for m in markers}
+        panel = build_panel(markers, self.options['panel_size'], rng)
+        patient_values, unit_systems = {}, {}
+        for key, value in panel.items():
+            if key.endswith('_value'):
+                name = by_id[int(key.split('_')[1])]['name']
+                patient_values[name] = float(value)
+                unit_systems[name] = 'standard'
+
+        conditions = list(HealthCondition.objects.exclude(condition_id__isnull=True).values_list(
+            'condition_id', 'display_name')[:5])
+        likely = [{'condition_id': cid, 'display_name': name, 'risk_score': rng.randint(10, 90)}
+                  for cid, name in conditions]
+        plan = {
+            'lifestyle_recommendations': [{'title': 'Sleep', 'description': 'Keep a regular sleep schedule.'}],
+            'dietary_recommendations': [{'title': 'Protein', 'description': 'Include protein at every meal.'}],
+            'supplement_recommendations': [{'name': 'Vitamin D3', 'dosage': '2000 IU', 'timing': 'with breakfast'}],
+            'follow_up_recommendations': ['Re-test in 12 weeks.'],
+        }
+        now = timezone.now()
+        user = User(username='benchmark', first_name='Bench', last_name='Mark')
+        context = build_report_context(
+            user,
+            AIAnalysisResult(stage='patient_info', created_at=now,
+                             analysis_data={'patient_values': patient_values, 'unit_systems': unit_systems}),
+            AIAnalysisResult(stage='health_concerns', created_at=now, analysis_data={'likely_conditions': likely}),
+            AIAnalysisResult(stage='treatment_plans', created_at=now, analysis_data={'treatment_plan': plan}),
+        )
+        return user, context
+
+    def suite_render(self):
+        """Report and quiz page rendering, with the reference-content fragment cache cold and warm."""
+        user, context = self.synthetic_report()
+        request = RequestFactory().get('/report/')
+        request.user = user
+        fragments = caches['template_fragments']
+
+        def render_report():
+            render_to_string('bloodapp/report.html', context, request=request)
+
+        self.measure('report (fragments cold)', render_report, setup=fragments.clear)
+        self.measure('report (fragments warm)', render_report)
+
+        condition = HealthCondition.objects.exclude(symptoms=[]).order_by('-id').first()
+        if condition is None:
+            return
+        quiz_context = {'condition': condition, 'symptoms': condition.symptoms, 'existing_detail': None}
+
+        def render_quiz():
+            render_to_string('bloodapp/quiz.html', quiz_context, request=request)
+
+        self.measure('quiz (fragments cold)', render_quiz, setup=fragments.clear)
+        self.measure('quiz (fragments warm)', render_quiz)
+
+    def suite_templates(self):
+        """Per page: the first render in a fresh process (parse + render) against a prewarmed render."""
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        config = settings.TEMPLATES[0]
+        # Pages that need more than an empty context to render
+        _, report_context = self.synthetic_report()
+        condition = HealthCondition.objects.exclude(condition_id__isnull=True).first()
+        contexts = {
+            'bloodapp/report.html': report_context,
+            'bloodapp/quiz.html': {'condition': condition, 'symptoms': condition.symptoms if condition else []},
+        }
+
+        def fresh_backend():
+            # Same configuration as the project's engine, with an empty template cache
+            options = dict(config.get('OPTIONS', {}))
+            return DjangoTemplates({
+                'NAME': 'benchmark',
+                'DIRS': list(config.get('DIRS', [])),
+                'APP_DIRS': config.get('APP_DIRS', False),
+                'OPTIONS': options,
+            })
+
+        for name in find_templates():
+            holder = {}
+
+            def new_process(name=name):
+                holder['backend'] = fresh_backend()
+
+            def first_render(name=name):
+                holder['backend'].get_template(name).render(contexts.get(name, {}), request)
+
+            try:
+                self.measure(f'{name} (cold)', first_render, setup=new_process)
+            except Exception as e:
+                self.stderr.write(f'{name}: skipped ({e.__class__.__name__}: {e})')
+                continue
+            warm = fresh_backend()
+            warm.get_template(name)
+            self.measure(f'{name} (prewarmed)',
+                         lambda name=name: warm.get_template(name).render(contexts.get(name, {}), request))
+
+    # Heavy optional modules that must stay out of process startup (imported on first use instead)
+    LAZY_MODULES = ('openai', 'fpdf', 'PyPDF2')
+    STARTUP_TARGETS = {
+        'django.setup()': 'import django; django.setup()',
+        'django.setup() + bloodapp.views': 'import django; django.setup(); import bloodapp.views',
+        'wsgi application': 'import bloodproject.wsgi',
+    }
+
+    def suite_startup(self):
+        """Worker boot: fresh interpreters under -X importtime, wall clock and the heaviest imports."""
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'bloodproject.settings'),
+                   TEMPLATE_PREWARM='false')
+        cwd = str(settings.BASE_DIR)
+        imports = {}
+
+        for name, code in self.STARTUP_TARGETS.items():
+            def boot(code=code, name=name):
+                proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=cwd, env=env,
+                                      capture_output=True, text=True)
+                if proc.returncode != 0:
+                    raise CommandError(f'{name} failed to start:\n{proc.stderr[-2000:]}')
+                imports[name] = proc.stderr
+
+            self.measure(name, boot)
+
+        # "import time: self [us] | cumulative | imported package", one line per module;
+        # self time is summed per top-level package since django.setup() imports submodules lazily
+        per_package, loaded = {}, set()
+        for line in imports['wsgi application'].splitlines():
+            parts = line.split('|')
+            if len(parts) != 3 or not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            module = parts[2].strip()
+            root = module.split('.')[0]
+            loaded.add(root)
+            per_package[root] = per_package.get(root, 0) + int(parts[0].split(':')[1])
+        self.stdout.write(f'\nImport time by package (total {sum(per_package.values()) / 1000:.1f}ms):')
+        for root, us in sorted(per_package.items(), key=lambda item: item[1], reverse=True)[:10]:
+            self.stdout.write(f'  {root:<40}{us / 1000:>8.1f}')
+
+        eager = sorted(m for m in self.LAZY_MODULES if m in loaded)
+        if eager:
+            raise CommandError(f"Imported at startup but should be lazy: {', '.join(eager)}")
+
+    SESSION_ENGINES = ('db', 'cached_db', 'cache', 'signed_cookies')
+
+    def suite_sessions(self):
+        """Session load/save per request for each engine: the old full payloads against ID-only sessions."""
+        _, context = self.synthetic_report()
+        explanation = 'Associated marker deviations: ' + ', '.join(m['name'] for m in context['markers'][:8]) + '.'
+        likely = [
+            {'condition_id': cid, 'display_name': name, 'level_of_risk': 'High', 'explanation': explanation * 4,
+             'risk_score': 60, 'detailed_analysis': True, 'detailed_explanation': explanation * 8}
+            for cid, name in HealthCondition.objects.exclude(condition_id__isnull=True).values_list(
+                'condition_id', 'display_name')[:8]
+        ]
+        payloads = {
+            # What health_concerns/patient_info used to keep in the session, rewritten on every view
+            'full payload': {
+                'default_unit': 'standard',
+                'patient_values': {m['name']: m['patient_value'] for m in context['markers']},
+                'unit_systems': {m['name']: 'standard' for m in context['markers']},
+                'at_risk_conditions': likely,
+            },
+            'ids only': {'default_unit': 'standard', AT_RISK_SESSION_KEY: [c['condition_id'] for c in likely]},
+        }
+        factory = RequestFactory()
+
+        for engine in self.SESSION_ENGINES:
+            for label, payload in payloads.items():
+                def view(request, payload=payload, rewrite=label == 'full payload'):
+                    request.session.get('default_unit')
+                    for key, value in payload.items():
+                        # The old views re-assigned their keys each time; the new ones only when they change
+                        if rewrite or request.session.get(key) != value:
+                            request.session[key] = value
+                    return HttpResponse()
+
+                with override_settings(SESSION_ENGINE=f'django.contrib.sessions.backends.{engine}'):
+                    middleware = SessionMiddleware(view)
+                    cookie = {}
+
+                    def one_request():
+                        request = factory.get('/health-concerns/')
+                        request.COOKIES.update(cookie)
+                        response = middleware(request)
+                        if settings.SESSION_COOKIE_NAME in response.cookies:
+                            cookie[settings.SESSION_COOKIE_NAME] = response.cookies[settings.SESSION_COOKIE_NAME].value
+
+                    one_request()
+                    with CaptureQueriesContext(connection) as queries:
+                        one_request()
+                    size = len(cookie.get(settings.SESSION_COOKIE_NAME, '')) if engine == 'signed_cookies' else len(
+                        json.dumps(payload))
+                    self.measure(f'{engine}, {label} ({size / 1024:.1f} KB, {len(queries)} queries)', one_request)
+                    middleware.SessionStore(cookie.get(settings.SESSION_COOKIE_NAME)).delete()
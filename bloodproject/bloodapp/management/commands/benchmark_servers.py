@@ -0,0 +1,130 @@
+import io
+import json
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+MODES = ('sync', 'gthread', 'uvicorn')
+STAGES = ('patient_info', 'health_concerns', 'treatment_plans')
+_SIZING_RE = re.compile(r'Mode \S+: (\d+) worker\(s\) x (\d+) thread\(s\)')
+
+
+class Command(BaseCommand):
+    help = ('Compare the gunicorn worker modes of gunicorn.conf.py: start each one with the fake LLM '
+            'and run the loadtest flow against it')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+        parser.add_argument('--users', type=int, default=40, help='Virtual users per mode')
+        parser.add_argument('--concurrency', type=int, default=40, help='Virtual users running at the same time')
+        parser.add_argument('--max-quizzes', type=int, default=1, help='Quizzes answered per user (0 = all)')
+        parser.add_argument('--llm-latency-ms', type=float, default=1000, help='Fake LLM latency in the server')
+        parser.add_argument('--workers', type=int,
+                            help='Same worker count for every mode (default: sized by gunicorn.conf.py)')
+        parser.add_argument('--startup-timeout', type=float, default=60, help='Seconds to wait for each server')
+        parser.add_argument('--json', type=str, help='Also write the results as JSON to this path')
+
+    def handle(self, *args, **options):
+        self.options = options
+        results = []
+        for mode in options['modes']:
+            self.stdout.write(f'Benchmarking {mode}...')
+            results.append(self.run_mode(mode))
+        self.report(results)
+
+    def run_mode(self, mode):
+        port = _free_port()
+        env = dict(
+            os.environ,
+            GUNICORN_MODE=mode,
+            GUNICORN_BIND=f'127.0.0.1:{port}',
+            LLM_BACKEND='fake',
+            LLM_FAKE_LATENCY_MS=str(self.options['llm_latency_ms']),
+            LLM_FAKE_JITTER_MS=str(self.options['llm_latency_ms'] / 2),
+        )
+        env.pop('GUNICORN_ACCESSLOG', None)
+        if self.options['workers']:
+            env['GUNICORN_WORKERS'] = str(self.options['workers'])
+        base_dir = str(settings.BASE_DIR)
+        with tempfile.TemporaryFile(mode='w+') as log:
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', '--config', os.path.join(base_dir, 'gunicorn.conf.py')],
+                cwd=base_dir, env=env, stdout=log, stderr=subprocess.STDOUT,
+            )
+            try:
+                self.wait_ready(server, port, log)
+                with tempfile.NamedTemporaryFile(suffix='.json') as summary:
+                    call_command(
+                        'loadtest', url=f'http://127.0.0.1:{port}', users=self.options['users'],
+                        concurrency=self.options['concurrency'], max_quizzes=self.options['max_quizzes'],
+                        json=summary.name, stdout=io.StringIO(),
+                    )
+                    with open(summary.name, encoding='utf-8') as f:
+                        data = json.load(f)
+            finally:
+                server.send_signal(signal.SIGTERM)
+                try:
+                    server.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+            log.seek(0)
+            sizing = _SIZING_RE.search(log.read())
+        data['mode'] = mode
+        data['workers'], data['threads'] = (int(sizing.group(1)), int(sizing.group(2))) if sizing else (None, None)
+        return data
+
+    def wait_ready(self, server, port, log):
+        deadline = time.monotonic() + self.options['startup_timeout']
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                log.seek(0)
+                raise CommandError(f'gunicorn exited with {server.returncode}:\n{log.read()[-2000:]}')
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/readyz', timeout=2):
+                    return
+            except (urllib.error.URLError, OSError):
+                time.sleep(0.25)
+        raise CommandError(f'gunicorn did not answer on port {port} within {self.options["startup_timeout"]:.0f}s')
+
+    def report(self, results):
+        o = self.options
+        self.stdout.write(self.style.SUCCESS(
+            f"\nServer modes: {o['users']} users, concurrency {o['concurrency']}, fake LLM {o['llm_latency_ms']:.0f}ms"))
+        header = f"{'mode':<10}{'workers':>9}{'flows/s':>9}{'err%':>7}" + ''.join(
+            f"{stage[:15] + ' p50/p90':>26}" for stage in STAGES)
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for data in results:
+            stages = {row['stage']: row for row in data['stages']}
+            samples = sum(row['count'] for row in data['stages'])
+            errors = sum(row['errors'] for row in data['stages'])
+            sizing = f"{data['workers']}x{data['threads']}" if data['workers'] else '?'
+            line = (f"{data['mode']:<10}{sizing:>9}"
+                    f"{data['completed_users'] / data['wall_seconds'] if data['wall_seconds'] else 0:>9.2f}"
+                    f"{errors / samples * 100 if samples else 0:>6.1f}%")
+            for stage in STAGES:
+                row = stages.get(stage)
+                cell = f"{row['p50_ms']:.0f}/{row['p90_ms']:.0f} ms" if row else 'n/a'
+                line += f'{cell:>26}'
+            self.stdout.write(line)
+        if o['json']:
+            with open(o['json'], 'w', encoding='utf-8') as f:
+                json.dump({'options': {k: o[k] for k in ('users', 'concurrency', 'llm_latency_ms', 'workers')},
+                           'results': results}, f, indent=2)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
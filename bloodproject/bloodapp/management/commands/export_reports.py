@@ -0,0 +1,81 @@
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from bloodapp.models import AIAnalysisResult
+from bloodapp.report_pdf import load_renderer, report_pdf_digest, report_pdf_path, write_report_pdf
+from bloodapp.views import build_report_context
+
+
+class Command(BaseCommand):
+    help = 'Render the PDF report of many users in parallel into a directory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--out', required=True, help='Directory to write <username>.pdf files to')
+        parser.add_argument('--users', nargs='+', help='Usernames to export (default: every user with a report)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Renderer processes (default: CPU count)')
+        parser.add_argument('--force', action='store_true',
+                            help='Re-render even when a PDF of the same report is already cached')
+
+    def handle(self, *args, **options):
+        out_dir = options['out']
+        os.makedirs(out_dir, exist_ok=True)
+
+        users = User.objects.filter(aianalysisresult__stage='patient_info').distinct().order_by('username')
+        if options['users']:
+            users = users.filter(username__in=options['users'])
+            missing = set(options['users']) - set(users.values_list('username', flat=True))
+            if missing:
+                raise CommandError(f"No report for: {', '.join(sorted(missing))}")
+        users = list(users)
+
+        results = {}
+        for result in AIAnalysisResult.objects.filter(user__in=users):
+            results.setdefault(result.user_id, {})[result.stage] = result
+
+        # Contexts are built here (DB access); the worker processes only render
+        jobs = []
+        for user in users:
+            stages = results.get(user.pk, {})
+            context = build_report_context(user, stages.get('patient_info'), stages.get('health_concerns'),
+                                           stages.get('treatment_plans'))
+            cached = report_pdf_path(report_pdf_digest(context))
+            jobs.append((user.username, context, cached, os.path.join(out_dir, f'{user.username}.pdf')))
+
+        started = time.perf_counter()
+        rendered = reused = failed = 0
+        pending = {}
+        # Import the renderer once here so forked workers inherit it instead of each importing it
+        try:
+            load_renderer()
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            for username, context, cached, target in jobs:
+                if os.path.exists(cached) and not options['force']:
+                    shutil.copyfile(cached, target)
+                    reused += 1
+                else:
+                    pending[executor.submit(write_report_pdf, context, cached)] = (username, cached, target)
+            for future in as_completed(pending):
+                username, cached, target = pending[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(self.style.ERROR(f'{username}: {e}'))
+                    continue
+                shutil.copyfile(cached, target)
+                rendered += 1
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {rendered + reused} report(s) to {out_dir} in {elapsed:.1f}s '
+            f'({rendered} rendered, {reused} reused from cache, {failed} failed)'))
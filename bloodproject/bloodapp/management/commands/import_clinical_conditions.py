@@ -1,6 +1,8 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 from bloodapp.models import HealthCondition
+from bloodapp.catalog import catalog_batch
+from bloodapp.symptoms import parse_signs_and_symptoms
 import csv
 import os
 import re
@@ -20,8 +22,16 @@ class Command(BaseCommand):
 	def add_arguments(self, parser):
 		parser.add_argument('--path', type=str, help='Path to the CSV file (defaults to project root Clinical Conditions.csv)')
 		parser.add_argument('--truncate', action='store_true', help='Delete existing HealthCondition rows before import')
+		parser.add_argument('--verify', action='store_true', help='Check the stored symptom lists against a fresh parse of every imported row')
 
 	def handle(self, *args, **options):
+		# One catalog version bump for the whole import instead of one per row
+		with catalog_batch():
+			imported = self.import_rows(*args, **options)
+		if options.get('verify'):
+			self.verify_symptoms(imported)
+
+	def import_rows(self, *args, **options):
 		csv_path = options.get('path') or os.path.join(settings.BASE_DIR, 'Clinical Conditions.csv')
 		if not os.path.exists(csv_path):
 			raise CommandError(f'CSV not found at {csv_path}')
@@ -32,6 +42,7 @@ class Command(BaseCommand):
 
 		created_count = 0
 		updated_count = 0
+		imported = {}
 
 		with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
 			reader = csv.DictReader(f)
@@ -80,9 +91,29 @@ class Command(BaseCommand):
 						'treatments': treatments or None,
 					}
 				)
+				imported[name] = signs_and_symptoms
 				if created:
 					created_count += 1
 				else:
 					updated_count += 1
 
-		self.stdout.write(self.style.SUCCESS(f'Import completed: {created_count} created, {updated_count} updated')) 
\ No newline at end of file
+		self.stdout.write(self.style.SUCCESS(f'Import completed: {created_count} created, {updated_count} updated'))
+		return imported
+
+	def verify_symptoms(self, imported):
+		"""Compare each stored symptom list with the runtime parse of the CSV text it came from."""
+		stored = dict(HealthCondition.objects.filter(name__in=imported).values_list('name', 'symptoms'))
+		mismatches = []
+		total = 0
+		for name, signs_and_symptoms in imported.items():
+			expected = list(dict.fromkeys(parse_signs_and_symptoms(signs_and_symptoms)))
+			symptoms = stored.get(name) or []
+			ids = [s['id'] for s in symptoms]
+			total += len(symptoms)
+			if [s['text'] for s in symptoms] != expected or len(set(ids)) != len(ids):
+				mismatches.append(name)
+		if mismatches:
+			for name in mismatches:
+				self.stderr.write(f'Symptom list differs from runtime parse: {name}')
+			raise CommandError(f'{len(mismatches)} of {len(imported)} conditions failed symptom verification')
+		self.stdout.write(self.style.SUCCESS(f'Verified {total} symptoms across {len(imported)} conditions against the runtime parse'))
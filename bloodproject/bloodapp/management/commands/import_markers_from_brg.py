@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 from bloodapp.models import Marker
+from bloodapp.catalog import catalog_batch
 import csv
 import os
 
@@ -27,6 +28,11 @@ class Command(BaseCommand):
 		parser.add_argument('--truncate', action='store_true', help='Delete existing Markers before import')
 
 	def handle(self, *args, **options):
+		# One catalog version bump for the whole import instead of one per row
+		with catalog_batch():
+			self.import_rows(*args, **options)
+
+	def import_rows(self, *args, **options):
 		csv_path = options.get('path') or os.path.join(settings.BASE_DIR, 'Blood Reference Guide.csv')
 		if not os.path.exists(csv_path):
 			raise CommandError(f'CSV not found at {csv_path}')
@@ -0,0 +1,149 @@
+import json
+import re
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from bloodapp.llm_usage import flush_llm_usage
+from bloodapp.models import LLMUsage
+
+GROUP_FIELDS = {
+    'stage': 'stage',
+    'call_site': 'call_site',
+    'model': 'model',
+    'user': 'user__username',
+    'day': 'day',
+}
+_RELATIVE_RE = re.compile(r'^(\d+(?:\.\d+)?)([mhdw])$')
+_UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+
+
+def parse_moment(value: str, now: datetime) -> datetime:
+    """'24h', '30m', '7d', '2w' (before now), an ISO date or an ISO datetime."""
+    match = _RELATIVE_RE.match(value)
+    if match:
+        return now - timedelta(**{_UNITS[match.group(2)]: float(match.group(1))})
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'Not a time: {value!r} (use e.g. 24h, 7d, 2026-10-01 or 2026-10-01T08:00)')
+        moment = datetime(day.year, day.month, day.day)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def call_cost(model: str, prompt_tokens: int, completion_tokens: int):
+    """USD cost from LLM_PRICES (per million tokens), or None for a model without a price."""
+    price = getattr(settings, 'LLM_PRICES', {}).get(model)
+    if price is None:
+        return None
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+
+class Command(BaseCommand):
+    help = 'Aggregate recorded LLM usage (calls, cache hits, tokens, latency, cost) over a time window'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', default='24h', help='Window start: 24h, 7d, an ISO date or datetime (default 24h)')
+        parser.add_argument('--until', help='Window end, same formats (default: now)')
+        parser.add_argument('--by', nargs='+', choices=list(GROUP_FIELDS), default=['stage'],
+                            help='Group rows by these fields (default: stage)')
+        parser.add_argument('--top', type=int, default=0, help='Only the N most expensive groups (0 = all)')
+        parser.add_argument('--json', type=str, help='Also write the rows as JSON to this path')
+
+    def handle(self, *args, **options):
+        # Rows this process buffered but has not written yet
+        flush_llm_usage()
+        now = timezone.now()
+        since = parse_moment(options['since'], now)
+        until = parse_moment(options['until'], now) if options['until'] else now
+        if since >= until:
+            raise CommandError('--since must be before --until')
+
+        usage = LLMUsage.objects.filter(created_at__gte=since, created_at__lt=until)
+        if 'day' in options['by']:
+            usage = usage.annotate(day=TruncDate('created_at'))
+        group_fields = [GROUP_FIELDS[name] for name in options['by']]
+        # Grouped by model too, so each group's cost uses its models' prices
+        value_fields = group_fields + ([] if 'model' in group_fields else ['model'])
+        rows = usage.values(*value_fields).annotate(
+            calls=Count('id', filter=Q(cache_hit=False)),
+            cache_hits=Count('id', filter=Q(cache_hit=True)),
+            errors=Count('id', filter=Q(succeeded=False)),
+            prompt_tokens=Sum('prompt_tokens'),
+            completion_tokens=Sum('completion_tokens'),
+            total_latency_ms=Sum('latency_ms', filter=Q(cache_hit=False)),
+            max_latency_ms=Max('latency_ms'),
+        )
+
+        groups = {}
+        for row in rows:
+            key = tuple(row[field] for field in group_fields)
+            group = groups.setdefault(key, {
+                'group': dict(zip(options['by'], (str(v) if v is not None else '-' for v in key))),
+                'calls': 0, 'cache_hits': 0, 'errors': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+                'total_latency_ms': 0.0, 'max_latency_ms': 0.0, 'cost_usd': 0.0, 'unpriced_models': set(),
+            })
+            for field in ('calls', 'cache_hits', 'errors', 'prompt_tokens', 'completion_tokens', 'total_latency_ms'):
+                group[field] += row[field] or 0
+            group['max_latency_ms'] = max(group['max_latency_ms'], row['max_latency_ms'] or 0)
+            if row['calls']:
+                cost = call_cost(row['model'], row['prompt_tokens'] or 0, row['completion_tokens'] or 0)
+                if cost is None:
+                    group['unpriced_models'].add(row['model'] or '?')
+                else:
+                    group['cost_usd'] += cost
+
+        results = []
+        for group in groups.values():
+            group['avg_latency_ms'] = round(group.pop('total_latency_ms') / group['calls'], 1) if group['calls'] else None
+            group['cache_hit_rate'] = round(group['cache_hits'] / (group['calls'] + group['cache_hits']), 3) \
+                if group['calls'] + group['cache_hits'] else None
+            group['cost_usd'] = round(group['cost_usd'], 6)
+            group['unpriced_models'] = sorted(group['unpriced_models'])
+            results.append(group)
+        results.sort(key=lambda g: (-g['cost_usd'], -g['prompt_tokens'] - g['completion_tokens']))
+        if options['top']:
+            results = results[:options['top']]
+        self.report(results, options, since, until)
+
+    def report(self, results, options, since, until):
+        self.stdout.write(self.style.SUCCESS(
+            f"LLM usage {since:%Y-%m-%d %H:%M} - {until:%Y-%m-%d %H:%M} by {', '.join(options['by'])}"))
+        if not results:
+            self.stdout.write('No LLM usage recorded in this window.')
+        else:
+            label_width = max(12, *(len(' / '.join(g['group'].values())) for g in results)) + 2
+            header = (f"{'group':<{label_width}}{'calls':>7}{'cached':>8}{'hit%':>7}{'err':>5}"
+                      f"{'prompt tok':>12}{'compl tok':>11}{'avg ms':>9}{'max ms':>9}{'cost $':>11}")
+            self.stdout.write(header)
+            self.stdout.write('-' * len(header))
+            totals = {'calls': 0, 'cache_hits': 0, 'errors': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+                      'cost_usd': 0.0}
+            for g in results:
+                for field in totals:
+                    totals[field] += g[field]
+                hit_rate = f"{g['cache_hit_rate'] * 100:.1f}" if g['cache_hit_rate'] is not None else '-'
+                avg = f"{g['avg_latency_ms']:.0f}" if g['avg_latency_ms'] is not None else '-'
+                cost = f"{g['cost_usd']:.4f}" + ('*' if g['unpriced_models'] else '')
+                self.stdout.write(
+                    f"{' / '.join(g['group'].values()):<{label_width}}{g['calls']:>7}{g['cache_hits']:>8}"
+                    f"{hit_rate:>7}{g['errors']:>5}{g['prompt_tokens']:>12}{g['completion_tokens']:>11}"
+                    f"{avg:>9}{g['max_latency_ms']:>9.0f}{cost:>11}")
+            self.stdout.write('-' * len(header))
+            self.stdout.write(
+                f"{'total':<{label_width}}{totals['calls']:>7}{totals['cache_hits']:>8}{'':>7}{totals['errors']:>5}"
+                f"{totals['prompt_tokens']:>12}{totals['completion_tokens']:>11}{'':>18}{totals['cost_usd']:>11.4f}")
+            if any(g['unpriced_models'] for g in results):
+                self.stdout.write('* includes calls to models without a price in LLM_PRICES (not counted)')
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as f:
+                json.dump({'since': since.isoformat(), 'until': until.isoformat(), 'by': options['by'],
+                           'rows': results}, f, indent=2)
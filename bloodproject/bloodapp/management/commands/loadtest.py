@@ -0,0 +1,393 @@
+"""
+End-to-end load test of the four-stage patient flow.
+
+Each virtual user signs up through the demo view, submits a realistic panel on
+patient_info, opens health_concerns, answers every condition quiz and runs its
+risk task to completion, then opens treatment_plans (consuming the stream when
+enabled) and the report. Per-stage latency percentiles, error rates and DB
+query counts are reported at the end.
+
+Two modes:
+- in-process (default): drives the app through Django's test Client with the
+  LLM forced to the offline fake, counting DB queries per stage.
+- --url http://127.0.0.1:8000: drives a running local server over HTTP. Start
+  it with LLM_BACKEND=fake (or point it at `manage.py run_llm_stub`). Query
+  counts are read from the X-DB-Query-Count response header when the server
+  provides it.
+
+Panels are generated from the Marker table, so the server must use the same
+database as this command.
+"""
+
+import json
+import random
+import re
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.cookiejar import CookieJar
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from bloodapp.models import Marker
+
+STAGES = [
+    'demo_signup', 'patient_info', 'health_concerns', 'quiz', 'risk_task',
+    'treatment_plans', 'report',
+]
+
+_QUIZ_LINK_RE = re.compile(r'href="/quiz/([^/"]+)/"')
+_SYMPTOM_RE = re.compile(r'name="(.+?)_answer"')
+_STREAM_URL_RE = re.compile(r'data-stream-url="([^"]+)"')
+
+
+class _Response:
+    def __init__(self, status, body, query_count=None):
+        self.status = status
+        self.body = body
+        self.query_count = query_count
+
+    @property
+    def ok(self):
+        return self.status < 400
+
+    def json(self):
+        return json.loads(self.body or '{}')
+
+
+class InProcessSession:
+    """Drives the app through django.test.Client, counting this thread's DB queries."""
+
+    def __init__(self):
+        from django.test import Client
+        self.client = Client()
+
+    def _run(self, fn, *args, **kwargs):
+        with CaptureQueriesContext(connection) as ctx:
+            response = fn(*args, **kwargs)
+            if getattr(response, 'streaming', False):
+                body = b''.join(response.streaming_content)
+            else:
+                body = response.content
+        return _Response(response.status_code, body.decode('utf-8', 'replace'), len(ctx.captured_queries))
+
+    def get(self, path):
+        return self._run(self.client.get, path, follow=True)
+
+    def post(self, path, data=None):
+        return self._run(self.client.post, path, data or {}, follow=True)
+
+    def stream(self, path):
+        return self._run(self.client.get, path)
+
+    def close(self):
+        connections.close_all()
+
+
+class HTTPSession:
+    """Drives a running server over HTTP with its own cookie jar and CSRF handling."""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+
+    def _csrf(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def _open(self, path, data=None):
+        url = self.base_url + path
+        body = urllib.parse.urlencode(data, doseq=True).encode('utf-8') if data is not None else None
+        request = urllib.request.Request(url, data=body)
+        if body is not None:
+            request.add_header('X-CSRFToken', self._csrf())
+            request.add_header('Referer', url)
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                count = response.headers.get('X-DB-Query-Count')
+                return _Response(response.status, response.read().decode('utf-8', 'replace'), int(count) if count else None)
+        except urllib.error.HTTPError as e:
+            return _Response(e.code, e.read().decode('utf-8', 'replace'))
+
+    def get(self, path):
+        return self._open(path)
+
+    def post(self, path, data=None):
+        return self._open(path, data or {})
+
+    def stream(self, path):
+        return self._open(path)
+
+    def close(self):
+        pass
+
+
+class Recorder:
+    """Thread-safe per-stage latency / error / query-count collector."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.queries = defaultdict(list)
+
+    def add(self, stage, seconds, ok, query_count=None):
+        with self.lock:
+            self.latencies[stage].append(seconds)
+            if not ok:
+                self.errors[stage] += 1
+            if query_count is not None:
+                self.queries[stage].append(query_count)
+
+    def summary(self):
+        rows = []
+        for stage in STAGES:
+            samples = sorted(self.latencies.get(stage, []))
+            if not samples:
+                continue
+            queries = self.queries.get(stage, [])
+            rows.append({
+                'stage': stage,
+                'count': len(samples),
+                'errors': self.errors.get(stage, 0),
+                'error_rate': self.errors.get(stage, 0) / len(samples),
+                'p50_ms': _percentile(samples, 50) * 1000,
+                'p90_ms': _percentile(samples, 90) * 1000,
+                'p99_ms': _percentile(samples, 99) * 1000,
+                'max_ms': samples[-1] * 1000,
+                'queries_mean': statistics.mean(queries) if queries else None,
+                'queries_max': max(queries) if queries else None,
+            })
+        return rows
+
+
+def _percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return 0.0
+    k = (len(sorted_samples) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_samples) - 1)
+    return sorted_samples[lo] + (sorted_samples[hi] - sorted_samples[lo]) * (k - lo)
+
+
+def build_panel(markers, size, rng):
+    """Form data for patient_info: mostly optimal values, some borderline and a few out of range."""
+    data = {'default_unit': 'standard'}
+    for m in rng.sample(markers, min(size, len(markers))):
+        lo, hi = m['standard_min_conventional'], m['standard_max_conventional']
+        opt_lo, opt_hi = m['optimal_min_conventional'], m['optimal_max_conventional']
+        if lo is None or hi is None or hi <= lo:
+            continue
+        if opt_lo is None or opt_hi is None or opt_hi <= opt_lo:
+            opt_lo, opt_hi = lo, hi
+        roll = rng.random()
+        width = hi - lo
+        if roll < 0.7:
+            value = rng.uniform(opt_lo, opt_hi)
+        elif roll < 0.9:
+            value = rng.uniform(lo, hi)
+        else:
+            value = rng.choice([lo - rng.uniform(0.05, 0.5) * width, hi + rng.uniform(0.05, 0.5) * width])
+        data[f"marker_{m['id']}_value"] = f"{value:.2f}"
+        data[f"marker_{m['id']}_unit"] = 'standard'
+    return data
+
+
+class Command(BaseCommand):
+    help = 'Run an end-to-end load test of the patient flow and report per-stage latency, errors and DB queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Number of virtual users to run through the flow')
+        parser.add_argument('--concurrency', type=int, default=4, help='Virtual users running at the same time')
+        parser.add_argument('--url', type=str, help='Base URL of a running local server (default: in-process)')
+        parser.add_argument('--panel-size', type=int, default=40, help='Markers submitted per patient')
+        parser.add_argument('--max-quizzes', type=int, default=5, help='Quizzes answered per user (0 = all)')
+        parser.add_argument('--llm-latency-ms', type=float, default=300, help='Fake LLM latency (in-process mode)')
+        parser.add_argument('--llm-error-rate', type=float, default=0.0, help='Fake LLM error rate (in-process mode)')
+        parser.add_argument('--poll-interval', type=float, default=0.25, help='Seconds between risk task status polls')
+        parser.add_argument('--task-timeout', type=float, default=120, help='Give up on a risk task after this many seconds')
+        parser.add_argument('--timeout', type=float, default=180, help='HTTP request timeout (--url mode)')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--json', type=str, help='Also write the summary as JSON to this path')
+
+    def handle(self, *args, **options):
+        markers = list(Marker.objects.values(
+            'id', 'name',
+            'standard_min_conventional', 'standard_max_conventional',
+            'optimal_min_conventional', 'optimal_max_conventional',
+        ))
+        if not markers:
+            raise CommandError('No markers in the database; run import_markers_from_brg first.')
+        self.markers = markers
+        self.options = options
+        self.recorder = Recorder()
+        rng = random.Random(options['seed'])
+        seeds = [rng.randrange(1 << 30) for _ in range(options['users'])]
+
+        if options['url']:
+            self.make_session = lambda: HTTPSession(options['url'], options['timeout'])
+            wall = self.run_users(seeds)
+        else:
+            self.make_session = InProcessSession
+            fake = {
+                'LATENCY_MS': options['llm_latency_ms'],
+                'LATENCY_JITTER_MS': options['llm_latency_ms'] / 2,
+                'ERROR_RATE': options['llm_error_rate'],
+                'MALFORMED_RATE': 0.0,
+            }
+            with override_settings(LLM_BACKEND='fake', LLM_FAKE=fake, ALLOWED_HOSTS=['*']):
+                wall = self.run_users(seeds)
+
+        self.report(wall)
+
+    def run_users(self, seeds):
+        started = time.monotonic()
+        completed = 0
+        with ThreadPoolExecutor(max_workers=max(1, self.options['concurrency'])) as pool:
+            futures = [pool.submit(self.run_user, seed) for seed in seeds]
+            for future in as_completed(futures):
+                try:
+                    if future.result():
+                        completed += 1
+                except Exception as e:
+                    self.stderr.write(f'Virtual user crashed: {e}')
+        self.completed_users = completed
+        return time.monotonic() - started
+
+    def timed(self, session, stage, fn):
+        started = time.monotonic()
+        try:
+            response = fn()
+        except Exception:
+            self.recorder.add(stage, time.monotonic() - started, False)
+            raise
+        self.recorder.add(stage, time.monotonic() - started, response.ok, response.query_count)
+        return response
+
+    def run_user(self, seed):
+        """Run one virtual user through the whole flow; returns True if it reached the report."""
+        rng = random.Random(seed)
+        session = self.make_session()
+        try:
+            if not self.timed(session, 'demo_signup', lambda: session.get('/demo/')).ok:
+                return False
+
+            panel = build_panel(self.markers, self.options['panel_size'], rng)
+            if not self.timed(session, 'patient_info', lambda: session.post('/patient-info/', panel)).ok:
+                return False
+
+            concerns = self.timed(session, 'health_concerns', lambda: session.get('/health-concerns/'))
+            if not concerns.ok:
+                return False
+
+            condition_ids = list(dict.fromkeys(_QUIZ_LINK_RE.findall(concerns.body)))
+            if self.options['max_quizzes']:
+                condition_ids = condition_ids[:self.options['max_quizzes']]
+            for condition_id in condition_ids:
+                self.run_quiz(session, condition_id, rng)
+
+            plans = self.timed(session, 'treatment_plans', lambda: self._treatment_plans(session))
+            if not plans.ok:
+                return False
+            return self.timed(session, 'report', lambda: session.get('/report/')).ok
+        finally:
+            session.close()
+
+    def _treatment_plans(self, session):
+        page = session.get('/treatment-plans/')
+        match = _STREAM_URL_RE.search(page.body) if page.ok else None
+        if not match:
+            return page
+        streamed = session.stream(match.group(1))
+        queries = None
+        if page.query_count is not None or streamed.query_count is not None:
+            queries = (page.query_count or 0) + (streamed.query_count or 0)
+        return _Response(streamed.status, streamed.body, queries)
+
+    def run_quiz(self, session, condition_id, rng):
+        quiz_path = f'/quiz/{condition_id}/'
+
+        def answer_quiz():
+            page = session.get(quiz_path)
+            if not page.ok:
+                return page
+            answers = {}
+            for symptom in dict.fromkeys(_SYMPTOM_RE.findall(page.body)):
+                answers[f'{symptom}_answer'] = 'yes' if rng.random() < 0.3 else 'no'
+                answers[f'{symptom}_info'] = ''
+            submitted = session.post(quiz_path, answers)
+            queries = None
+            if page.query_count is not None:
+                queries = page.query_count + (submitted.query_count or 0)
+            return _Response(submitted.status, submitted.body, queries)
+
+        if not self.timed(session, 'quiz', answer_quiz).ok:
+            return
+
+        def run_risk_task():
+            start = session.post(f'/api/risk/start/{condition_id}/')
+            if not start.ok:
+                return start
+            task_id = start.json().get('task_id')
+            queries = start.query_count
+            deadline = time.monotonic() + self.options['task_timeout']
+            while time.monotonic() < deadline:
+                time.sleep(self.options['poll_interval'])
+                status = session.get(f'/api/risk/status/{task_id}/')
+                if queries is not None and status.query_count is not None:
+                    queries += status.query_count
+                if not status.ok:
+                    return status
+                state = status.json().get('status')
+                if state == 'done':
+                    return _Response(200, status.body, queries)
+                if state == 'error':
+                    return _Response(500, status.body, queries)
+            return _Response(504, 'risk task timed out', queries)
+
+        self.timed(session, 'risk_task', run_risk_task)
+
+    def report(self, wall):
+        rows = self.recorder.summary()
+        users = self.options['users']
+        mode = self.options['url'] or 'in-process (fake LLM)'
+        self.stdout.write(self.style.SUCCESS(
+            f'\nLoad test: {users} users, concurrency {self.options["concurrency"]}, target {mode}'
+        ))
+        self.stdout.write(
+            f'Completed flows: {self.completed_users}/{users} in {wall:.1f}s '
+            f'({self.completed_users / wall if wall else 0:.2f} flows/s)\n'
+        )
+        header = f"{'stage':<16}{'count':>7}{'err%':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'queries':>10}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in rows:
+            queries = f"{row['queries_mean']:.1f}" if row['queries_mean'] is not None else 'n/a'
+            self.stdout.write(
+                f"{row['stage']:<16}{row['count']:>7}{row['error_rate'] * 100:>6.1f}%"
+                f"{row['p50_ms']:>10.0f}{row['p90_ms']:>10.0f}{row['p99_ms']:>10.0f}{row['max_ms']:>10.0f}{queries:>10}"
+            )
+        if not self.options['url']:
+            self.stdout.write('\nQuery counts cover the request thread only (not background risk task threads).')
+
+        if self.options['json']:
+            with open(self.options['json'], 'w', encoding='utf-8') as f:
+                json.dump({
+                    'users': users,
+                    'concurrency': self.options['concurrency'],
+                    'target': mode,
+                    'completed_users': self.completed_users,
+                    'wall_seconds': wall,
+                    'stages': rows,
+                }, f, indent=2)
@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from bloodapp.models import HealthCondition, Marker
+from bloodapp.associations import get_association_matrix
 
 
 class Command(BaseCommand):
@@ -67,19 +68,20 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING('No health conditions found.'))
             return
 
+        matrix = get_association_matrix()
         for condition in conditions:
             self.stdout.write(f"\n{self.style.SUCCESS(condition.name or condition.condition_id)}:")
             
-            low_markers = condition.associated_markers_low.all()
-            high_markers = condition.associated_markers_high.all()
+            low_markers = [matrix.marker_names[pk] for pk in matrix.marker_pks_for(condition.pk, 'low')]
+            high_markers = [matrix.marker_names[pk] for pk in matrix.marker_pks_for(condition.pk, 'high')]
             
-            if low_markers.exists():
-                self.stdout.write(f"  Low markers: {', '.join([m.name for m in low_markers])}")
+            if low_markers:
+                self.stdout.write(f"  Low markers: {', '.join(low_markers)}")
             else:
                 self.stdout.write("  Low markers: None")
                 
-            if high_markers.exists():
-                self.stdout.write(f"  High markers: {', '.join([m.name for m in high_markers])}")
+            if high_markers:
+                self.stdout.write(f"  High markers: {', '.join(high_markers)}")
             else:
                 self.stdout.write("  High markers: None")
             
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from bloodapp.report_pdf import pdf_dir, prune_report_pdfs
+
+
+class Command(BaseCommand):
+    help = 'Delete cached report PDFs older than REPORT_PDF_MAX_AGE and beyond the REPORT_PDF_MAX_FILES newest'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=float, default=settings.REPORT_PDF_MAX_AGE,
+                            help='Seconds a PDF is kept after it was rendered (default: REPORT_PDF_MAX_AGE)')
+        parser.add_argument('--max-files', type=int, default=settings.REPORT_PDF_MAX_FILES,
+                            help='PDFs kept at most, newest first (default: REPORT_PDF_MAX_FILES)')
+
+    def handle(self, *args, **options):
+        removed = prune_report_pdfs(options['max_age'], options['max_files'])
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} file(s) from {pdf_dir()}'))
@@ -0,0 +1,151 @@
+"""
+Serve the offline LLM stand-in over an OpenAI-compatible HTTP API.
+
+Point the app (or any OpenAI SDK client) at it with:
+    LLM_BACKEND=openai OPENAI_BASE_URL=http://127.0.0.1:8090/v1 OPENAI_API_KEY=stub
+"""
+
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+from bloodapp.llm_fake import FakeLLMClient, FakeLLMError
+
+
+def _usage_payload(usage):
+    return {
+        'prompt_tokens': usage.prompt_tokens,
+        'completion_tokens': usage.completion_tokens,
+        'total_tokens': usage.total_tokens,
+    }
+
+
+def _completion_payload(completion):
+    return {
+        'id': completion.id,
+        'object': 'chat.completion',
+        'created': completion.created,
+        'model': completion.model,
+        'choices': [{
+            'index': 0,
+            'finish_reason': 'stop',
+            'message': {'role': 'assistant', 'content': completion.choices[0].message.content},
+        }],
+        'usage': _usage_payload(completion.usage),
+    }
+
+
+def _chunk_payload(chunk):
+    payload = {
+        'id': chunk.id,
+        'object': 'chat.completion.chunk',
+        'created': int(time.time()),
+        'model': chunk.model,
+        'choices': [],
+    }
+    if chunk.choices:
+        choice = chunk.choices[0]
+        delta = {'content': choice.delta.content} if choice.delta.content is not None else {}
+        payload['choices'] = [{'index': 0, 'finish_reason': choice.finish_reason, 'delta': delta}]
+    if getattr(chunk, 'usage', None) is not None:
+        # Final chunk of a stream requested with stream_options.include_usage
+        payload['usage'] = _usage_payload(chunk.usage)
+    return payload
+
+
+def make_handler(client: FakeLLMClient, quiet: bool):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            if not quiet:
+                super().log_message(format, *args)
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip('/').endswith('/models'):
+                self._send_json(200, {'object': 'list', 'data': [{'id': 'gpt-4o-mini', 'object': 'model'}]})
+            else:
+                self._send_json(404, {'error': {'message': 'Not found', 'type': 'invalid_request_error'}})
+
+        def do_POST(self):
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self._send_json(404, {'error': {'message': 'Not found', 'type': 'invalid_request_error'}})
+                return
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                request = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                self._send_json(400, {'error': {'message': 'Invalid JSON body', 'type': 'invalid_request_error'}})
+                return
+            model = request.get('model') or 'gpt-4o-mini'
+            stream = bool(request.get('stream'))
+            try:
+                include_usage = bool((request.get('stream_options') or {}).get('include_usage'))
+                result = client.complete(model, request.get('messages') or [], stream=stream, include_usage=include_usage)
+            except FakeLLMError as e:
+                # Look like a provider-side overload so SDK retry logic is exercised
+                self._send_json(503, {'error': {'message': str(e), 'type': 'server_error'}})
+                return
+
+            if not stream:
+                self._send_json(200, _completion_payload(result))
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            for chunk in result:
+                self.wfile.write(f"data: {json.dumps(_chunk_payload(chunk))}\n\n".encode('utf-8'))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+    return StubHandler
+
+
+class Command(BaseCommand):
+    help = 'Run an OpenAI-compatible LLM stub server backed by the offline fake (for load and regression tests)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8090)
+        parser.add_argument('--latency-ms', type=float, default=800, help='Mean completion latency')
+        parser.add_argument('--jitter-ms', type=float, default=400, help='Uniform +/- latency jitter')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with HTTP 503')
+        parser.add_argument('--malformed-rate', type=float, default=0.0, help='Share of replies wrapped in prose/single quotes')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--quiet', action='store_true', help='Do not log each request')
+
+    def handle(self, *args, **options):
+        client = FakeLLMClient(
+            latency_ms=options['latency_ms'],
+            latency_jitter_ms=options['jitter_ms'],
+            error_rate=options['error_rate'],
+            malformed_rate=options['malformed_rate'],
+            seed=options['seed'],
+        )
+        server = ThreadingHTTPServer((options['host'], options['port']), make_handler(client, options['quiet']))
+        server.daemon_threads = True
+        self.stdout.write(self.style.SUCCESS(
+            f"LLM stub listening on http://{options['host']}:{options['port']}/v1 "
+            f"(latency {options['latency_ms']}±{options['jitter_ms']} ms, error rate {options['error_rate']})"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
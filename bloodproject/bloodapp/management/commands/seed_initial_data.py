@@ -1,6 +1,7 @@
 import json
 from django.core.management.base import BaseCommand
 from bloodapp.models import Marker, HealthCondition
+from bloodapp.catalog import catalog_batch
 from django.conf import settings
 import os
 
@@ -8,6 +9,11 @@ class Command(BaseCommand):
     help = 'Seed initial Marker and HealthCondition data from JSON files.'
 
     def handle(self, *args, **options):
+        # One catalog version bump for the whole import instead of one per row
+        with catalog_batch():
+            self.import_rows(*args, **options)
+
+    def import_rows(self, *args, **options):
         # Load markers.json
         markers_path = os.path.join(settings.BASE_DIR, 'bloodapp', 'markers.json')
         with open(markers_path, 'r', encoding='utf-8') as f:
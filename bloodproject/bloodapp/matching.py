@@ -0,0 +1,239 @@
+"""
+Condition-name matching for condition IDs returned by the LLM.
+
+ConditionMatcher indexes every known name of a condition (its condition_id,
+name, display_name and the aliases below) as character trigrams in an
+inverted index. A query only touches the posting lists of its own trigrams
+to build a short candidate list ranked by Dice similarity. When no candidate
+reaches the cutoff, which is typical of a typo in a short ID ('gout', 'bph'),
+just that shortlist is rescored on edit similarity (difflib ratio), so the
+query is never compared against the whole catalog.
+get_condition_matcher() builds the index once per catalog version (see
+bloodapp.catalog).
+"""
+
+import re
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .catalog import get_versioned
+
+# Similarity below which a candidate is not considered a match
+DEFAULT_CUTOFF = 0.6
+# Trigram similarity a name needs to make the shortlist, and the shortlist size
+CANDIDATE_FLOOR = 0.2
+SHORTLIST_SIZE = 8
+
+# Extra names the LLM tends to use for catalog conditions, keyed by condition_id.
+# Entries whose condition_id is not in the catalog are ignored.
+CONDITION_ALIASES: Dict[str, List[str]] = {
+    'addrenal_insufficiency': ['adrenal insufficiency', 'adrenal fatigue'],
+    'bph': ['benign prostatic hyperplasia', 'enlarged prostate'],
+    'fatty_liver_steatosis': ['fatty liver', 'hepatic steatosis', 'nafld', 'non alcoholic fatty liver disease'],
+    'helicobacter_pylori': ['h pylori', 'h pylori infection'],
+    'hyperactive_thyroid': ['hyperthyroidism', 'overactive thyroid'],
+    'hypothyroidism_primary': ['primary hypothyroidism', 'hypothyroidism'],
+    'intestinal_hyperpermeability': ['leaky gut', 'increased intestinal permeability'],
+    'lodine_need': ['iodine need', 'iodine deficiency'],
+    'protien_status': ['protein status', 'protein deficiency'],
+    'dysglycemia': ['blood sugar dysregulation'],
+    'insulin_resistance': ['prediabetes', 'pre diabetes'],
+    'renal_insufficiency': ['kidney insufficiency', 'chronic kidney disease'],
+}
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_condition_name(text: str) -> str:
+    """Lowercase and collapse separators so 'Iron_Need', 'iron-need' and 'Iron Need' compare equal."""
+    return _NON_ALNUM.sub(' ', (text or '').lower()).strip()
+
+
+def trigrams(normalized: str) -> frozenset:
+    """Word-level character trigrams, padded like pg_trgm ('  w', ' wo', 'wor', ..., 'rd ')."""
+    grams = set()
+    for word in normalized.split():
+        padded = f'  {word} '
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return frozenset(grams)
+
+
+def _derived_aliases(name: str) -> List[str]:
+    """'Zinc Need' is also asked for as 'zinc deficiency' / 'zinc insufficiency'."""
+    words = normalize_condition_name(name).split()
+    if len(words) > 1 and words[-1] == 'need':
+        stem = ' '.join(words[:-1])
+        return [f'{stem} deficiency', f'{stem} insufficiency']
+    return []
+
+
+class ConditionMatcher:
+    """Trigram inverted index over condition names and aliases."""
+
+    def __init__(self, entries: Iterable[Tuple[str, Iterable[str]]]):
+        self.exact: Dict[str, str] = {}
+        self.entry_ids: List[str] = []
+        self.entry_names: List[str] = []
+        self.entry_sizes: List[int] = []
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        for condition_id, names in entries:
+            seen = set()
+            for name in [condition_id, *names]:
+                normalized = normalize_condition_name(name)
+                if not normalized or normalized in seen:
+                    continue
+                seen.add(normalized)
+                self.exact.setdefault(normalized, condition_id)
+                grams = trigrams(normalized)
+                index = len(self.entry_ids)
+                self.entry_ids.append(condition_id)
+                self.entry_names.append(normalized)
+                self.entry_sizes.append(len(grams))
+                for gram in grams:
+                    self.postings[gram].append(index)
+        self.postings = dict(self.postings)
+        self.condition_ids = frozenset(self.entry_ids)
+
+    def match(self, name: str, limit: int = 5, cutoff: float = DEFAULT_CUTOFF,
+              allowed: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """Ranked (condition_id, score) candidates for a name, best first; score 1.0 is an exact or alias hit."""
+        normalized = normalize_condition_name(name)
+        if not normalized:
+            return []
+        allowed = None if allowed is None else set(allowed)
+        exact = self.exact.get(normalized)
+        if exact is not None and (allowed is None or exact in allowed):
+            return [(exact, 1.0)]
+
+        grams = trigrams(normalized)
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for index in self.postings.get(gram, ()):
+                shared[index] += 1
+
+        candidates = []
+        for index, count in shared.items():
+            if allowed is not None and self.entry_ids[index] not in allowed:
+                continue
+            dice = 2.0 * count / (len(grams) + self.entry_sizes[index])
+            if dice >= CANDIDATE_FLOOR:
+                candidates.append((dice, index))
+        candidates.sort(reverse=True)
+
+        shortlist = candidates[:SHORTLIST_SIZE]
+        if shortlist and shortlist[0][0] < cutoff:
+            # No name is close on trigrams (typical of a typo in a short ID): rescore the shortlist on edits
+            matcher = SequenceMatcher(None, '', normalized, autojunk=False)
+            rescored = []
+            for dice, index in shortlist:
+                matcher.set_seq1(self.entry_names[index])
+                rescored.append((max(dice, matcher.ratio()), index))
+            shortlist = rescored
+
+        best: Dict[str, float] = {}
+        for score, index in shortlist:
+            condition_id = self.entry_ids[index]
+            if score >= cutoff and score > best.get(condition_id, 0.0):
+                best[condition_id] = score
+        ranked = sorted(best.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+    def best(self, name: str, cutoff: float = DEFAULT_CUTOFF, allowed: Optional[Iterable[str]] = None) -> Optional[str]:
+        ranked = self.match(name, limit=1, cutoff=cutoff, allowed=allowed)
+        return ranked[0][0] if ranked else None
+
+
+def _build_condition_matcher() -> ConditionMatcher:
+    from .models import HealthCondition
+
+    entries = []
+    for condition_id, name, display_name in HealthCondition.objects.exclude(condition_id__isnull=True).exclude(
+            condition_id='').values_list('condition_id', 'name', 'display_name'):
+        names = [n for n in (name, display_name) if n]
+        names.extend(_derived_aliases(name or condition_id))
+        names.extend(CONDITION_ALIASES.get(condition_id, []))
+        entries.append((condition_id, names))
+    return ConditionMatcher(entries)
+
+
+def get_condition_matcher() -> ConditionMatcher:
+    """Process-wide matcher for the current catalog version."""
+    return get_versioned('condition_matcher', _build_condition_matcher)
+
+
+def find_closest_condition_id(condition_name: str, valid_condition_ids: Optional[List[str]] = None,
+                              cutoff: float = DEFAULT_CUTOFF) -> Optional[str]:
+    """
+    Find the closest matching condition ID using the catalog's trigram matcher.
+    
+    Args:
+        condition_name: The condition name to match
+        valid_condition_ids: Optional list of condition IDs the match is restricted to
+        cutoff: Minimum trigram similarity (0.0 to 1.0) for a match to be considered
+    
+    Returns:
+        The closest matching condition ID or None if no match above the cutoff
+    """
+    return get_condition_matcher().best(condition_name, cutoff=cutoff, allowed=valid_condition_ids)
+
+
+def condition_id_to_display_name(condition_id: str) -> str:
+    """
+    Convert a condition ID to a proper display name.
+    
+    Args:
+        condition_id: The condition ID (e.g., 'oxidative_stress')
+    
+    Returns:
+        Proper display name (e.g., 'Oxidative Stress')
+    """
+    if not condition_id:
+        return "Unknown Condition"
+    
+    # Replace underscores with spaces and capitalize each word
+    display_name = condition_id.replace('_', ' ').title()
+    return display_name
+
+
+def match_conditions_with_fallback(ai_conditions: List[Dict], valid_condition_ids: Optional[List[str]] = None) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Match AI-returned conditions to valid condition IDs with fallback for unmatched conditions.
+    
+    Args:
+        ai_conditions: List of conditions returned by AI
+        valid_condition_ids: Optional list of condition IDs to restrict matching to (default: whole catalog)
+    
+    Returns:
+        Tuple of (matched_conditions, other_conditions)
+    """
+    matched_conditions = []
+    other_conditions = []
+    
+    for condition in ai_conditions:
+        condition_id = condition.get('condition_id') or condition.get('id')
+        if not condition_id:
+            continue
+            
+        # Try to find a match
+        matched_id = find_closest_condition_id(condition_id, valid_condition_ids)
+        
+        if matched_id:
+            # Found a match, use the matched ID
+            matched_conditions.append({
+                'condition_id': matched_id,
+                'level_of_risk': condition.get('level_of_risk') or condition.get('risk') or '',
+                'explanation': condition.get('explanation') or '',
+                'original_ai_id': condition_id  # Keep track of what AI originally returned
+            })
+        else:
+            # No match found, add to other conditions
+            other_conditions.append({
+                'name': condition_id_to_display_name(condition_id),
+                'original_id': condition_id,
+                'level_of_risk': condition.get('level_of_risk') or condition.get('risk') or '',
+                'explanation': condition.get('explanation') or ''
+            })
+    
+    return matched_conditions, other_conditions
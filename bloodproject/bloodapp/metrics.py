@@ -0,0 +1,436 @@
+"""
+Application metrics in the Prometheus text format, served at /metrics.
+
+Counters and histograms are recorded without locks: every thread adds to its
+own shard (a plain dict), and a scrape merges the shards. When a thread exits
+(risk task threads, PDF renderers, executor threads) its shard is folded into
+a per-process total, so short-lived threads don't leave shards behind. Under gunicorn each
+worker also writes its merged values to METRICS_DIR (metrics-<pid>.json,
+replaced atomically every METRICS_FLUSH_INTERVAL seconds and when the worker
+exits); the worker serving /metrics sums every file, so the totals cover all
+workers. gunicorn.conf.py empties the directory when the master starts and
+folds the file of each exited worker into archive.json, so counters survive
+worker recycling. Without METRICS_DIR a scrape only covers the process that
+serves it.
+
+Counters created with collect= read their values from another module's own
+per-process statistics (two-tier cache lookups, LLM JSON parse outcomes) when
+a snapshot is taken. Gauges are computed by the scraping process (risk task
+queue depth, from the database).
+"""
+
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+ARCHIVE_FILE = 'archive.json'
+
+_metrics: Dict[str, 'Metric'] = {}
+_shards: Dict[int, Dict] = {}
+_retired: Dict = {}  # folded shards of exited threads
+# Taken when a thread records its first sample or exits, and by scrapes; never per sample
+_shards_lock = threading.Lock()
+_local = threading.local()
+_flusher_pid: Optional[int] = None
+
+
+class _ThreadShard:
+    """Owner of a thread's shard, kept in the thread-local: it is freed when the thread exits."""
+
+    def __init__(self):
+        self.values: Dict = {}
+
+
+def _fold(into: Dict, shard: Dict):
+    for key, value in shard.items():
+        current = into.get(key)
+        if current is None:
+            into[key] = list(value) if isinstance(value, list) else value
+        elif isinstance(value, list):
+            into[key] = [a + b for a, b in zip(current, value)]
+        else:
+            into[key] = current + value
+
+
+def _retire(shard_id: int, shard: Dict):
+    with _shards_lock:
+        if _shards.pop(shard_id, None) is not None:
+            _fold(_retired, shard)
+
+
+def _shard() -> Dict:
+    owner = getattr(_local, 'shard', None)
+    if owner is None:
+        owner = _local.shard = _ThreadShard()
+        with _shards_lock:
+            _shards[id(owner.values)] = owner.values
+        # References the values only, so the owner can still be freed with the thread
+        weakref.finalize(owner, _retire, id(owner.values), owner.values)
+        _start_flusher()
+    return owner.values
+
+
+def _reset_after_fork():
+    # A forked worker starts from zero; the master's values are not its own
+    global _local, _shards_lock, _flusher_pid
+    _local = threading.local()
+    _shards.clear()
+    _retired.clear()
+    _shards_lock = threading.Lock()
+    _flusher_pid = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class Metric:
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _metrics[name] = self
+
+    def _key(self, labels: Dict) -> Tuple[str, Tuple[str, ...]]:
+        return self.name, tuple(str(labels.get(label, '')) for label in self.labelnames)
+
+
+class Counter(Metric):
+    """Monotonic counter; with collect=, a callable returning {label values tuple: value} for this process."""
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=(), collect: Optional[Callable[[], Dict]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        shard = _shard()
+        shard[key] = shard.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    """Observations counted into fixed buckets, with their sum and count."""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        shard = _shard()
+        entry = shard.get(key)
+        if entry is None:
+            # Per-bucket (not cumulative) counts, the +Inf overflow, then sum and count
+            entry = shard[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        entry[bisect_left(self.buckets, value)] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+class Gauge(Metric):
+    """Current value computed by the scraping process; collect() returns {label values tuple: value}."""
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), collect: Callable[[], Dict] = dict):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+
+# ---------------------------------------------------------------------------
+# Per-process snapshots and their aggregation
+# ---------------------------------------------------------------------------
+
+def _add(values: Dict, name: str, labels: Tuple, value):
+    series = values.setdefault(name, {})
+    current = series.get(labels)
+    if current is None:
+        series[labels] = list(value) if isinstance(value, list) else value
+    elif isinstance(value, list):
+        if len(current) == len(value):
+            series[labels] = [a + b for a, b in zip(current, value)]
+    else:
+        series[labels] = current + value
+
+
+def process_values() -> Dict[str, Dict[Tuple, object]]:
+    """This process's counters and histograms: the merged thread shards plus collected counters."""
+    values: Dict[str, Dict[Tuple, object]] = {}
+    # Under the lock, so a shard retiring meanwhile is counted once, live or retired
+    with _shards_lock:
+        for shard in [_retired, *_shards.values()]:
+            for (name, labels), value in shard.copy().items():
+                _add(values, name, labels, value)
+    for metric in list(_metrics.values()):
+        if isinstance(metric, Counter) and metric.collect is not None:
+            try:
+                for labels, value in metric.collect().items():
+                    _add(values, metric.name, labels, value)
+            except Exception:
+                logger.exception('Collecting %s failed', metric.name)
+    return values
+
+
+def _dump(values: Dict) -> Dict:
+    return {name: [[list(labels), value] for labels, value in series.items()] for name, series in values.items()}
+
+
+def _load(data: Dict, into: Dict):
+    for name, series in data.items():
+        for labels, value in series:
+            _add(into, name, tuple(labels), value)
+
+
+def _read(path: str) -> Dict:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write(path: str, data: Dict):
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def metrics_dir() -> Optional[str]:
+    return getattr(settings, 'METRICS_DIR', None) or None
+
+
+def write_snapshot(directory: Optional[str] = None):
+    """Write this process's values to <directory>/metrics-<pid>.json; no-op without METRICS_DIR."""
+    directory = directory or metrics_dir()
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    _write(os.path.join(directory, f'metrics-{os.getpid()}.json'), _dump(process_values()))
+
+
+def _flush_loop(interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            write_snapshot()
+        except Exception:
+            logger.exception('Writing the metrics snapshot failed')
+
+
+def _start_flusher():
+    global _flusher_pid
+    if _flusher_pid == os.getpid() or not metrics_dir():
+        return
+    _flusher_pid = os.getpid()
+    interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+    threading.Thread(target=_flush_loop, args=(interval,), name='metrics-flush', daemon=True).start()
+
+
+def clear_metrics_dir(directory: str):
+    """Remove every snapshot; called by the gunicorn master before it starts workers."""
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        os.remove(path)
+
+
+def mark_process_dead(pid: int, directory: str):
+    """Fold an exited worker's snapshot into the archive so its counts outlive it (gunicorn master only)."""
+    path = os.path.join(directory, f'metrics-{pid}.json')
+    if not os.path.exists(path):
+        return
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+    values: Dict = {}
+    _load(_read(archive_path), values)
+    _load(_read(path), values)
+    _write(archive_path, _dump(values))
+    os.remove(path)
+
+
+def aggregated_values() -> Dict[str, Dict[Tuple, object]]:
+    """Values of every worker (METRICS_DIR) or of this process alone."""
+    directory = metrics_dir()
+    if not directory:
+        return process_values()
+    write_snapshot(directory)
+    values: Dict = {}
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        _load(_read(path), values)
+    return values
+
+
+# ---------------------------------------------------------------------------
+# Text exposition
+# ---------------------------------------------------------------------------
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _number(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics() -> str:
+    """Every registered metric in the Prometheus text exposition format (version 0.0.4)."""
+    values = aggregated_values()
+    lines = []
+    for metric in list(_metrics.values()):
+        if isinstance(metric, Gauge):
+            try:
+                series = metric.collect()
+            except Exception:
+                logger.exception('Collecting %s failed', metric.name)
+                continue
+        else:
+            series = values.get(metric.name, {})
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for labels, value in sorted(series.items()):
+            if not isinstance(metric, Histogram):
+                lines.append(f'{metric.name}{_labels(metric.labelnames, labels)} {_number(value)}')
+                continue
+            if len(value) != len(metric.buckets) + 3:
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (float('inf'),), value):
+                cumulative += count
+                le = f'le="{_number(float(bound))}"'
+                lines.append(f'{metric.name}_bucket{_labels(metric.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{metric.name}_sum{_labels(metric.labelnames, labels)} {_number(float(value[-2]))}')
+            lines.append(f'{metric.name}_count{_labels(metric.labelnames, labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+# ---------------------------------------------------------------------------
+# Application metrics
+# ---------------------------------------------------------------------------
+
+def _cache_lookups():
+    from .cache import cache_stats
+
+    return {
+        (namespace, result): stats[field]
+        for namespace, stats in cache_stats().items()
+        for result, field in (('local_hit', 'local_hits'), ('shared_hit', 'shared_hits'), ('miss', 'misses'))
+    }
+
+
+def _llm_parse_outcomes():
+    from .llm_json import get_parse_stats
+
+    return {
+        (call_site, outcome): stats[outcome]
+        for call_site, stats in get_parse_stats().items()
+        for outcome in ('clean', 'repaired', 'failed', 'reasks')
+    }
+
+
+def _risk_task_queue():
+    from django.db.models import Count
+    from .models import RiskComputationTask
+
+    depth = {('queued',): 0, ('running',): 0}
+    rows = RiskComputationTask.objects.filter(status__in=['queued', 'running']).values('status').annotate(n=Count('id'))
+    for row in rows:
+        depth[(row['status'],)] = row['n']
+    return depth
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'bloodapp_http_request_duration_seconds', 'Request latency by view.', ('view', 'method', 'status'))
+LLM_REQUEST_SECONDS = Histogram(
+    'bloodapp_llm_request_duration_seconds', 'Chat completion latency by call site.', ('call_site', 'outcome'))
+LLM_TOKENS = Counter(
+    'bloodapp_llm_tokens_total', 'Tokens reported by the LLM API by call site.', ('call_site', 'kind'))
+LLM_PARSE_OUTCOMES = Counter(
+    'bloodapp_llm_json_parse_total', 'LLM JSON replies by call site and parse outcome.', ('call_site', 'outcome'),
+    collect=_llm_parse_outcomes)
+RISK_TASK_SECONDS = Histogram(
+    'bloodapp_risk_task_duration_seconds', 'Risk computation task run time by final status.', ('status',))
+RISK_TASKS_PENDING = Gauge(
+    'bloodapp_risk_tasks', 'Risk computation tasks waiting or running.', ('status',), collect=_risk_task_queue)
+PDF_EXTRACTION_SECONDS = Histogram(
+    'bloodapp_pdf_extraction_duration_seconds', 'Text extraction time of uploaded lab PDFs.', ('outcome',))
+CACHE_LOOKUPS = Counter(
+    'bloodapp_cache_lookups_total', 'Two-tier cache lookups by namespace and the tier that answered.',
+    ('namespace', 'result'), collect=_cache_lookups)
+
+
+def observe_llm_call(call_site: str, seconds: float, succeeded: bool, usage=None):
+    """Record one chat completion and the token usage the API reported for it, if any."""
+    LLM_REQUEST_SECONDS.observe(seconds, call_site=call_site, outcome='ok' if succeeded else 'error')
+    if usage is not None:
+        LLM_TOKENS.inc(getattr(usage, 'prompt_tokens', 0) or 0, call_site=call_site, kind='prompt')
+        LLM_TOKENS.inc(getattr(usage, 'completion_tokens', 0) or 0, call_site=call_site, kind='completion')
+
+
+# ---------------------------------------------------------------------------
+# Middleware
+# ---------------------------------------------------------------------------
+
+def _observe_request(request, response, started: float):
+    match = getattr(request, 'resolver_match', None)
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - started,
+        view=match.view_name if match else '<unresolved>',
+        method=request.method,
+        status=f'{response.status_code // 100}xx',
+    )
+
+
+class MetricsMiddleware:
+    """Time every request into bloodapp_http_request_duration_seconds; sync and async."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        _observe_request(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        _observe_request(request, response, started)
+        return response
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.3 on 2026-10-19 07:27
+
+from django.db import migrations, models
+
+
+# Frozen copy of the field lists and renderer in bloodapp.models as of this
+# migration, so later changes to the model code cannot alter what it writes.
+NARRATIVE_LOW_FIELDS = (
+    ('clinical_implications_low', 'Clinical implications'),
+    ('other_conditions_low', 'Other related conditions'),
+    ('interfering_factors_falsely_decreased', 'Interfering factors (falsely decreased)'),
+    ('drug_causes_decreased', 'Drug causes (decreased)'),
+)
+NARRATIVE_HIGH_FIELDS = (
+    ('clinical_implications_high', 'Clinical implications'),
+    ('other_conditions_high', 'Other related conditions'),
+    ('interfering_factors_falsely_elevated', 'Interfering factors (falsely elevated)'),
+    ('drug_causes_increased', 'Drug causes (increased)'),
+)
+
+
+def _render_block(marker, side, fields):
+    return "\n".join(
+        f" - When {side}: {label}: {getattr(marker, field)}"
+        for field, label in fields
+        if getattr(marker, field, None)
+    )
+
+
+def render_existing_narratives(apps, schema_editor):
+    Marker = apps.get_model('bloodapp', 'Marker')
+    markers = list(Marker.objects.all())
+    for marker in markers:
+        marker.narrative_low = _render_block(marker, 'LOW', NARRATIVE_LOW_FIELDS)
+        marker.narrative_high = _render_block(marker, 'HIGH', NARRATIVE_HIGH_FIELDS)
+    Marker.objects.bulk_update(markers, ['narrative_low', 'narrative_high'], batch_size=200)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bloodapp', '0007_merge_20250821_2110'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='marker',
+            name='narrative_high',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='marker',
+            name='narrative_low',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(render_existing_narratives, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,173 @@
+# Generated by Django 5.2.3 on 2026-10-19 07:58
+
+import hashlib
+import re
+from typing import Dict, List
+
+from django.db import migrations, models
+
+
+# Frozen copy of bloodapp.symptoms as of this migration, so later changes to the
+# parser cannot alter what it writes.
+def parse_signs_and_symptoms(text):
+    """
+    Parse signs and symptoms text and extract individual bullet points.
+    
+    Handles various formatting patterns:
+    - Numbered lists (1., 2., 3., etc.)
+    - Bullet points with special characters (e, ¢, «, etc.)
+    - Lines starting with common bullet markers
+    - Text with preambles ending in colons
+    
+    Returns a list of individual symptoms.
+    """
+    if not text:
+        return []
+
+    # Fast-path: if the new CSV "s/sx bullet" format is present, split on «
+    if '«' in text:
+        parts = [p.strip() for p in re.split(r'«', text) if p and p.strip()]
+        cleaned = []
+        for p in parts:
+            # Strip leading bullet glyphs that may have been persisted
+            p = re.sub(r'^[•\-\*\d\.\s]+', '', p).strip()
+            if p:
+                cleaned.append(p)
+        if cleaned:
+            return cleaned
+    
+    # Pre-process text to handle common issues
+    text = text.replace('L.', '1.')  # Fix common typo where L is used instead of 1
+    
+    # Split into lines and clean up
+    lines = text.strip().split('\n')
+    symptoms = []
+    current_symptom = ""
+    in_symptom_list = False
+    
+    # Patterns to identify bullet points
+    bullet_patterns = [
+        r'^\s*(\d+\.)\s*(.+)$',  # Numbered lists: 1. symptom
+        r'^\s*([e¢«•·▪▫◦‣⁃])\s*(.+)$',  # Special bullet characters
+        r'^\s*([A-Z]\.)\s*(.+)$',  # Letter bullets: A. symptom
+        r'^\s*[-*]\s*(.+)$',  # Dash or asterisk bullets
+    ]
+    
+    # Compile patterns for efficiency
+    compiled_patterns = [re.compile(pattern) for pattern in bullet_patterns]
+    
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        
+        # Check if this line starts a symptom list
+        if any(keyword in line.lower() for keyword in [
+            'signs and symptoms', 'symptoms may include', 'common symptoms',
+            'may include', 'can include', 'typically include', 'following signs and symptoms'
+        ]):
+            in_symptom_list = True
+            continue
+        
+        # Skip preamble lines that don't contain actual symptoms
+        if not in_symptom_list and any(keyword in line.lower() for keyword in [
+            'early stages', 'as the disease progresses', 'depending on',
+            'often present no symptoms', 'causes a decrease', 'leading to'
+        ]):
+            continue
+            
+        # Check if this line matches any bullet pattern
+        is_bullet = False
+        for pattern in compiled_patterns:
+            match = pattern.match(line)
+            if match:
+                # If we have a current symptom being built, save it
+                if current_symptom:
+                    symptoms.append(current_symptom.strip())
+                    current_symptom = ""
+                
+                # Extract the symptom text (group 2 for numbered/lettered, group 1 for others)
+                if len(match.groups()) == 2:
+                    symptom_text = match.group(2).strip()
+                else:
+                    symptom_text = match.group(1).strip()
+                
+                if symptom_text:
+                    current_symptom = symptom_text
+                is_bullet = True
+                break
+        
+        # If no bullet pattern matched, check if it's a continuation of a symptom
+        if not is_bullet and line:
+            # Skip lines that are likely headers or preambles
+            if not any(keyword in line.lower() for keyword in [
+                'signs and symptoms', 'symptoms may include', 'common symptoms',
+                'early stages', 'as the disease progresses', 'depending on',
+                'may include', 'can include', 'typically include'
+            ]):
+                # Check if line ends with colon (likely a header)
+                if not line.endswith(':'):
+                    # If we have a current symptom, append to it
+                    if current_symptom:
+                        current_symptom += " " + line
+                    else:
+                        # Only add standalone lines if we're in a symptom list
+                        if in_symptom_list:
+                            symptoms.append(line)
+    
+    # Add the last symptom if there is one
+    if current_symptom:
+        symptoms.append(current_symptom.strip())
+    
+    # Clean up symptoms
+    cleaned_symptoms = []
+    for symptom in symptoms:
+        # Remove extra whitespace and normalize
+        cleaned = ' '.join(symptom.split())
+        if cleaned and len(cleaned) > 2:  # Filter out very short items
+            cleaned_symptoms.append(cleaned)
+    
+    return cleaned_symptoms
+
+
+def symptom_id(text: str) -> str:
+    """Stable ID for a symptom: the same text always gets the same ID across re-imports."""
+    normalized = ' '.join((text or '').lower().split())
+    return 'sx_' + hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:10]
+
+
+def build_symptom_list(text) -> List[Dict[str, str]]:
+    """Parsed symptoms as [{'id', 'text'}], in display order; repeated symptoms are listed once."""
+    symptoms = []
+    seen = set()
+    for symptom in parse_signs_and_symptoms(text):
+        sid = symptom_id(symptom)
+        if sid in seen:
+            continue
+        seen.add(sid)
+        symptoms.append({'id': sid, 'text': symptom})
+    return symptoms
+
+
+def parse_existing_symptoms(apps, schema_editor):
+    HealthCondition = apps.get_model('bloodapp', 'HealthCondition')
+    conditions = list(HealthCondition.objects.all())
+    for condition in conditions:
+        condition.symptoms = build_symptom_list(condition.signs_and_symptoms)
+    HealthCondition.objects.bulk_update(conditions, ['symptoms'], batch_size=200)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bloodapp', '0009_catalogversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='healthcondition',
+            name='symptoms',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.RunPython(parse_existing_symptoms, migrations.RunPython.noop),
+    ]
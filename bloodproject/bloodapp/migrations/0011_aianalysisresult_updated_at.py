@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-19 09:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bloodapp', '0010_healthcondition_symptoms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aianalysisresult',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
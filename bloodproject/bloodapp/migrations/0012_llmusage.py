@@ -0,0 +1,32 @@
+# Generated by Django 5.2.3 on 2026-10-19 08:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bloodapp', '0011_aianalysisresult_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(choices=[('patient_info_pdf', 'Patient Info PDF Import'), ('health_concerns', 'Health Concerns'), ('risk_task', 'Risk Task'), ('treatment_plan', 'Treatment Plan'), ('other', 'Other')], default='other', max_length=20)),
+                ('call_site', models.CharField(max_length=50)),
+                ('model', models.CharField(blank=True, max_length=100)),
+                ('prompt_tokens', models.PositiveIntegerField(default=0)),
+                ('completion_tokens', models.PositiveIntegerField(default=0)),
+                ('latency_ms', models.FloatField(default=0)),
+                ('cache_hit', models.BooleanField(default=False)),
+                ('succeeded', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
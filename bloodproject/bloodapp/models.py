@@ -3,7 +3,9 @@ from django.db import models
 # Create your models here.
 
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
+
+from .symptoms import build_symptom_list
 
 class PatientProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -43,6 +45,7 @@ class AIAnalysisResult(models.Model):
         ('treatment_plans', 'Treatment Plans Analysis')
     ])
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     analysis_data = models.JSONField()  # Store the AI analysis results
     is_completed = models.BooleanField(default=False)
 
@@ -53,6 +56,84 @@ class AIAnalysisResult(models.Model):
         return f"{self.user.username} - {self.stage}"
 
 
+# Narrative columns rendered into the per-direction prompt blocks, as (field, label) pairs.
+MARKER_NARRATIVE_LOW_FIELDS = (
+    ('clinical_implications_low', 'Clinical implications'),
+    ('other_conditions_low', 'Other related conditions'),
+    ('interfering_factors_falsely_decreased', 'Interfering factors (falsely decreased)'),
+    ('drug_causes_decreased', 'Drug causes (decreased)'),
+)
+MARKER_NARRATIVE_HIGH_FIELDS = (
+    ('clinical_implications_high', 'Clinical implications'),
+    ('other_conditions_high', 'Other related conditions'),
+    ('interfering_factors_falsely_elevated', 'Interfering factors (falsely elevated)'),
+    ('drug_causes_increased', 'Drug causes (increased)'),
+)
+
+
+def render_marker_narratives(marker) -> tuple:
+    """
+    Render the "When LOW" / "When HIGH" prompt blocks for a marker.
+
+    Works on any object exposing the narrative columns (including historical
+    models inside migrations). Returns a (low_block, high_block) tuple of
+    newline-joined lines; a block is '' when the marker has no narrative for it.
+    """
+    def _block(side, fields):
+        return "\n".join(
+            f" - When {side}: {label}: {getattr(marker, field)}"
+            for field, label in fields
+            if getattr(marker, field, None)
+        )
+
+    return (
+        _block('LOW', MARKER_NARRATIVE_LOW_FIELDS),
+        _block('HIGH', MARKER_NARRATIVE_HIGH_FIELDS),
+    )
+
+
+MARKER_NARRATIVE_SOURCE_FIELDS = frozenset(
+    field for field, _ in MARKER_NARRATIVE_LOW_FIELDS + MARKER_NARRATIVE_HIGH_FIELDS
+)
+MARKER_NARRATIVE_BLOCK_FIELDS = ('narrative_low', 'narrative_high')
+
+
+class MarkerQuerySet(models.QuerySet):
+    """
+    Keeps narrative_low/narrative_high in step on the bulk write paths that
+    bypass Marker.save(): bulk_create(), bulk_update() and update().
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for marker in objs:
+            marker.narrative_low, marker.narrative_high = render_marker_narratives(marker)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        fields = list(fields)
+        if MARKER_NARRATIVE_SOURCE_FIELDS.intersection(fields):
+            objs = list(objs)
+            for marker in objs:
+                marker.narrative_low, marker.narrative_high = render_marker_narratives(marker)
+            fields += [f for f in MARKER_NARRATIVE_BLOCK_FIELDS if f not in fields]
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def update(self, **kwargs):
+        if not MARKER_NARRATIVE_SOURCE_FIELDS.intersection(kwargs):
+            return super().update(**kwargs)
+        # The new values may be expressions, so re-read the rows after the update
+        with transaction.atomic(using=self.db):
+            pks = list(self.values_list('pk', flat=True))
+            rows = super().update(**kwargs)
+            base = self.model._base_manager.using(self.db)
+            markers = list(base.filter(pk__in=pks).only('pk', *MARKER_NARRATIVE_SOURCE_FIELDS))
+            for marker in markers:
+                marker.narrative_low, marker.narrative_high = render_marker_narratives(marker)
+            base.bulk_update(markers, list(MARKER_NARRATIVE_BLOCK_FIELDS), batch_size=200)
+        return rows
+
+
 class Marker(models.Model):
     name = models.CharField(max_length=100, unique=True)
     display_name = models.CharField(max_length=150)
@@ -92,6 +173,21 @@ class Marker(models.Model):
     drug_causes_decreased = models.TextField(null=True, blank=True)
     drug_causes_increased = models.TextField(null=True, blank=True)
 
+    # Denormalized prompt blocks rendered from the narrative fields above on save
+    # (and by MarkerQuerySet on bulk writes), so building a risk prompt only has
+    # to join them.
+    narrative_low = models.TextField(blank=True, default='', editable=False)
+    narrative_high = models.TextField(blank=True, default='', editable=False)
+
+    objects = MarkerQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        self.narrative_low, self.narrative_high = render_marker_narratives(self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'narrative_low', 'narrative_high'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.display_name
 
@@ -114,10 +210,50 @@ class MarkerReading(models.Model):
         return f"{self.marker.display_name}: {self.value}"
 
 
+class HealthConditionQuerySet(models.QuerySet):
+    """
+    Keeps symptoms in step with signs_and_symptoms on the bulk write paths that
+    bypass HealthCondition.save(): bulk_create(), bulk_update() and update().
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for condition in objs:
+            condition.symptoms = build_symptom_list(condition.signs_and_symptoms)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        fields = list(fields)
+        if 'signs_and_symptoms' in fields:
+            objs = list(objs)
+            for condition in objs:
+                condition.symptoms = build_symptom_list(condition.signs_and_symptoms)
+            if 'symptoms' not in fields:
+                fields.append('symptoms')
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def update(self, **kwargs):
+        if 'signs_and_symptoms' not in kwargs:
+            return super().update(**kwargs)
+        # The new value may be an expression, so re-read the rows after the update
+        with transaction.atomic(using=self.db):
+            pks = list(self.values_list('pk', flat=True))
+            rows = super().update(**kwargs)
+            base = self.model._base_manager.using(self.db)
+            conditions = list(base.filter(pk__in=pks).only('pk', 'signs_and_symptoms'))
+            for condition in conditions:
+                condition.symptoms = build_symptom_list(condition.signs_and_symptoms)
+            base.bulk_update(conditions, ['symptoms'], batch_size=200)
+        return rows
+
+
 class HealthCondition(models.Model):
     name = models.CharField(max_length=200, unique=True, null=True, blank=True)
     background = models.TextField(null=True, blank=True)
     signs_and_symptoms = models.TextField(null=True, blank=True)  # s/sx field from CSV
+    # Parsed signs_and_symptoms as [{'id', 'text'}], refreshed on save and by
+    # HealthConditionQuerySet on bulk writes (see bloodapp.symptoms)
+    symptoms = models.JSONField(default=list, blank=True, editable=False)
     diagnosis = models.TextField(null=True, blank=True)  # dx field from CSV
     causes = models.TextField(null=True, blank=True)
     diseases = models.TextField(null=True, blank=True)  # dzs field from CSV
@@ -137,6 +273,15 @@ class HealthCondition(models.Model):
         help_text="Expert commentary on which markers are most/least important for risk assessment"
     )
 
+    objects = HealthConditionQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        self.symptoms = build_symptom_list(self.signs_and_symptoms)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'symptoms'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name or self.display_name or (self.condition_id or 'Health Condition')
 
@@ -184,3 +329,37 @@ class RiskComputationTask(models.Model):
 
     def __str__(self):
         return f"Task({self.user.username}, {self.condition_id}, {self.status})"
+
+
+class CatalogVersion(models.Model):
+    """Single-row counter bumped whenever markers, conditions or their links change (see bloodapp.catalog)."""
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Catalog v{self.version}"
+
+
+class LLMUsage(models.Model):
+    """One LLM call, or a stage served from its stored result instead (cache_hit); rows are only appended (bloodapp.llm_usage)."""
+    STAGE_CHOICES = [
+        ('patient_info_pdf', 'Patient Info PDF Import'),
+        ('health_concerns', 'Health Concerns'),
+        ('risk_task', 'Risk Task'),
+        ('treatment_plan', 'Treatment Plan'),
+        ('other', 'Other'),
+    ]
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES, default='other')
+    call_site = models.CharField(max_length=50)
+    model = models.CharField(max_length=100, blank=True)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    latency_ms = models.FloatField(default=0)
+    cache_hit = models.BooleanField(default=False)
+    succeeded = models.BooleanField(default=True)
+    # When the call finished, not when the buffered row was written
+    created_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"LLMUsage({self.stage}, {self.call_site}, {self.prompt_tokens}+{self.completion_tokens})"
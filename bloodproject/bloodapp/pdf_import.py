@@ -0,0 +1,96 @@
+"""
+Lab report PDF import: text extraction and the LLM mapping of the extracted
+values onto catalog markers.
+"""
+
+import json
+import time
+
+from asgiref.sync import sync_to_async
+
+from .ai_analysis import achat_json, chat_json
+from .cache import catalog_cache
+from .llm import get_async_llm_client, get_llm_client
+from .llm_json import PDF_MARKER_MAPPING_SCHEMA
+from .metrics import PDF_EXTRACTION_SECONDS
+from .models import Marker
+from .profiling import profile_section
+
+
+def get_marker_meta_list():
+    """Return list of marker names and unit options for prompting the LLM (cached per catalog version)."""
+    def build():
+        meta = []
+        for m in Marker.objects.all().order_by('display_name'):
+            meta.append({
+                'name': m.name,
+                'display_name': m.display_name,
+                'units': {
+                    'standard': m.standard_unit,
+                    'international': m.international_unit
+                }
+            })
+        return meta
+    return catalog_cache.get_or_set('marker_meta', build)
+
+
+def extract_text_from_pdf(file_obj) -> str:
+    """Extract text from a PDF file-like object using PyPDF2, if available."""
+    try:
+        import PyPDF2
+    except Exception as e:
+        raise RuntimeError("PyPDF2 not installed. Please install PyPDF2 to enable PDF extraction.")
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        with profile_section('pdf'):
+            reader = PyPDF2.PdfReader(file_obj)
+            text = []
+            for page in reader.pages:
+                try:
+                    text.append(page.extract_text() or '')
+                except Exception:
+                    continue
+        outcome = 'ok'
+    finally:
+        PDF_EXTRACTION_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+    return "\n".join(text)
+
+
+def _pdf_mapping_messages(pdf_text: str, marker_meta: list) -> list:
+    system_prompt = (
+        "You receive: (1) a JSON array of blood markers with their possible unit systems; "
+        "(2) raw text extracted from a user's lab PDF. "
+        "For each marker found in the PDF, return JSON array of objects with: "
+        "name (closest exact match to one of the provided markers' 'name'), value (number), unit_system ('standard' or 'international'). "
+        "Use the provided units to infer which system is used if units are present in the text. Return ONLY JSON."
+    )
+    user_payload = {
+        'marker_meta': marker_meta,
+        'pdf_text': pdf_text[:20000],  # cap for token safety
+    }
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": json.dumps(user_payload, ensure_ascii=False)}
+    ]
+
+
+def map_pdf_values_to_markers(pdf_text: str) -> list:
+    """Call the LLM with marker meta and the PDF text to return list of {name, value, unit_system}."""
+    client = get_llm_client()
+    messages = _pdf_mapping_messages(pdf_text, get_marker_meta_list())
+    return chat_json(client, messages, PDF_MARKER_MAPPING_SCHEMA, call_site='pdf_marker_mapping')
+
+
+async def aextract_text_from_pdf(file_obj) -> str:
+    """extract_text_from_pdf in a worker thread: PDF parsing is CPU-bound and would stall the event loop."""
+    return await sync_to_async(extract_text_from_pdf, thread_sensitive=False)(file_obj)
+
+
+async def amap_pdf_values_to_markers(pdf_text: str, marker_meta: list = None) -> list:
+    """Async variant of map_pdf_values_to_markers; pass marker_meta to skip the catalog query."""
+    client = get_async_llm_client()
+    if marker_meta is None:
+        marker_meta = await sync_to_async(get_marker_meta_list)()
+    messages = _pdf_mapping_messages(pdf_text, marker_meta)
+    return await achat_json(client, messages, PDF_MARKER_MAPPING_SCHEMA, call_site='pdf_marker_mapping')
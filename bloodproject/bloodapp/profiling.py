@@ -0,0 +1,224 @@
+"""
+Opt-in per-request profiling.
+
+ProfilingMiddleware profiles a request when it carries the PROFILING_HEADER
+header (X-Profile: 1) or is drawn by PROFILING_SAMPLE_RATE. A profiled request
+records its wall time split into the sections below, writes the record as one
+JSON log line (logger bloodapp.profiling), answers with X-DB-Query-Count and a
+Server-Timing header, and adds the record to a per-view rolling window whose
+percentiles staff can read at /ops/profile/ (profile_summary()).
+
+- db: every query, counted and timed by an execute wrapper that
+  connect_profiling_signals() installs on each new connection;
+- llm: chat completions in bloodapp.ai_analysis;
+- pdf: text extraction from uploaded lab PDFs;
+- template: rendering by the ProfiledDjangoTemplates backend (top-level
+  templates only, so includes are not counted twice).
+
+The active profile lives in a context variable, so queries and sections inside
+sync_to_async threads of async views are attributed to their request; work in
+background threads (risk tasks, report PDF rendering) is not. Unprofiled
+requests only pay a context variable lookup per query and section.
+"""
+
+import json
+import logging
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+SECTIONS = ('db', 'llm', 'pdf', 'template')
+_SUMMARY_FIELDS = ('total_ms', 'db_ms', 'db_count', 'llm_ms', 'pdf_ms', 'template_ms')
+
+_current: ContextVar[Optional['RequestProfile']] = ContextVar('bloodapp_request_profile', default=None)
+
+
+class RequestProfile:
+    """Time and call counts per section for one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.counts = dict.fromkeys(SECTIONS, 0)
+        self.seconds = dict.fromkeys(SECTIONS, 0.0)
+        self._lock = threading.Lock()
+
+    def add(self, section: str, seconds: float):
+        with self._lock:
+            self.counts[section] += 1
+            self.seconds[section] += seconds
+
+    def record(self, request, response) -> Dict:
+        total_ms = (time.perf_counter() - self.started) * 1000
+        match = getattr(request, 'resolver_match', None)
+        record = {
+            'view': match.view_name if match else None,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+        }
+        for section in SECTIONS:
+            record[f'{section}_ms'] = round(self.seconds[section] * 1000, 2)
+            record[f'{section}_count'] = self.counts[section]
+        record['other_ms'] = round(total_ms - sum(record[f'{s}_ms'] for s in SECTIONS), 2)
+        return record
+
+
+@contextmanager
+def profile_section(section: str):
+    """Time the enclosed block as ``section`` of the current request's profile, if it is being profiled."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(section, time.perf_counter() - started)
+
+
+def _db_execute_wrapper(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add('db', time.perf_counter() - started)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    # With a connection pool this fires on every checkout of the same wrapper
+    if _db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_execute_wrapper)
+
+
+def connect_profiling_signals():
+    connection_created.connect(_on_connection_created, dispatch_uid='bloodapp.profiling.db')
+
+
+class ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        with profile_section('template'):
+            return super().render(context, request)
+
+
+class ProfiledDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates whose top-level renders count towards the request profile's template time."""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return ProfiledTemplate(super().get_template(template_name).template, self)
+
+
+# ---------------------------------------------------------------------------
+# Rolling per-view summary
+# ---------------------------------------------------------------------------
+
+_window_lock = threading.Lock()
+_windows: Dict[str, deque] = defaultdict(lambda: deque(maxlen=getattr(settings, 'PROFILING_WINDOW', 500)))
+
+
+def _remember(record: Dict):
+    with _window_lock:
+        _windows[record['view'] or '<unresolved>'].append(record)
+
+
+def _percentile(sorted_samples: List[float], pct: float) -> float:
+    k = (len(sorted_samples) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_samples) - 1)
+    return sorted_samples[lo] + (sorted_samples[hi] - sorted_samples[lo]) * (k - lo)
+
+
+def profile_summary() -> Dict[str, Dict]:
+    """p50/p90/p99 of total, DB, LLM, PDF and template time per view over this process's recent profiled requests."""
+    with _window_lock:
+        windows = {view: list(records) for view, records in _windows.items()}
+    summary = {}
+    for view, records in sorted(windows.items()):
+        entry = {'samples': len(records)}
+        for field in _SUMMARY_FIELDS:
+            values = sorted(r[field] for r in records)
+            entry[field] = {f'p{p}': round(_percentile(values, p), 2) for p in (50, 90, 99)}
+        summary[view] = entry
+    return summary
+
+
+def reset_profile_summary():
+    with _window_lock:
+        _windows.clear()
+
+
+# ---------------------------------------------------------------------------
+# Middleware
+# ---------------------------------------------------------------------------
+
+def _should_profile(request) -> bool:
+    header = getattr(settings, 'PROFILING_HEADER', 'X-Profile')
+    if header and request.headers.get(header, '').lower() in ('1', 'true', 'yes', 'on'):
+        return True
+    rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+    return rate > 0 and random.random() < rate
+
+
+def _finish(profile: RequestProfile, request, response):
+    record = profile.record(request, response)
+    _remember(record)
+    logger.info(json.dumps({'event': 'request_profile', **record}))
+    response['X-DB-Query-Count'] = str(record['db_count'])
+    response['Server-Timing'] = ', '.join(
+        [f"{section};dur={record[f'{section}_ms']}" for section in SECTIONS] + [f"total;dur={record['total_ms']}"])
+
+
+class ProfilingMiddleware:
+    """Profile requests selected by header or sampling; sync and async."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not _should_profile(request):
+            return self.get_response(request)
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        _finish(profile, request, response)
+        return response
+
+    async def __acall__(self, request):
+        if not _should_profile(request):
+            return await self.get_response(request)
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        _finish(profile, request, response)
+        return response
@@ -0,0 +1,389 @@
+"""
+Server-side PDF export of the blood chemistry report.
+
+render_report_pdf() draws the same context report_view renders to HTML
+(views.build_report_context) with fpdf2, a pure-Python PDF library, so the
+export needs neither a browser nor system libraries. PDFs are stored under
+REPORT_PDF_DIR by a hash of their context (report_pdf_digest): an unchanged
+report is rendered once and every later download is a file read.
+
+request_report_pdf() never renders on the request thread; it hands missing
+PDFs to a small pool of worker threads (REPORT_PDF_WORKERS) and reports
+'pending' until the file exists. Renders in flight are tracked per process, so
+two gunicorn workers asked for the same new report may both render it; each
+writes a temporary file and os.replace()s it into place, so readers only ever
+see a complete PDF and the duplicate render is wasted time, not corruption.
+
+The PDFs are patient health data and nothing links to an old one once the
+report changes, so they are not kept: prune_report_pdfs() deletes those
+rendered more than REPORT_PDF_MAX_AGE seconds ago and all but the
+REPORT_PDF_MAX_FILES newest. The render pool runs it at most every
+REPORT_PDF_PRUNE_INTERVAL seconds, and ``manage.py prune_report_pdfs`` (run
+by entrypoint.sh at container start) on demand.
+"""
+
+import colorsys
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils.html import strip_tags
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout changes so previously cached PDFs are not served
+RENDERER_VERSION = 1
+
+_executor: Optional[ThreadPoolExecutor] = None
+_jobs: Dict[str, Future] = {}
+_lock = threading.Lock()
+_last_prune = 0.0
+
+# Temporary files of a render that died before os.replace()
+STALE_TMP_SECONDS = 3600
+
+_LATIN1_REPLACEMENTS = {
+    '\u2010': '-', '\u2011': '-', '\u2013': '-', '\u2014': '-', '\u2212': '-',
+    '\u2018': "'", '\u2019': "'", '\u201c': '"', '\u201d': '"',
+    '\u2022': '-', '\u2026': '...', '\u2264': '<=', '\u2265': '>=',
+}
+_HSL = re.compile(r'hsl\(\s*([\d.]+)\s*,\s*([\d.]+)%\s*,\s*([\d.]+)%\s*\)')
+
+NORMAL_FILL = (247, 197, 159)
+OPTIMAL_FILL = (168, 223, 176)
+TEXT = (31, 41, 55)
+MUTED = (107, 114, 128)
+
+
+def pdf_dir() -> str:
+    return str(getattr(settings, 'REPORT_PDF_DIR', os.path.join(settings.BASE_DIR, 'report_pdfs')))
+
+
+def report_pdf_digest(context: Dict) -> str:
+    """Content hash of a report context; identical reports share one PDF."""
+    payload = json.dumps({'renderer': RENDERER_VERSION, 'context': context}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def report_pdf_path(digest: str) -> str:
+    return os.path.join(pdf_dir(), f'{digest}.pdf')
+
+
+def _text(value) -> str:
+    """Plain latin-1 text for the PDF core fonts."""
+    text = strip_tags(str(value if value is not None else ''))
+    for char, replacement in _LATIN1_REPLACEMENTS.items():
+        text = text.replace(char, replacement)
+    return text.encode('latin-1', 'replace').decode('latin-1')
+
+
+def _number(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return f'{value:g}'
+    return str(value)
+
+
+def _rgb(css_hsl: str, default=(17, 17, 17)) -> Tuple[int, int, int]:
+    match = _HSL.match(css_hsl or '')
+    if not match:
+        return default
+    h, s, l = (float(g) for g in match.groups())
+    r, g, b = colorsys.hls_to_rgb(h / 360.0, l / 100.0, s / 100.0)
+    return int(r * 255), int(g * 255), int(b * 255)
+
+
+def _plan_item(item) -> str:
+    if isinstance(item, dict):
+        title = item.get('title')
+        description = item.get('description') or ''
+        return f'{title}: {description}' if title else str(description or item)
+    return str(item)
+
+
+def _wrap(pdf, text: str, width: float) -> List[str]:
+    """Greedy word wrap on the current font, measuring each word once.
+
+    fpdf2's multi_cell re-measures the whole line per added character, which
+    made it most of the render time on the long background texts.
+    """
+    space = pdf.get_string_width(' ')
+    lines = []
+    for paragraph in text.split('\n'):
+        words, line_width = [], 0.0
+        for word in paragraph.split():
+            word_width = pdf.get_string_width(word)
+            if words and line_width + space + word_width > width:
+                lines.append(' '.join(words))
+                words, line_width = [word], word_width
+            else:
+                line_width += (space if words else 0.0) + word_width
+                words.append(word)
+        lines.append(' '.join(words))
+    return lines
+
+
+def load_renderer():
+    """(FPDF, XPos, YPos) from fpdf2, imported on first use."""
+    try:
+        from fpdf import FPDF
+        from fpdf.enums import XPos, YPos
+    except ImportError:
+        raise RuntimeError("fpdf2 not installed. Please install fpdf2 to enable PDF export.")
+    return FPDF, XPos, YPos
+
+
+def render_report_pdf(context: Dict) -> bytes:
+    """PDF bytes for a report context built by views.build_report_context."""
+    FPDF, XPos, YPos = load_renderer()
+
+    pdf = FPDF(format='A4')
+    pdf.set_title('Functional Health Report')
+    pdf.set_auto_page_break(True, margin=15)
+    pdf.set_margins(15, 15, 15)
+    pdf.add_page()
+    width = pdf.epw
+
+    def heading(text):
+        if pdf.get_y() > pdf.page_break_trigger - 20:
+            pdf.add_page()
+        pdf.ln(3)
+        pdf.set_font('Helvetica', 'B', 13)
+        pdf.set_text_color(*TEXT)
+        pdf.cell(0, 7, _text(text), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.set_draw_color(229, 231, 235)
+        pdf.line(pdf.l_margin, pdf.get_y(), pdf.l_margin + width, pdf.get_y())
+        pdf.ln(2)
+
+    def paragraph(text, size=9, style='', color=TEXT):
+        pdf.set_font('Helvetica', style, size)
+        pdf.set_text_color(*color)
+        for line in _wrap(pdf, _text(text), width):
+            pdf.cell(0, size * 0.5, line, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    def bullets(items):
+        for item in items:
+            paragraph(f'- {_plan_item(item)}')
+
+    # Header
+    pdf.set_font('Helvetica', 'B', 18)
+    pdf.set_text_color(*TEXT)
+    pdf.cell(0, 9, 'Functional Health Report', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    paragraph("A comprehensive analysis of your patient's test results", color=MUTED)
+    analysis_date = context.get('analysis_date')
+    date_text = analysis_date.strftime('%B %d, %Y') if hasattr(analysis_date, 'strftime') else _text(analysis_date)
+    paragraph(f"Patient: {context.get('patient_name', '')}    Date: {date_text}    "
+              f"Analyzed Markers: {context.get('markers_count', 0)}", style='B')
+
+    heading('Executive Summary')
+    paragraph(f"Out of Normal: {context.get('outside_normal_count', 0)}    "
+              f"Outside Optimal (but normal): {context.get('outside_optimal_count', 0)}")
+    paragraph('Top Markers to Address', style='B')
+    highlights = context.get('highlights') or []
+    if highlights:
+        for index, h in enumerate(highlights, 1):
+            value = f": {_number(h.get('patient_value'))} {h.get('units') or ''}" if h.get('patient_value') is not None else ''
+            paragraph(f"{index}. {h.get('display_name')}{value}")
+    else:
+        paragraph('All reviewed markers are within optimal ranges.')
+
+    heading('Biomarkers')
+    bar_height = 3
+    for m in context.get('markers') or []:
+        if pdf.get_y() > pdf.page_break_trigger - 25:
+            pdf.add_page()
+        pdf.set_font('Helvetica', 'B', 10)
+        pdf.set_text_color(*TEXT)
+        pdf.cell(width * 0.65, 5, _text(m.get('display_name')))
+        pdf.cell(width * 0.35, 5, _text(f"{_number(m.get('patient_value'))} {m.get('units') or ''}"),
+                 align='R', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+        # Range bar: normal band across the scale, optimal band inside it, patient value as a line
+        y = pdf.get_y() + 1.5
+        x = pdf.l_margin
+        pdf.set_fill_color(*NORMAL_FILL)
+        pdf.rect(x, y, width, bar_height, style='F')
+        if m.get('opt_start_pct') is not None and m.get('opt_width_pct') is not None:
+            pdf.set_fill_color(*OPTIMAL_FILL)
+            pdf.rect(x + width * m['opt_start_pct'] / 100, y, width * m['opt_width_pct'] / 100, bar_height, style='F')
+        if m.get('patient_pos_pct') is not None:
+            pos = x + width * m['patient_pos_pct'] / 100
+            pdf.set_draw_color(17, 17, 17)
+            pdf.set_line_width(0.8)
+            pdf.line(pos, y - 1.2, pos, y + bar_height + 1.2)
+            pdf.set_line_width(0.2)
+        pdf.set_y(y + bar_height + 1.5)
+
+        pdf.set_font('Helvetica', '', 8)
+        pdf.set_text_color(*MUTED)
+        pdf.cell(width / 2, 4, _text(f"Normal: {_number(m.get('normal_min'))}-{_number(m.get('normal_max'))}"))
+        pdf.cell(width / 2, 4, _text(f"Optimal: {_number(m.get('optimal_min'))}-{_number(m.get('optimal_max'))}"),
+                 align='R', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        if m.get('background'):
+            paragraph(m['background'], size=8)
+        pdf.ln(2)
+
+    heading('Health Concerns')
+    paragraph('Potential concerns inferred from your biomarkers and questionnaires. '
+              'The bar indicates estimated relative risk.', size=8, color=MUTED)
+    conditions = context.get('conditions') or []
+    for c in conditions:
+        if pdf.get_y() > pdf.page_break_trigger - 20:
+            pdf.add_page()
+        risk = c.get('risk_score')
+        pdf.set_font('Helvetica', 'B', 10)
+        pdf.set_text_color(*TEXT)
+        pdf.cell(width * 0.75, 5, _text(c.get('display_name')))
+        pdf.cell(width * 0.25, 5, f'{_number(risk)}%' if risk is not None else '-', align='R',
+                 new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        y = pdf.get_y() + 1
+        pdf.set_fill_color(233, 236, 239)
+        pdf.rect(pdf.l_margin, y, width, bar_height, style='F')
+        if risk is not None:
+            pdf.set_fill_color(*_rgb(c.get('ring_color')))
+            pdf.rect(pdf.l_margin, y, width * max(0.0, min(100.0, risk)) / 100, bar_height, style='F')
+        pdf.set_y(y + bar_height + 1.5)
+        if c.get('background'):
+            paragraph(c['background'], size=8)
+        pdf.ln(2)
+    if not conditions:
+        paragraph('No significant concerns identified.', color=MUTED)
+
+    heading('Treatment Plan')
+    paragraph('This plan outlines evidence-informed lifestyle, nutrition, and supplement strategies. '
+              'Discuss with your clinician before making changes.', size=8, color=MUTED)
+    plan = context.get('plan')
+    if isinstance(plan, dict) and plan:
+        for key, title in (('lifestyle_recommendations', 'Lifestyle'),
+                           ('dietary_recommendations', 'Diet & Nutrition')):
+            if plan.get(key):
+                paragraph(title, size=10, style='B')
+                bullets(plan[key])
+        if plan.get('supplement_recommendations'):
+            paragraph('Supplements', size=10, style='B')
+            for supp in plan['supplement_recommendations']:
+                if not isinstance(supp, dict):
+                    paragraph(f'- {supp}')
+                    continue
+                line = supp.get('name') or ''
+                if supp.get('dosage'):
+                    line += f" - {supp['dosage']}"
+                if supp.get('timing'):
+                    line += f" ({supp['timing']})"
+                paragraph(f'- {line}')
+        if plan.get('follow_up_recommendations'):
+            paragraph('Follow-up Recommendations', size=10, style='B')
+            bullets(plan['follow_up_recommendations'])
+    else:
+        paragraph('Treatment plan not available yet.', color=MUTED)
+
+    return bytes(pdf.output())
+
+
+def write_report_pdf(context: Dict, path: str) -> str:
+    """Render a context to path atomically (a concurrent reader never sees a partial file)."""
+    data = render_report_pdf(context)
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return path
+
+
+def prune_report_pdfs(max_age: Optional[float] = None, max_files: Optional[int] = None) -> int:
+    """Delete cached PDFs older than max_age seconds, then all but the max_files newest; returns how many."""
+    if max_age is None:
+        max_age = getattr(settings, 'REPORT_PDF_MAX_AGE', 86400)
+    if max_files is None:
+        max_files = getattr(settings, 'REPORT_PDF_MAX_FILES', 1000)
+    now = time.time()
+    pdfs, doomed = [], []
+    try:
+        entries = list(os.scandir(pdf_dir()))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            mtime = entry.stat().st_mtime
+        except FileNotFoundError:
+            continue
+        if entry.name.endswith('.pdf'):
+            pdfs.append((mtime, entry.path))
+        elif entry.name.endswith('.tmp') and now - mtime > STALE_TMP_SECONDS:
+            doomed.append(entry.path)
+    pdfs.sort(reverse=True)
+    for index, (mtime, path) in enumerate(pdfs):
+        if now - mtime > max_age or index >= max_files:
+            doomed.append(path)
+    removed = 0
+    for path in doomed:
+        try:
+            os.unlink(path)
+            removed += 1
+        except FileNotFoundError:
+            # Another worker pruned it first
+            pass
+    return removed
+
+
+def _render_job(context: Dict, path: str) -> str:
+    global _last_prune
+    write_report_pdf(context, path)
+    now = time.time()
+    if now - _last_prune > getattr(settings, 'REPORT_PDF_PRUNE_INTERVAL', 600):
+        _last_prune = now
+        try:
+            prune_report_pdfs()
+        except OSError:
+            logger.exception('Pruning cached report PDFs failed')
+    return path
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        workers = int(getattr(settings, 'REPORT_PDF_WORKERS', 2))
+        _executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='report-pdf')
+    return _executor
+
+
+def request_report_pdf(context: Dict) -> Tuple[str, str, Optional[str]]:
+    """(status, path, error) for a report context, queueing the render if the PDF does not exist yet.
+
+    status is 'ready', 'pending' or 'error'; a failed render is reported once and
+    retried on the next request.
+    """
+    digest = report_pdf_digest(context)
+    path = report_pdf_path(digest)
+    if os.path.exists(path):
+        return 'ready', path, None
+    with _lock:
+        job = _jobs.get(digest)
+        if job is not None and job.done():
+            del _jobs[digest]
+            error = job.exception()
+            if error is not None:
+                return 'error', path, str(error)
+            if os.path.exists(path):
+                return 'ready', path, None
+            # Rendered, then pruned before anyone fetched it
+            job = None
+        if job is None:
+            _jobs[digest] = _get_executor().submit(_render_job, context, path)
+    return 'pending', path, None
@@ -0,0 +1,161 @@
+"""
+Deterministic pre-screen of likely conditions from the marker associations.
+
+HealthCondition.associated_markers_low / associated_markers_high say which
+marker deviations point to each condition. screen_conditions() turns the
+patient's panel into a deviation vector (direction and severity per marker)
+and scores every condition against the sparse condition x marker matrix
+(bloodapp.associations):
+
+    score = (sum of severities of associated markers deviating the expected way
+             - CONTRADICTION_WEIGHT * those deviating the opposite way)
+            / sqrt(number of the condition's markers the patient had measured)
+
+so a condition scores higher the more of its measured markers are off, and
+the further off they are, without favouring conditions that simply list many
+markers. The ranked shortlist is instant; the LLM is then only asked to
+explain and refine the top few (see ai_analysis.get_health_conditions_from_analysis).
+"""
+
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .associations import HIGH, LOW, get_association_matrix
+from .catalog import get_versioned
+
+# Severity of a value inside the normal range but outside the optimal range, and
+# of one just outside the normal range; it grows with the distance beyond it.
+SUBOPTIMAL_SEVERITY = 0.25
+OUT_OF_RANGE_SEVERITY = 1.0
+MAX_SEVERITY = 3.0
+# How much a marker deviating against a condition's expected direction counts against it
+CONTRADICTION_WEIGHT = 0.5
+
+
+@dataclass
+class ScreenedCondition:
+    condition_id: str
+    display_name: str
+    score: float
+    # (marker name, 'low' | 'high', severity) for the deviations supporting the condition
+    hits: List[Tuple[str, str, float]] = field(default_factory=list)
+
+    @property
+    def level_of_risk(self) -> str:
+        if self.score >= 1.5:
+            return 'High'
+        if self.score >= 0.6:
+            return 'Moderate'
+        return 'Low'
+
+    def explanation(self) -> str:
+        parts = [f"{name} {direction}" for name, direction, _ in self.hits]
+        return "Associated marker deviations: " + ", ".join(parts) + "." if parts else ""
+
+
+def marker_ranges(marker: Dict, unit_sys: str) -> Tuple:
+    """(normal_min, normal_max, optimal_min, optimal_max) for a marker row in the given unit system."""
+    suffix = 'international' if (unit_sys or 'standard').lower() == 'international' else 'conventional'
+
+    def pick(kind):
+        value = marker.get(f'{kind}_{suffix}')
+        return value if value is not None else marker.get(kind)
+
+    return pick('standard_min'), pick('standard_max'), pick('optimal_min'), pick('optimal_max')
+
+
+def marker_deviation(value: float, ranges: Tuple) -> Optional[Tuple[str, float]]:
+    """('low' | 'high', severity) for a value outside its optimal range, or None."""
+    normal_min, normal_max, optimal_min, optimal_max = ranges
+    if optimal_min is None or optimal_max is None:
+        optimal_min, optimal_max = normal_min, normal_max
+    if normal_min is None or normal_max is None:
+        normal_min, normal_max = optimal_min, optimal_max
+    if normal_min is None or normal_max is None:
+        return None
+    width = (normal_max - normal_min) or abs(normal_max) or 1.0
+
+    if value < normal_min:
+        return 'low', min(MAX_SEVERITY, OUT_OF_RANGE_SEVERITY + (normal_min - value) / width)
+    if value > normal_max:
+        return 'high', min(MAX_SEVERITY, OUT_OF_RANGE_SEVERITY + (value - normal_max) / width)
+    if value < optimal_min:
+        return 'low', SUBOPTIMAL_SEVERITY
+    if value > optimal_max:
+        return 'high', SUBOPTIMAL_SEVERITY
+    return None
+
+
+def _build_screening_catalog() -> Dict:
+    """Marker ranges by name and condition display names, as plain Python structures."""
+    from .models import HealthCondition, Marker
+
+    markers = {
+        m['name']: m for m in Marker.objects.values(
+            'id', 'name',
+            'standard_min', 'standard_max', 'optimal_min', 'optimal_max',
+            'standard_min_conventional', 'standard_max_conventional',
+            'optimal_min_conventional', 'optimal_max_conventional',
+            'standard_min_international', 'standard_max_international',
+            'optimal_min_international', 'optimal_max_international',
+        )
+    }
+    conditions = {
+        c['id']: c for c in HealthCondition.objects.exclude(condition_id__isnull=True).exclude(
+            condition_id='').values('id', 'condition_id', 'display_name', 'name')
+    }
+    return {'markers': markers, 'conditions': conditions}
+
+
+def screen_conditions(patient_values_by_name: Dict[str, float], unit_system_by_name: Dict[str, str],
+                      limit: Optional[int] = None) -> List[ScreenedCondition]:
+    """Conditions with a positive score, best first (at most ``limit``)."""
+    catalog = get_versioned('screening_catalog', _build_screening_catalog)
+    markers = catalog['markers']
+    conditions = catalog['conditions']
+    matrix = get_association_matrix()
+
+    measured = set()
+    support: Dict[int, float] = {}
+    hits: Dict[int, List[Tuple[str, str, float]]] = {}
+    for name, value in (patient_values_by_name or {}).items():
+        marker = markers.get(name)
+        if marker is None or value is None:
+            continue
+        measured.add(marker['id'])
+        deviation = marker_deviation(value, marker_ranges(marker, unit_system_by_name.get(name)))
+        if deviation is None:
+            continue
+        direction, severity = deviation
+        sign = HIGH if direction == 'high' else LOW
+        for condition_pk, expected in matrix.column(marker['id']):
+            if condition_pk not in conditions:
+                continue
+            if expected == sign:
+                support[condition_pk] = support.get(condition_pk, 0.0) + severity
+                hits.setdefault(condition_pk, []).append((name, direction, severity))
+            else:
+                support[condition_pk] = support.get(condition_pk, 0.0) - CONTRADICTION_WEIGHT * severity
+
+    ranked = []
+    for condition_pk, total in support.items():
+        if total <= 0 or condition_pk not in hits:
+            continue
+        coverage = len(set(matrix.marker_pks_for(condition_pk)) & measured)
+        condition = conditions[condition_pk]
+        ranked.append(ScreenedCondition(
+            condition_id=condition['condition_id'],
+            display_name=condition['display_name'] or condition['name'] or condition['condition_id'],
+            score=round(total / math.sqrt(coverage), 3),
+            hits=sorted(hits[condition_pk], key=lambda h: -h[2]),
+        ))
+    ranked.sort(key=lambda c: (-c.score, c.condition_id))
+    return ranked[:limit] if limit else ranked
+
+
+def screening_top_k() -> int:
+    """How many screened conditions the LLM is asked to refine (0 disables the pre-screen)."""
+    return int(getattr(settings, 'HEALTH_SCREENING_TOP_K', 8))
@@ -0,0 +1,59 @@
+// Sidebar toggle and the global loading overlay (showGlobalLoading / hideGlobalLoading / fetchWithLoading)
+document.addEventListener('DOMContentLoaded', function() {
+    const sidebarToggle = document.getElementById('sidebarToggle');
+    const sidebar = document.getElementById('sidebar');
+    const globalLoading = document.getElementById('globalLoading');
+    let loadingCounter = 0;
+
+    if (sidebarToggle) {
+        sidebarToggle.addEventListener('click', function() {
+            sidebar.classList.toggle('show');
+        });
+    }
+
+    // Close sidebar when clicking outside on mobile
+    document.addEventListener('click', function(e) {
+        if (window.innerWidth <= 768) {
+            if (!sidebar.contains(e.target) && !sidebarToggle.contains(e.target)) {
+                sidebar.classList.remove('show');
+            }
+        }
+    });
+
+    // Global loading helpers
+    window.showGlobalLoading = function(hint){
+        loadingCounter++;
+        if (globalLoading) {
+            const hintEl = globalLoading.querySelector('.loading-hint');
+            if (hintEl && hint) hintEl.textContent = hint;
+            globalLoading.classList.add('show');
+            document.body.style.pointerEvents = 'none';
+        }
+    };
+    window.hideGlobalLoading = function(){
+        loadingCounter = Math.max(0, loadingCounter - 1);
+        if (loadingCounter === 0 && globalLoading) {
+            globalLoading.classList.remove('show');
+            document.body.style.pointerEvents = '';
+        }
+    };
+    // Fetch wrapper
+    window.fetchWithLoading = async function(url, options={}, hint){
+        try{
+            window.showGlobalLoading(hint);
+            const res = await fetch(url, options);
+            return res;
+        } finally {
+            window.hideGlobalLoading();
+        }
+    }
+
+    // Delegate to links with data-loading-hint to show overlay on navigation
+    document.body.addEventListener('click', function(e){
+        const link = e.target && e.target.closest ? e.target.closest('a[data-loading-hint]') : null;
+        if(link){
+            const hint = link.getAttribute('data-loading-hint') || 'Loading…';
+            window.showGlobalLoading(hint);
+        }
+    });
+});
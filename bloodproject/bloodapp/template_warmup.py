@@ -0,0 +1,55 @@
+"""
+Compile the app's templates ahead of the first request.
+
+With the cached template loader a template is parsed once per process, on the
+first request that renders it; base.html alone is over 500 lines and every
+page extends it. prewarm_templates() loads every template matching the given
+patterns so they are compiled at startup instead. Called from wsgi.py when
+TEMPLATE_PREWARM is on; under gunicorn --preload that happens once in the
+master, and the forked workers inherit the compiled templates.
+"""
+
+import fnmatch
+import logging
+import os
+import time
+from typing import Iterable, List
+
+from django.template import engines
+from django.template.utils import get_app_template_dirs
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATTERNS = ('bloodapp/*.html',)
+
+
+def find_templates(patterns: Iterable[str] = DEFAULT_PATTERNS) -> List[str]:
+    """Template names (relative to their template directory) matching any of the patterns."""
+    backend = engines['django']
+    dirs = [str(d) for d in backend.engine.dirs]
+    if backend.engine.app_dirs:
+        dirs.extend(str(d) for d in get_app_template_dirs('templates'))
+    names = set()
+    for root in dirs:
+        for current, _, files in os.walk(root):
+            for filename in files:
+                name = os.path.relpath(os.path.join(current, filename), root).replace(os.sep, '/')
+                if any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                    names.add(name)
+    return sorted(names)
+
+
+def prewarm_templates(patterns: Iterable[str] = DEFAULT_PATTERNS) -> List[str]:
+    """Compile matching templates into the cached loader; returns the names compiled."""
+    backend = engines['django']
+    started = time.perf_counter()
+    compiled = []
+    for name in find_templates(patterns):
+        try:
+            backend.get_template(name)
+        except Exception:
+            logger.exception('Could not pre-compile template %s', name)
+            continue
+        compiled.append(name)
+    logger.info('Pre-compiled %d templates in %.1fms', len(compiled), (time.perf_counter() - started) * 1000)
+    return compiled
@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from bloodapp import catalog
+from bloodapp.associations import HIGH, LOW, AssociationMatrix, get_association_matrix
+from bloodapp.models import HealthCondition, Marker
+
+# (condition pk, condition_id, marker pk, marker name, sign)
+ENTRIES = [
+    (1, 'iron_need', 10, 'ferritin', LOW),
+    (1, 'iron_need', 11, 'hemoglobin', LOW),
+    (2, 'polycythemia', 11, 'hemoglobin', HIGH),
+    (3, 'hemochromatosis', 10, 'ferritin', HIGH),
+]
+
+
+class AssociationMatrixTests(SimpleTestCase):
+    def setUp(self):
+        self.matrix = AssociationMatrix(ENTRIES)
+
+    def test_rows_and_columns_hold_the_same_entries(self):
+        self.assertEqual(self.matrix.nnz, 4)
+        self.assertEqual(self.matrix.row(1), [(10, LOW), (11, LOW)])
+        self.assertEqual(self.matrix.column(10), [(1, LOW), (3, HIGH)])
+        self.assertEqual(self.matrix.column(11), [(1, LOW), (2, HIGH)])
+        rows = {(c, m, s) for c in self.matrix.row_keys for m, s in self.matrix.row(c)}
+        columns = {(c, m, s) for m in self.matrix.col_keys for c, s in self.matrix.column(m)}
+        self.assertEqual(rows, columns)
+
+    def test_lookups_by_name_and_direction(self):
+        self.assertEqual(self.matrix.markers_for('iron_need'), ['ferritin', 'hemoglobin'])
+        self.assertEqual(self.matrix.markers_for('polycythemia', 'high'), ['hemoglobin'])
+        self.assertEqual(self.matrix.markers_for('polycythemia', 'LOW'), [])
+        self.assertEqual(self.matrix.conditions_for('ferritin'), ['iron_need', 'hemochromatosis'])
+        self.assertEqual(self.matrix.conditions_for('ferritin', 'high'), ['hemochromatosis'])
+
+    def test_unknown_keys_are_empty(self):
+        self.assertEqual(self.matrix.row(99), [])
+        self.assertEqual(self.matrix.column(99), [])
+        self.assertEqual(self.matrix.markers_for('unknown'), [])
+        self.assertEqual(self.matrix.conditions_for('unknown'), [])
+        self.assertEqual(AssociationMatrix([]).nnz, 0)
+
+    def test_invalid_direction_raises(self):
+        with self.assertRaises(ValueError):
+            self.matrix.markers_for('iron_need', 'sideways')
+
+
+class CatalogAssociationMatrixTests(TestCase):
+    def setUp(self):
+        self.enterContext(mock.patch.dict(catalog._built, clear=True))
+        self.ferritin = Marker.objects.create(
+            name='ferritin', display_name='Ferritin', background='', discussion='',
+            standard_min=30, standard_max=300, optimal_min=50, optimal_max=150,
+        )
+        self.iron_need = HealthCondition.objects.create(condition_id='iron_need', name='Iron Need')
+        self.iron_need.associated_markers_low.add(self.ferritin)
+
+    def test_matrix_is_built_from_both_through_tables(self):
+        overload = HealthCondition.objects.create(condition_id='iron_overload', name='Iron Overload')
+        overload.associated_markers_high.add(self.ferritin)
+        matrix = get_association_matrix()
+        self.assertEqual(matrix.conditions_for('ferritin', 'low'), ['iron_need'])
+        self.assertEqual(matrix.conditions_for('ferritin', 'high'), ['iron_overload'])
+
+    def test_matrix_is_rebuilt_after_an_association_change(self):
+        self.assertEqual(get_association_matrix().markers_for('iron_need', 'high'), [])
+        self.iron_need.associated_markers_high.add(self.ferritin)
+        self.assertEqual(get_association_matrix().markers_for('iron_need', 'high'), ['ferritin'])
@@ -0,0 +1,127 @@
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase
+
+from bloodapp.cache import LocalLRU, TwoTierCache, catalog_cache
+from bloodapp.condition_markers import get_health_condition
+from bloodapp.models import HealthCondition
+
+
+class LocalLRUTests(SimpleTestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        lru = LocalLRU(2)
+        lru.set('a', 1, 60)
+        lru.set('b', 2, 60)
+        lru.get('a')
+        lru.set('c', 3, 60)
+        self.assertEqual([lru.get('a'), lru.get('c')], [1, 3])
+        self.assertEqual(len(lru), 2)
+
+    def test_expired_entries_are_misses(self):
+        lru = LocalLRU(2)
+        lru.set('a', 1, -1)
+        self.assertIsNot(lru.get('a'), 1)
+        self.assertEqual(len(lru), 0)
+
+
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.cache = TwoTierCache(f'test-{self._testMethodName}', timeout=60, local_timeout=60)
+
+    def test_shared_hits_fill_the_local_tier(self):
+        self.cache.set('k', 'v')
+        self.cache.clear_local()
+        self.assertEqual(self.cache.get('k'), 'v')
+        self.assertEqual(self.cache.get('k'), 'v')
+        self.assertEqual(self.cache.get('missing', 'default'), 'default')
+        snapshot = self.cache.snapshot()
+        self.assertEqual((snapshot['shared_hits'], snapshot['local_hits'], snapshot['misses']), (1, 1, 1))
+
+    def test_versioned_keys_change_with_the_catalog_version(self):
+        cache = TwoTierCache('test-versioned', versioned=True)
+        with mock.patch('bloodapp.cache.get_catalog_version', return_value=1):
+            cache.set('k', 'old')
+        with mock.patch('bloodapp.cache.get_catalog_version', return_value=2):
+            self.assertIsNone(cache.get('k'))
+
+    def test_concurrent_misses_in_a_process_build_once(self):
+        started = threading.Event()
+        calls = []
+
+        def builder():
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            return 'built'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.cache.get_or_set('k', builder)))
+                   for _ in range(8)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(results, ['built'] * 8)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.cache.snapshot()['builds'], 1)
+        self.assertFalse(self.cache._building)
+
+    def test_waits_for_another_process_that_holds_the_build_lock(self):
+        full_key = self.cache.make_key('k')
+        caches['default'].add(f'{full_key}:building', 1, 30)
+        threading.Timer(0.1, lambda: caches['default'].set(full_key, 'from another worker')).start()
+        builder = mock.Mock(return_value='built here')
+        self.assertEqual(self.cache.get_or_set('k', builder), 'from another worker')
+        builder.assert_not_called()
+
+    def test_builds_itself_when_the_other_process_never_finishes(self):
+        full_key = self.cache.make_key('k')
+        caches['default'].add(f'{full_key}:building', 1, 30)
+        self.assertEqual(self.cache.get_or_set('k', lambda: 'built here', lock_timeout=0.2), 'built here')
+
+    def test_failed_build_releases_the_lock(self):
+        def builder():
+            raise RuntimeError('boom')
+
+        with self.assertRaises(RuntimeError):
+            self.cache.get_or_set('k', builder)
+        self.assertIsNone(caches['default'].get(f"{self.cache.make_key('k')}:building"))
+        self.assertFalse(self.cache._building)
+        self.assertEqual(self.cache.get_or_set('k', lambda: 'retried'), 'retried')
+
+
+class HealthConditionCacheTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        catalog_cache.clear_local()
+        HealthCondition.objects.create(condition_id='gout', name='Gout')
+
+    def builds(self):
+        return catalog_cache.snapshot()['builds']
+
+    def test_unknown_ids_are_not_cached(self):
+        get_health_condition('gout')
+        builds, entries = self.builds(), len(catalog_cache.local)
+        for i in range(5):
+            self.assertIsNone(get_health_condition(f'nonexistent-{i}'))
+        self.assertEqual((self.builds(), len(catalog_cache.local)), (builds, entries))
+        self.assertEqual(get_health_condition('gout').name, 'Gout')
+
+    def test_anonymous_quiz_requests_touch_no_cache(self):
+        builds = self.builds()
+        for i in range(5):
+            self.assertEqual(self.client.get(f'/quiz/nonexistent-{i}/').status_code, 401)
+        self.assertEqual(self.client.get('/quiz/gout/').status_code, 401)
+        self.assertEqual(self.builds(), builds)
+        self.assertEqual(len(catalog_cache.local), 0)
+
+    def test_unknown_quiz_condition_is_not_found(self):
+        self.client.force_login(User.objects.create_user('patient', password='pw'))
+        self.assertEqual(self.client.get('/quiz/nonexistent/').status_code, 404)
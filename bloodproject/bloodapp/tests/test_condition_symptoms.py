@@ -0,0 +1,49 @@
+import importlib
+
+from django.db.models import Value
+from django.db.models.functions import Concat
+from django.test import SimpleTestCase, TestCase
+
+from bloodapp.models import HealthCondition
+from bloodapp.symptoms import build_symptom_list, symptom_id
+
+SIGNS = '« Fatigue « Pale skin « fatigue'
+
+
+class BuildSymptomListTests(SimpleTestCase):
+    def test_ids_are_stable_and_repeats_are_dropped(self):
+        self.assertEqual(build_symptom_list(SIGNS), [
+            {'id': symptom_id('Fatigue'), 'text': 'Fatigue'},
+            {'id': symptom_id('Pale skin'), 'text': 'Pale skin'},
+        ])
+        self.assertEqual(symptom_id('Pale  Skin'), symptom_id('pale skin'))
+
+    def test_migration_copy_matches_the_runtime_parser(self):
+        migration = importlib.import_module('bloodapp.migrations.0010_healthcondition_symptoms')
+        text = 'Signs and symptoms may include:\n1. Fatigue\n2. Shortness\n   of breath\ne Pale skin'
+        self.assertEqual(migration.build_symptom_list(text), build_symptom_list(text))
+
+
+class HealthConditionSymptomsTests(TestCase):
+    def test_bulk_create_parses_symptoms(self):
+        HealthCondition.objects.bulk_create([HealthCondition(name='Anemia', signs_and_symptoms=SIGNS)])
+        self.assertEqual(HealthCondition.objects.get(name='Anemia').symptoms, build_symptom_list(SIGNS))
+
+    def test_bulk_update_of_signs_refreshes_symptoms(self):
+        condition = HealthCondition.objects.create(name='Anemia', signs_and_symptoms=SIGNS)
+        condition.signs_and_symptoms = '« Dizziness'
+        HealthCondition.objects.bulk_update([condition], ['signs_and_symptoms'])
+        condition.refresh_from_db()
+        self.assertEqual([s['text'] for s in condition.symptoms], ['Dizziness'])
+
+    def test_update_refreshes_symptoms_of_the_matched_rows_only(self):
+        HealthCondition.objects.create(name='Anemia', signs_and_symptoms=SIGNS)
+        HealthCondition.objects.create(name='Gout', signs_and_symptoms='« Joint pain')
+        HealthCondition.objects.filter(name='Anemia').update(
+            signs_and_symptoms=Concat('signs_and_symptoms', Value(' « Cold hands')),
+        )
+        self.assertEqual(
+            [s['text'] for s in HealthCondition.objects.get(name='Anemia').symptoms],
+            ['Fatigue', 'Pale skin', 'Cold hands'],
+        )
+        self.assertEqual([s['text'] for s in HealthCondition.objects.get(name='Gout').symptoms], ['Joint pain'])
@@ -0,0 +1,78 @@
+import threading
+from unittest import mock
+
+from django.db import connection, connections, transaction
+from django.test import TransactionTestCase
+
+from bloodapp import db_connections
+from bloodapp.db_connections import close_thread_connections, release_connections
+
+
+class ReleaseConnectionTests(TransactionTestCase):
+    def setUp(self):
+        if connection.vendor == 'sqlite':
+            # Django ignores close() on an in-memory test database; the main thread's
+            # connection keeps the shared database alive while worker threads close theirs
+            self.enterContext(mock.patch.object(type(connections['default']), 'is_in_memory_db', return_value=False))
+
+    def closed(self, reason):
+        return db_connections._counts[f'closed:{reason}']
+
+    def run_in_thread(self, target):
+        """Run ``target`` in a fresh thread, which gets its own connection, and return what it returns."""
+        result = {}
+
+        def work():
+            try:
+                connection.ensure_connection()
+                result['value'] = target()
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+        return result['value']
+
+    def test_close_thread_connections_closes_only_the_calling_threads(self):
+        connection.ensure_connection()
+        before = self.closed('background')
+
+        def work():
+            close_thread_connections()
+            return connection.connection
+
+        self.assertIsNone(self.run_in_thread(work))
+        self.assertEqual(self.closed('background'), before + 1)
+        self.assertIsNotNone(connection.connection)
+
+    def test_release_connections_closes_idle_connections(self):
+        before = self.closed('released')
+
+        def work():
+            release_connections()
+            return connection.connection
+
+        self.assertIsNone(self.run_in_thread(work))
+        self.assertEqual(self.closed('released'), before + 1)
+
+    def test_release_connections_keeps_connections_in_a_transaction(self):
+        before = self.closed('released')
+
+        def work():
+            with transaction.atomic():
+                release_connections()
+                return connection.connection
+
+        self.assertIsNotNone(self.run_in_thread(work))
+        self.assertEqual(self.closed('released'), before)
+
+    def test_closed_connections_are_not_counted_twice(self):
+        before = self.closed('background')
+
+        def work():
+            close_thread_connections()
+            close_thread_connections()
+
+        self.run_in_thread(work)
+        self.assertEqual(self.closed('background'), before + 1)
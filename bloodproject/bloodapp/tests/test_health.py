@@ -0,0 +1,41 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from bloodapp import health
+
+
+@mock.patch('bloodapp.health.ensure_refresher')
+class ProbeTests(TestCase):
+    """Probes on a fresh install: alive, DB healthy, but not ready until the catalog is imported."""
+
+    def setUp(self):
+        health._status = None
+
+    def tearDown(self):
+        health._status = None
+
+    def test_before_first_check(self, ensure_refresher):
+        self.assertEqual(self.client.get(reverse('healthz')).status_code, 200)
+        response = self.client.get(reverse('readyz'))
+        self.assertEqual((response.status_code, response.json()['status']), (503, 'starting'))
+        # /health/ falls back to its own query instead of reporting "starting"
+        self.assertEqual(self.client.get(reverse('health_check')).json()['database'], 'connected')
+
+    def test_empty_catalog_is_not_ready_but_healthy(self, ensure_refresher):
+        health.refresh_status()
+        response = self.client.get(reverse('readyz'))
+        self.assertEqual((response.status_code, response.json()['status']), (503, 'not_ready'))
+        self.assertFalse(response.json()['checks']['catalog']['ok'])
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('health_check'))
+        self.assertEqual((response.status_code, response.json()['status']), (200, 'healthy'))
+
+    def test_stale_result_is_not_ready(self, ensure_refresher):
+        with mock.patch.dict(health.CHECKS, {'catalog': lambda: {'ok': True}}):
+            health.refresh_status()
+        self.assertEqual(self.client.get(reverse('readyz')).status_code, 200)
+        health._status['checked_at'] -= 3600
+        response = self.client.get(reverse('readyz'))
+        self.assertEqual((response.status_code, response.json()['status']), (503, 'stale'))
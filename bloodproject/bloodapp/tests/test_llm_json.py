@@ -0,0 +1,86 @@
+from django.test import SimpleTestCase
+
+from bloodapp.llm_json import (
+    RISK_SCORE_SCHEMA,
+    JSONObjectSectionParser,
+    LLMJSONError,
+    loads_tolerant,
+)
+
+
+class LoadsTolerantTests(SimpleTestCase):
+    def test_strict_json_is_not_reported_as_repaired(self):
+        self.assertEqual(loads_tolerant('```json\n{"a": 1}\n```'), ({'a': 1}, False))
+
+    def test_common_model_mistakes_are_repaired(self):
+        value, repaired = loads_tolerant("Here you go: {'a': True, \"b\": None, \"c\": [1, 2,],} Thanks!")
+        self.assertTrue(repaired)
+        self.assertEqual(value, {'a': True, 'b': None, 'c': [1, 2]})
+
+    def test_trailing_text_after_the_value_is_ignored(self):
+        self.assertEqual(loads_tolerant('{"a": {"b": 1}}} done')[0], {'a': {'b': 1}})
+
+    def test_unrepairable_content_raises(self):
+        for content in ('', '   ', 'no json here', '{"a": maybe}'):
+            with self.subTest(content=content), self.assertRaises(LLMJSONError):
+                loads_tolerant(content)
+
+
+class TruncationTests(SimpleTestCase):
+    """What a reply cut off mid-value turns into; each case is the intended behavior."""
+
+    def assertTruncatesTo(self, content, expected):
+        self.assertEqual(loads_tolerant(content), (expected, True))
+
+    def test_cut_string_keeps_the_text_that_arrived(self):
+        self.assertTruncatesTo('{"Nutrition": "Eat more gre', {'Nutrition': 'Eat more gre'})
+
+    def test_cut_literal_drops_the_member(self):
+        self.assertTruncatesTo('{"a": tru', {})
+        self.assertTruncatesTo('{"a": 1, "b": fal', {'a': 1})
+
+    def test_number_at_the_end_of_input_drops_the_member(self):
+        # "8" may have been "85": a possibly cut number is not trusted
+        self.assertTruncatesTo('{"risk_score": 8', {})
+        self.assertTruncatesTo('{"a": 1.', {})
+        self.assertTruncatesTo('[1, 2, 3', [1, 2])
+
+    def test_number_followed_by_a_separator_is_complete(self):
+        self.assertTruncatesTo('{"risk_score": 85, "expla', {'risk_score': 85})
+
+    def test_key_without_a_value_is_dropped(self):
+        self.assertTruncatesTo('{"a": 1, "b', {'a': 1})
+        self.assertTruncatesTo('{"a": 1, "b":', {'a': 1})
+        self.assertTruncatesTo('{"a": 1,', {'a': 1})
+
+    def test_open_containers_are_closed(self):
+        self.assertTruncatesTo('{"a": [1, {"b": ', {'a': [1, {}]})
+
+    def test_dropped_member_fails_schema_validation(self):
+        value, _ = loads_tolerant('{"explanation": "High", "risk_score": 8')
+        with self.assertRaises(LLMJSONError):
+            RISK_SCORE_SCHEMA.validate(value)
+
+
+class JSONObjectSectionParserTests(SimpleTestCase):
+    def test_members_are_emitted_as_soon_as_they_complete(self):
+        parser = JSONObjectSectionParser()
+        self.assertEqual(parser.feed('```json\n{"Nutrition": "Eat '), [])
+        self.assertEqual(parser.feed('greens", "Lifestyle'), [('Nutrition', 'Eat greens')])
+        self.assertEqual(parser.feed(' changes": {"sleep": "8h, dark room"}, '), [
+            ('Lifestyle changes', {'sleep': '8h, dark room'}),
+        ])
+        self.assertEqual(parser.feed("'Supplements': ['D3']}\n```"), [('Supplements', ['D3'])])
+        self.assertEqual(parser.finish(), [])
+
+    def test_finish_recovers_a_truncated_tail_once(self):
+        parser = JSONObjectSectionParser()
+        self.assertEqual(parser.feed('{"Nutrition": "Eat greens", "Lifestyle changes": "Walk da'), [
+            ('Nutrition', 'Eat greens'),
+        ])
+        self.assertEqual(parser.finish(), [('Lifestyle changes', 'Walk da')])
+
+    def test_top_level_array_has_no_sections(self):
+        parser = JSONObjectSectionParser()
+        self.assertEqual(parser.feed('[{"a": 1}]'), [])
+        self.assertEqual(parser.finish(), [])
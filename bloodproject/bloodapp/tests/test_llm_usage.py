@@ -0,0 +1,110 @@
+import os
+from collections import deque
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from bloodapp import llm_usage
+from bloodapp.llm_usage import flush_llm_usage, llm_usage_context, record_llm_cache_hit, record_llm_usage
+from bloodapp.models import LLMUsage, Marker
+
+
+class LLMUsageBufferTests(TestCase):
+    def setUp(self):
+        self.enterContext(mock.patch.object(llm_usage, '_buffer', deque(maxlen=3)))
+        # Flush by hand: no background flusher
+        self.enterContext(mock.patch.object(llm_usage, '_flusher_pid', os.getpid()))
+        self.user = User.objects.create_user('patient', password='pw')
+
+    def call_sites(self):
+        return [row.call_site for row in llm_usage._buffer]
+
+    def test_rows_are_attributed_to_the_current_context(self):
+        record_llm_usage('outside')
+        with llm_usage_context(self.user.pk, 'health_concerns'):
+            record_llm_usage('health_conditions', model='m', seconds=0.25,
+                             usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5))
+        record_llm_cache_hit('treatment_plan', self.user.pk, 'treatment_plan')
+        self.assertEqual(flush_llm_usage(), 3)
+        self.assertEqual(len(llm_usage._buffer), 0)
+        rows = list(LLMUsage.objects.order_by('id').values_list(
+            'user_id', 'stage', 'call_site', 'prompt_tokens', 'completion_tokens', 'latency_ms', 'cache_hit'))
+        self.assertEqual(rows, [
+            (None, 'other', 'outside', 0, 0, 0.0, False),
+            (self.user.pk, 'health_concerns', 'health_conditions', 10, 5, 250.0, False),
+            (self.user.pk, 'treatment_plan', 'treatment_plan', 0, 0, 0.0, True),
+        ])
+
+    def test_failed_write_keeps_the_rows_for_the_next_flush(self):
+        record_llm_usage('a')
+        record_llm_usage('b')
+        with mock.patch.object(LLMUsage.objects, 'bulk_create', side_effect=RuntimeError('db down')), \
+                self.assertLogs('bloodapp.llm_usage', 'ERROR'):
+            self.assertEqual(flush_llm_usage(), 0)
+        self.assertEqual(self.call_sites(), ['a', 'b'])
+        self.assertEqual(flush_llm_usage(), 2)
+        self.assertEqual(LLMUsage.objects.count(), 2)
+
+    def test_full_buffer_drops_the_oldest_rows_after_a_failed_write(self):
+        record_llm_usage('a')
+        record_llm_usage('b')
+
+        def fail_while_more_arrive(rows, **kwargs):
+            record_llm_usage('c')
+            record_llm_usage('d')
+            raise RuntimeError('db down')
+
+        with mock.patch.object(LLMUsage.objects, 'bulk_create', side_effect=fail_while_more_arrive), \
+                self.assertLogs('bloodapp.llm_usage', 'ERROR'):
+            flush_llm_usage()
+        self.assertEqual(self.call_sites(), ['b', 'c', 'd'])
+
+    @override_settings(LLM_USAGE_BATCH_SIZE=2)
+    def test_a_full_batch_wakes_the_flusher(self):
+        llm_usage._wake.clear()
+        record_llm_usage('a')
+        self.assertFalse(llm_usage._wake.is_set())
+        record_llm_usage('b')
+        self.assertTrue(llm_usage._wake.is_set())
+        llm_usage._wake.clear()
+
+
+@override_settings(TREATMENT_PLAN_STREAMING=False, HEALTH_SCREENING_TOP_K=0)
+class LLMCacheHitTests(TestCase):
+    """A reused stage counts as one cache hit per resubmission, not one per page view."""
+
+    def setUp(self):
+        self.enterContext(mock.patch.object(llm_usage, '_buffer', deque(maxlen=100)))
+        self.enterContext(mock.patch.object(llm_usage, '_flusher_pid', os.getpid()))
+        self.enterContext(mock.patch('bloodapp.views.aget_health_conditions_from_analysis', return_value=[]))
+        self.enterContext(mock.patch('bloodapp.ai_analysis.aget_treatment_plan', return_value={'Nutrition': []}))
+        self.ferritin = Marker.objects.create(
+            name='ferritin', display_name='Ferritin', background='', discussion='',
+            standard_min=30, standard_max=300, optimal_min=50, optimal_max=150,
+        )
+        self.client.force_login(User.objects.create_user('patient', password='pw'))
+
+    def submit_and_view(self):
+        self.client.post(reverse('patient_info'), {f'marker_{self.ferritin.id}_value': '20'})
+        self.client.get(reverse('health_concerns'))
+        self.client.get(reverse('treatment_plans'))
+
+    def cache_hits(self):
+        return sorted((row.stage, row.call_site) for row in llm_usage._buffer if row.cache_hit)
+
+    def test_resubmission_records_one_hit_per_reused_stage(self):
+        self.submit_and_view()
+        self.assertEqual(self.cache_hits(), [])
+        self.submit_and_view()
+        self.assertEqual(self.cache_hits(), [('health_concerns', 'health_conditions'),
+                                             ('treatment_plan', 'treatment_plan')])
+
+    def test_page_reloads_are_not_cache_hits(self):
+        self.submit_and_view()
+        for _ in range(3):
+            self.client.get(reverse('health_concerns'))
+            self.client.get(reverse('treatment_plans'))
+        self.assertEqual(self.cache_hits(), [])
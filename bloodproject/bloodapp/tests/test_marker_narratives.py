@@ -0,0 +1,56 @@
+from django.db.models import Value
+from django.db.models.functions import Concat
+from django.test import TestCase
+
+from bloodapp.models import Marker
+
+
+def make_marker(name, **fields):
+    return Marker(
+        name=name, display_name=name.title(), background='', discussion='',
+        standard_min=0, standard_max=1, optimal_min=0, optimal_max=1, **fields,
+    )
+
+
+class MarkerNarrativeTests(TestCase):
+    def test_save_renders_both_blocks(self):
+        marker = make_marker('ferritin', clinical_implications_low='Iron deficiency')
+        marker.save()
+        self.assertEqual(marker.narrative_low, ' - When LOW: Clinical implications: Iron deficiency')
+        self.assertEqual(marker.narrative_high, '')
+
+    def test_bulk_create_renders_blocks(self):
+        Marker.objects.bulk_create([make_marker('ferritin', drug_causes_increased='Iron supplements')])
+        marker = Marker.objects.get(name='ferritin')
+        self.assertEqual(marker.narrative_high, ' - When HIGH: Drug causes (increased): Iron supplements')
+
+    def test_bulk_update_of_a_source_field_refreshes_blocks(self):
+        marker = make_marker('ferritin')
+        marker.save()
+        marker.other_conditions_high = 'Hemochromatosis'
+        Marker.objects.bulk_update([marker], ['other_conditions_high'])
+        marker.refresh_from_db()
+        self.assertEqual(marker.narrative_high, ' - When HIGH: Other related conditions: Hemochromatosis')
+
+    def test_update_refreshes_blocks_of_the_matched_rows_only(self):
+        make_marker('ferritin', clinical_implications_low='Iron deficiency').save()
+        make_marker('b12', clinical_implications_low='Pernicious anemia').save()
+        Marker.objects.filter(name='ferritin').update(
+            clinical_implications_low=Concat('clinical_implications_low', Value(' anemia')),
+        )
+        self.assertEqual(
+            Marker.objects.get(name='ferritin').narrative_low,
+            ' - When LOW: Clinical implications: Iron deficiency anemia',
+        )
+        self.assertEqual(
+            Marker.objects.get(name='b12').narrative_low,
+            ' - When LOW: Clinical implications: Pernicious anemia',
+        )
+
+    def test_update_of_other_fields_leaves_blocks_alone(self):
+        make_marker('ferritin', clinical_implications_low='Iron deficiency').save()
+        self.assertEqual(Marker.objects.filter(name='ferritin').update(standard_max=300), 1)
+        self.assertEqual(
+            Marker.objects.get(name='ferritin').narrative_low,
+            ' - When LOW: Clinical implications: Iron deficiency',
+        )
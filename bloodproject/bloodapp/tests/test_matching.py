@@ -0,0 +1,87 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from bloodapp import catalog
+from bloodapp.matching import (
+    ConditionMatcher,
+    find_closest_condition_id,
+    get_condition_matcher,
+    match_conditions_with_fallback,
+    normalize_condition_name,
+)
+from bloodapp.models import HealthCondition
+
+ENTRIES = [
+    ('gout', ['Gout']),
+    ('iron_need', ['Iron Need', 'iron deficiency', 'iron insufficiency']),
+    ('bph', ['Benign prostatic hyperplasia', 'enlarged prostate']),
+    ('hypothyroidism_primary', ['Hypothyroidism (Primary)', 'hypothyroidism']),
+]
+
+
+class ConditionMatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.matcher = ConditionMatcher(ENTRIES)
+
+    def test_separators_and_case_are_normalized(self):
+        self.assertEqual(normalize_condition_name(' Iron_Need-(Low) '), 'iron need low')
+        self.assertEqual(self.matcher.match('IRON-need'), [('iron_need', 1.0)])
+
+    def test_alias_is_an_exact_hit(self):
+        self.assertEqual(self.matcher.match('Enlarged Prostate'), [('bph', 1.0)])
+
+    def test_misspellings_match_on_trigrams(self):
+        self.assertEqual(self.matcher.best('iron deficency'), 'iron_need')
+        self.assertEqual(self.matcher.best('enlarged prostrate'), 'bph')
+        self.assertEqual(self.matcher.best('hypothyroid'), 'hypothyroidism_primary')
+
+    def test_typo_in_a_short_id_falls_back_to_edit_similarity(self):
+        # 'gotu' shares too few trigrams with 'gout' to pass the cutoff on its own
+        self.assertEqual(self.matcher.match('gotu'), [('gout', 0.75)])
+
+    def test_unrelated_or_empty_names_do_not_match(self):
+        self.assertEqual(self.matcher.match('xyz'), [])
+        self.assertEqual(self.matcher.match(''), [])
+        self.assertIsNone(self.matcher.best('goutt', cutoff=0.9))
+
+    def test_allowed_restricts_exact_and_fuzzy_hits(self):
+        self.assertEqual(self.matcher.match('hypothyroidism', allowed=['gout']), [])
+        self.assertEqual(self.matcher.best('goutt', allowed=['gout', 'bph']), 'gout')
+
+    def test_each_condition_is_ranked_once(self):
+        ranked = self.matcher.match('iron insuficiency', limit=5, cutoff=0.3)
+        ids = [condition_id for condition_id, _ in ranked]
+        self.assertEqual(ids[0], 'iron_need')
+        self.assertEqual(len(ids), len(set(ids)))
+
+
+class CatalogMatcherTests(TestCase):
+    def setUp(self):
+        self.enterContext(mock.patch.dict(catalog._built, clear=True))
+        HealthCondition.objects.create(condition_id='zinc_need', name='Zinc Need')
+        HealthCondition.objects.create(condition_id='bph', name='BPH')
+
+    def test_matcher_is_built_from_the_catalog_with_aliases(self):
+        self.assertEqual(find_closest_condition_id('zinc deficiency'), 'zinc_need')
+        self.assertEqual(find_closest_condition_id('enlarged prostate'), 'bph')
+
+    def test_matcher_is_rebuilt_after_a_catalog_change(self):
+        matcher = get_condition_matcher()
+        self.assertIs(get_condition_matcher(), matcher)
+        HealthCondition.objects.create(condition_id='gout', name='Gout')
+        self.assertEqual(find_closest_condition_id('goutt'), 'gout')
+
+    def test_unmatched_conditions_fall_back_to_other_conditions(self):
+        matched, other = match_conditions_with_fallback([
+            {'condition_id': 'zinc_deficiency', 'level_of_risk': 'high', 'explanation': 'Low zinc'},
+            {'id': 'made_up_syndrome', 'risk': 'low'},
+            {'explanation': 'no id'},
+        ])
+        self.assertEqual(matched, [{
+            'condition_id': 'zinc_need', 'level_of_risk': 'high', 'explanation': 'Low zinc',
+            'original_ai_id': 'zinc_deficiency',
+        }])
+        self.assertEqual(other, [{
+            'name': 'Made Up Syndrome', 'original_id': 'made_up_syndrome', 'level_of_risk': 'low', 'explanation': '',
+        }])
@@ -0,0 +1,114 @@
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from bloodapp import metrics
+
+
+class ThreadShardTests(SimpleTestCase):
+    def setUp(self):
+        self.counter = metrics.Counter('bloodapp_test_shards_total', 'Test counter.', ('kind',))
+        self.histogram = metrics.Histogram('bloodapp_test_shard_seconds', 'Test histogram.', buckets=(1.0,))
+
+    def tearDown(self):
+        metrics._metrics.pop(self.counter.name)
+        metrics._metrics.pop(self.histogram.name)
+
+    def test_exited_threads_fold_into_the_process_total(self):
+        live_before = len(metrics._shards)
+
+        def work():
+            self.counter.inc(kind='a')
+            self.histogram.observe(0.5)
+            self.histogram.observe(2.0)
+
+        for _ in range(50):
+            thread = threading.Thread(target=work)
+            thread.start()
+            thread.join()
+
+        self.assertLessEqual(len(metrics._shards), live_before)
+        values = metrics.process_values()
+        self.assertEqual(values[self.counter.name][('a',)], 50)
+        self.assertEqual(values[self.histogram.name][()], [50, 50, 125.0, 100])
+
+
+class ExpositionTests(SimpleTestCase):
+    def setUp(self):
+        # Only this test's metrics are rendered; the app's gauges would query the database
+        self.enterContext(mock.patch.dict(metrics._metrics, clear=True))
+        self.enterContext(override_settings(METRICS_DIR=None))
+        name = self._testMethodName
+        self.counter = metrics.Counter(f'{name}_total', 'Requests.', ('view', 'status'))
+        self.histogram = metrics.Histogram(f'{name}_seconds', 'Latency.', ('view',), buckets=(0.1, 1.0))
+
+    def test_counter_and_histogram_exposition(self):
+        self.counter.inc(view='home', status='200')
+        self.counter.inc(2, view='home', status='200')
+        for value in (0.05, 0.5, 0.5, 3.0):
+            self.histogram.observe(value, view='home')
+        counter, histogram = self.counter.name, self.histogram.name
+        self.assertEqual(metrics.render_metrics().splitlines(), [
+            f'# HELP {counter} Requests.',
+            f'# TYPE {counter} counter',
+            f'{counter}{{view="home",status="200"}} 3',
+            f'# HELP {histogram} Latency.',
+            f'# TYPE {histogram} histogram',
+            f'{histogram}_bucket{{view="home",le="0.1"}} 1',
+            f'{histogram}_bucket{{view="home",le="1.0"}} 3',
+            f'{histogram}_bucket{{view="home",le="+Inf"}} 4',
+            f'{histogram}_sum{{view="home"}} 4.05',
+            f'{histogram}_count{{view="home"}} 4',
+        ])
+
+    def test_label_values_are_escaped(self):
+        self.counter.inc(view='a"b\\c\nd', status='500')
+        self.assertIn(f'{self.counter.name}{{view="a\\"b\\\\c\\nd",status="500"}} 1', metrics.render_metrics())
+
+    def test_collected_counters_and_gauges(self):
+        collected = metrics.Counter('test_collected_total', 'Collected.', ('site',), collect=lambda: {('x',): 4})
+        metrics.Gauge('test_queue_depth', 'Queue.', ('status',), collect=lambda: {('queued',): 2})
+        metrics.Gauge('test_broken', 'Broken.', collect=mock.Mock(side_effect=RuntimeError))
+        with self.assertLogs('bloodapp.metrics', 'ERROR'):
+            text = metrics.render_metrics()
+        self.assertIn(f'{collected.name}{{site="x"}} 4', text)
+        self.assertIn('test_queue_depth{status="queued"} 2', text)
+        self.assertNotIn('test_broken', text)
+
+    def test_worker_snapshots_and_the_archive_are_summed(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.counter.inc(view='home', status='200')
+        other = {self.counter.name: [[['home', '200'], 5]]}
+        for pid in (111, 222):
+            with open(os.path.join(directory, f'metrics-{pid}.json'), 'w') as f:
+                json.dump(other, f)
+        metrics.mark_process_dead(222, directory)
+        self.assertEqual(sorted(os.listdir(directory)), [metrics.ARCHIVE_FILE, 'metrics-111.json'])
+        with override_settings(METRICS_DIR=directory):
+            self.assertIn(f'{self.counter.name}{{view="home",status="200"}} 11', metrics.render_metrics())
+
+
+@override_settings(METRICS_DIR=None)
+class MetricsViewTests(TestCase):
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_is_required_when_set(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertIn('# TYPE bloodapp_http_request_duration_seconds histogram', response.content.decode())
+
+    @override_settings(METRICS_TOKEN='')
+    def test_staff_only_without_a_token(self):
+        user = User.objects.create_user('patient', password='pw')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        user.is_staff = True
+        user.save()
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
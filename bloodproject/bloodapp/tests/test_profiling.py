@@ -0,0 +1,52 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from bloodapp.profiling import profile_summary, reset_profile_summary
+
+
+@override_settings(PROFILING_HEADER='X-Profile', PROFILING_SAMPLE_RATE=0)
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        reset_profile_summary()
+        self.addCleanup(reset_profile_summary)
+        self.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.url = reverse('profile_summary')
+
+    def test_header_opt_in_adds_the_db_breakdown(self):
+        self.client.force_login(self.staff)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(queries), 0)
+        self.assertEqual(response['X-DB-Query-Count'], str(len(queries)))
+        timings = dict(part.split(';dur=') for part in response['Server-Timing'].split(', '))
+        self.assertEqual(set(timings), {'db', 'llm', 'pdf', 'template', 'total'})
+        self.assertGreater(float(timings['db']), 0)
+        self.assertLessEqual(float(timings['db']), float(timings['total']))
+        [entry] = profile_summary().values()
+        self.assertEqual(entry['samples'], 1)
+        self.assertEqual(entry['db_count']['p50'], len(queries))
+
+    def test_requests_without_the_header_are_not_profiled(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-DB-Query-Count', response)
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(profile_summary(), {})
+
+    def test_summary_rejects_non_staff_users(self):
+        user = User.objects.create_user('patient', password='pw')
+        self.client.force_login(user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('admin:login'), response['Location'])
+        self.assertNotIn('views', response.content.decode())
+
+    def test_summary_rejects_anonymous_users(self):
+        response = self.client.get(self.url, HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('admin:login'), response['Location'])
@@ -0,0 +1,72 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+
+from bloodapp import views
+from bloodapp.cache import report_cache
+from bloodapp.catalog import bump_catalog_version
+from bloodapp.models import AIAnalysisResult, Marker, PatientProfile
+
+
+class ReportCachingTests(TestCase):
+    """The report's ETag and cached context follow its stage rows and the catalog version."""
+
+    def setUp(self):
+        caches['default'].clear()
+        report_cache.clear_local()
+        Marker.objects.create(
+            name='ferritin', display_name='Ferritin', background='', discussion='',
+            standard_min=30, standard_max=300, optimal_min=50, optimal_max=150,
+        )
+        self.user = User.objects.create_user('patient', password='pw')
+        PatientProfile.objects.create(user=self.user, current_stage='completed')
+        for stage, data in (
+            ('patient_info', {'patient_values': {'ferritin': 20.0}, 'unit_systems': {'ferritin': 'standard'}}),
+            ('health_concerns', {'likely_conditions': [], 'other_conditions': []}),
+            ('treatment_plans', {'treatment_plan': {'summary': 'First plan'}}),
+        ):
+            AIAnalysisResult.objects.create(user=self.user, stage=stage, analysis_data=data, is_completed=True)
+        self.client.force_login(self.user)
+        self.build = self.enterContext(mock.patch('bloodapp.views.build_report_context',
+                                                  wraps=views.build_report_context))
+
+    def get(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(reverse('report'), **headers)
+
+    def test_repeat_request_with_the_etag_is_not_modified(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('Last-Modified'))
+        self.assertEqual(self.get(response['ETag']).status_code, 304)
+
+    def test_context_is_built_once_per_report_version(self):
+        self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(self.build.call_count, 1)
+
+    def test_saving_any_stage_changes_the_etag_and_the_context(self):
+        etag = self.get()['ETag']
+        for stage in ('patient_info', 'health_concerns', 'treatment_plans'):
+            with self.subTest(stage=stage):
+                result = AIAnalysisResult.objects.get(user=self.user, stage=stage)
+                if stage == 'treatment_plans':
+                    result.analysis_data = {'treatment_plan': {'summary': 'Revised plan'}}
+                result.save()
+                response = self.get(etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+                etag = response['ETag']
+        self.assertEqual(self.build.call_count, 4)
+        self.assertEqual(response.context['plan'], {'summary': 'Revised plan'})
+
+    def test_catalog_change_changes_the_etag(self):
+        etag = self.get()['ETag']
+        bump_catalog_version()
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.build.call_count, 2)
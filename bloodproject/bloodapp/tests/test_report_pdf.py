@@ -0,0 +1,166 @@
+import os
+import tempfile
+import time
+from concurrent.futures import Future
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from bloodapp import report_pdf
+from bloodapp.models import AIAnalysisResult, PatientProfile
+from bloodapp.report_pdf import STALE_TMP_SECONDS, prune_report_pdfs, request_report_pdf
+
+PDF_BYTES = b'%PDF-1.4 test'
+
+
+class PruneReportPdfsTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.enterContext(override_settings(REPORT_PDF_DIR=self.directory.name))
+
+    def make(self, name, age):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as f:
+            f.write(b'%PDF')
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def remaining(self):
+        return sorted(os.listdir(self.directory.name))
+
+    def test_expired_pdfs_and_stale_temp_files_are_removed(self):
+        self.make('fresh.pdf', 10)
+        self.make('expired.pdf', 7200)
+        self.make('rendering.tmp', 10)
+        self.make('abandoned.tmp', STALE_TMP_SECONDS + 10)
+        self.assertEqual(prune_report_pdfs(max_age=3600, max_files=10), 2)
+        self.assertEqual(self.remaining(), ['fresh.pdf', 'rendering.tmp'])
+
+    def test_only_the_newest_are_kept(self):
+        for age in range(5):
+            self.make(f'report-{age}.pdf', age * 10)
+        self.assertEqual(prune_report_pdfs(max_age=3600, max_files=2), 3)
+        self.assertEqual(self.remaining(), ['report-0.pdf', 'report-1.pdf'])
+
+    def test_missing_directory(self):
+        with override_settings(REPORT_PDF_DIR=os.path.join(self.directory.name, 'missing')):
+            self.assertEqual(prune_report_pdfs(), 0)
+
+
+class ManualExecutor:
+    """Stands in for the render pool: jobs run when the test calls run()."""
+
+    def __init__(self):
+        self.queue = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.queue.append((future, fn, args))
+        return future
+
+    def run(self):
+        queue, self.queue = self.queue, []
+        for future, fn, args in queue:
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+
+class RenderPoolMixin:
+    def setUp(self):
+        super().setUp()
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(REPORT_PDF_DIR=directory))
+        self.executor = ManualExecutor()
+        self.enterContext(mock.patch.object(report_pdf, '_get_executor', return_value=self.executor))
+        self.enterContext(mock.patch.dict(report_pdf._jobs, clear=True))
+        self.render = self.enterContext(mock.patch.object(report_pdf, 'render_report_pdf', return_value=PDF_BYTES))
+
+
+class RequestReportPdfTests(RenderPoolMixin, SimpleTestCase):
+    CONTEXT = {'patient_name': 'Pat', 'markers': []}
+
+    def test_pending_until_rendered_then_ready(self):
+        status, path, error = request_report_pdf(self.CONTEXT)
+        self.assertEqual((status, error), ('pending', None))
+        self.assertEqual(request_report_pdf(self.CONTEXT)[0], 'pending')
+        self.assertEqual(len(self.executor.queue), 1)
+        self.executor.run()
+        self.assertEqual(request_report_pdf(self.CONTEXT), ('ready', path, None))
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), PDF_BYTES)
+        self.assertEqual(self.render.call_count, 1)
+
+    def test_error_is_reported_once_then_retried(self):
+        self.render.side_effect = RuntimeError('font missing')
+        request_report_pdf(self.CONTEXT)
+        self.executor.run()
+        status, _, error = request_report_pdf(self.CONTEXT)
+        self.assertEqual((status, error), ('error', 'font missing'))
+
+        self.render.side_effect = None
+        self.assertEqual(request_report_pdf(self.CONTEXT)[0], 'pending')
+        self.executor.run()
+        self.assertEqual(request_report_pdf(self.CONTEXT)[0], 'ready')
+
+    def test_pdf_pruned_before_download_is_rendered_again(self):
+        _, path, _ = request_report_pdf(self.CONTEXT)
+        self.executor.run()
+        os.remove(path)
+        self.assertEqual(request_report_pdf(self.CONTEXT)[0], 'pending')
+        self.executor.run()
+        self.assertEqual(request_report_pdf(self.CONTEXT)[0], 'ready')
+
+    def test_changed_context_gets_its_own_pdf(self):
+        _, first, _ = request_report_pdf(self.CONTEXT)
+        _, second, _ = request_report_pdf({**self.CONTEXT, 'patient_name': 'Sam'})
+        self.assertNotEqual(first, second)
+        self.assertEqual(len(self.executor.queue), 2)
+
+
+class ReportPdfViewTests(RenderPoolMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('patient', password='pw')
+        self.client.force_login(self.user)
+
+    def add_report(self):
+        PatientProfile.objects.create(user=self.user, current_stage='completed')
+        AIAnalysisResult.objects.create(user=self.user, stage='patient_info', is_completed=True,
+                                        analysis_data={'patient_values': {}, 'unit_systems': {}})
+
+    def test_no_report_yet(self):
+        self.assertEqual(self.client.get(reverse('report_pdf')).status_code, 404)
+
+    def test_accepted_with_retry_after_then_the_file(self):
+        self.add_report()
+        response = self.client.get(reverse('report_pdf'))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(response.json(), {'status': 'pending'})
+
+        self.executor.run()
+        response = self.client.get(reverse('report_pdf'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response['Content-Disposition'].startswith('attachment; filename="blood-report-'))
+        self.assertEqual(b''.join(response.streaming_content), PDF_BYTES)
+
+    def test_render_error_then_retry(self):
+        self.add_report()
+        self.render.side_effect = RuntimeError('font missing')
+        self.client.get(reverse('report_pdf'))
+        self.executor.run()
+        response = self.client.get(reverse('report_pdf'))
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json(), {'status': 'error', 'error': 'font missing'})
+
+        self.render.side_effect = None
+        self.assertEqual(self.client.get(reverse('report_pdf')).status_code, 202)
+        self.executor.run()
+        self.assertEqual(self.client.get(reverse('report_pdf')).status_code, 200)
@@ -0,0 +1,106 @@
+import math
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from bloodapp import catalog
+from bloodapp.models import HealthCondition, Marker
+from bloodapp.screening import (
+    MAX_SEVERITY,
+    SUBOPTIMAL_SEVERITY,
+    ScreenedCondition,
+    marker_deviation,
+    marker_ranges,
+    screen_conditions,
+)
+
+
+class MarkerDeviationTests(SimpleTestCase):
+    RANGES = (30, 300, 50, 150)
+
+    def test_values_inside_the_optimal_range_do_not_deviate(self):
+        self.assertIsNone(marker_deviation(100, self.RANGES))
+        self.assertIsNone(marker_deviation(50, self.RANGES))
+
+    def test_suboptimal_values_count_less(self):
+        self.assertEqual(marker_deviation(40, self.RANGES), ('low', SUBOPTIMAL_SEVERITY))
+        self.assertEqual(marker_deviation(200, self.RANGES), ('high', SUBOPTIMAL_SEVERITY))
+
+    def test_severity_grows_with_the_distance_outside_the_normal_range(self):
+        self.assertEqual(marker_deviation(3, self.RANGES), ('low', 1.1))
+        self.assertEqual(marker_deviation(570, self.RANGES), ('high', 2.0))
+        self.assertEqual(marker_deviation(10000, self.RANGES), ('high', MAX_SEVERITY))
+
+    def test_missing_ranges_fall_back_to_each_other(self):
+        self.assertEqual(marker_deviation(40, (None, None, 50, 150)), ('low', 1.1))
+        self.assertEqual(marker_deviation(40, (50, 150, None, None)), ('low', 1.1))
+        self.assertIsNone(marker_deviation(40, (None, None, None, None)))
+
+    def test_ranges_follow_the_unit_system(self):
+        marker = {
+            'standard_min': 1, 'standard_max': 2, 'optimal_min': 1, 'optimal_max': 2,
+            'standard_min_conventional': 10, 'standard_max_conventional': 20,
+            'standard_min_international': 100, 'standard_max_international': None,
+        }
+        self.assertEqual(marker_ranges(marker, 'standard'), (10, 20, 1, 2))
+        self.assertEqual(marker_ranges(marker, 'International'), (100, 2, 1, 2))
+
+    def test_level_of_risk_follows_the_score(self):
+        self.assertEqual(ScreenedCondition('a', 'A', 1.5).level_of_risk, 'High')
+        self.assertEqual(ScreenedCondition('a', 'A', 0.6).level_of_risk, 'Moderate')
+        self.assertEqual(ScreenedCondition('a', 'A', 0.59).level_of_risk, 'Low')
+
+
+def make_marker(name, standard, optimal):
+    return Marker.objects.create(
+        name=name, display_name=name.title(), background='', discussion='',
+        standard_min=standard[0], standard_max=standard[1], optimal_min=optimal[0], optimal_max=optimal[1],
+    )
+
+
+class ScreenConditionsTests(TestCase):
+    def setUp(self):
+        self.enterContext(mock.patch.dict(catalog._built, clear=True))
+        ferritin = make_marker('ferritin', (30, 300), (50, 150))
+        hemoglobin = make_marker('hemoglobin', (12, 16), (13, 15))
+        tsh = make_marker('tsh', (0.5, 4.5), (1, 2))
+        b12 = make_marker('b12', (200, 900), (500, 800))
+
+        iron_need = HealthCondition.objects.create(condition_id='iron_need', name='Iron Need')
+        iron_need.associated_markers_low.add(ferritin, hemoglobin)
+        b12_need = HealthCondition.objects.create(condition_id='b12_need', name='B12 Need')
+        b12_need.associated_markers_low.add(ferritin, b12)
+        polycythemia = HealthCondition.objects.create(condition_id='polycythemia', name='Polycythemia')
+        polycythemia.associated_markers_high.add(hemoglobin)
+        hypothyroidism = HealthCondition.objects.create(condition_id='hypothyroidism', name='Hypothyroidism')
+        hypothyroidism.associated_markers_high.add(tsh)
+
+    def screen(self, values, **kwargs):
+        return screen_conditions(values, {}, **kwargs)
+
+    def test_score_is_supporting_severity_over_sqrt_of_measured_markers(self):
+        ranked = self.screen({'ferritin': 15, 'hemoglobin': 12.5, 'tsh': 1.5})
+        ferritin = 1 + 15 / 270
+        self.assertEqual([(c.condition_id, c.score) for c in ranked], [
+            # b12 was not measured, so it does not dilute the score
+            ('b12_need', round(ferritin, 3)),
+            ('iron_need', round((ferritin + SUBOPTIMAL_SEVERITY) / math.sqrt(2), 3)),
+        ])
+        self.assertEqual(ranked[1].hits, [('ferritin', 'low', ferritin), ('hemoglobin', 'low', SUBOPTIMAL_SEVERITY)])
+        self.assertEqual(ranked[1].explanation(), 'Associated marker deviations: ferritin low, hemoglobin low.')
+
+    def test_contradicting_deviations_count_against_a_condition(self):
+        ranked = self.screen({'hemoglobin': 17, 'ferritin': 100})
+        self.assertEqual([c.condition_id for c in ranked], ['polycythemia'])
+        ranked = self.screen({'hemoglobin': 17, 'ferritin': 15})
+        scores = {c.condition_id: c.score for c in ranked}
+        self.assertEqual(scores['iron_need'], round((1 + 15 / 270 - 0.5 * 1.25) / math.sqrt(2), 3))
+
+    def test_conditions_without_support_are_left_out(self):
+        self.assertEqual(self.screen({'tsh': 1.5, 'unknown': 3, 'ferritin': None}), [])
+        # Polycythemia expects hemoglobin high, so low hemoglobin only counts against it
+        self.assertEqual([c.condition_id for c in self.screen({'hemoglobin': 11})], ['iron_need'])
+
+    def test_limit_keeps_the_best(self):
+        ranked = self.screen({'ferritin': 15, 'hemoglobin': 12.5}, limit=1)
+        self.assertEqual([c.condition_id for c in ranked], ['b12_need'])
@@ -0,0 +1,50 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from bloodapp.models import HealthCondition, Marker
+from bloodapp.views import AT_RISK_SESSION_KEY, LEGACY_SESSION_KEYS
+
+AUTH_KEYS = {'_auth_user_id', '_auth_user_backend', '_auth_user_hash'}
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db', HEALTH_SCREENING_TOP_K=0)
+class SessionContentsTests(TestCase):
+    """The session holds references only; stage payloads stay in AIAnalysisResult."""
+
+    def setUp(self):
+        self.ferritin = Marker.objects.create(
+            name='ferritin', display_name='Ferritin', background='', discussion='',
+            standard_min=30, standard_max=300, optimal_min=50, optimal_max=150,
+        )
+        HealthCondition.objects.create(condition_id='iron_need', name='Iron Need')
+        self.enterContext(mock.patch('bloodapp.views.aget_health_conditions_from_analysis', return_value=[
+            {'condition_id': 'iron_need', 'level_of_risk': 'High', 'explanation': 'Low ferritin'},
+        ]))
+        self.client.force_login(User.objects.create_user('patient', password='pw'))
+        session = self.client.session
+        for key in LEGACY_SESSION_KEYS:
+            session[key] = {'stale': 'payload'}
+        session.save()
+
+    def session_keys(self):
+        return set(self.client.session.keys()) - AUTH_KEYS
+
+    def test_only_references_are_kept(self):
+        self.client.post(reverse('patient_info'), {f'marker_{self.ferritin.id}_value': '20'})
+        self.assertEqual(self.session_keys(), set())
+
+        self.assertEqual(self.client.get(reverse('health_concerns')).status_code, 200)
+        self.assertEqual(self.session_keys(), {AT_RISK_SESSION_KEY})
+        self.assertEqual(self.client.session[AT_RISK_SESSION_KEY], ['iron_need'])
+
+    def test_unchanged_session_is_not_saved_again(self):
+        self.client.post(reverse('patient_info'), {f'marker_{self.ferritin.id}_value': '20'})
+        self.client.get(reverse('health_concerns'))
+        with mock.patch.object(SessionStore, 'save', autospec=True, side_effect=SessionStore.save) as save:
+            self.client.get(reverse('health_concerns'))
+            self.client.post(reverse('patient_info'), {f'marker_{self.ferritin.id}_value': '20'})
+        save.assert_not_called()
@@ -0,0 +1,80 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from bloodapp.catalog import bump_catalog_version
+from bloodapp.models import AIAnalysisResult, Marker
+
+PLAN = {'Nutrition': ['Eat greens'], 'Lifestyle changes': ['Walk daily'], 'Supplements': ['Vitamin D3']}
+
+
+@override_settings(TREATMENT_PLAN_STREAMING=False, HEALTH_SCREENING_TOP_K=0)
+class StageReuseTests(TestCase):
+    """Stages derived from a panel are reused for an identical resubmission and recomputed otherwise."""
+
+    def setUp(self):
+        self.ferritin = Marker.objects.create(
+            name='ferritin', display_name='Ferritin', background='', discussion='',
+            standard_min=30, standard_max=300, optimal_min=50, optimal_max=150,
+        )
+        self.user = User.objects.create_user('patient', password='pw')
+        self.client.force_login(self.user)
+        self.conditions_llm = self.enterContext(
+            mock.patch('bloodapp.views.aget_health_conditions_from_analysis', return_value=[]))
+        self.plan_llm = self.enterContext(mock.patch('bloodapp.ai_analysis.aget_treatment_plan', return_value=PLAN))
+
+    def submit(self, ferritin):
+        response = self.client.post(reverse('patient_info'), {
+            f'marker_{self.ferritin.id}_value': str(ferritin),
+            f'marker_{self.ferritin.id}_unit': 'standard',
+        })
+        self.assertRedirects(response, reverse('health_concerns'), fetch_redirect_response=False)
+
+    def run_flow(self, ferritin):
+        self.submit(ferritin)
+        self.assertEqual(self.client.get(reverse('health_concerns')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('treatment_plans')).status_code, 200)
+
+    def llm_calls(self):
+        return self.conditions_llm.await_count, self.plan_llm.await_count
+
+    def stage(self, stage):
+        return AIAnalysisResult.objects.get(user=self.user, stage=stage).analysis_data
+
+    def test_identical_resubmission_reuses_every_stage(self):
+        self.run_flow(20)
+        self.assertEqual(self.llm_calls(), (1, 1))
+        self.run_flow(20)
+        self.assertEqual(self.llm_calls(), (1, 1))
+
+    def test_changed_panel_recomputes_the_stages(self):
+        self.run_flow(20)
+        first_hash = self.stage('patient_info')['input_hash']
+        self.run_flow(400)
+        self.assertEqual(self.llm_calls(), (2, 2))
+        self.assertNotEqual(self.stage('patient_info')['input_hash'], first_hash)
+        self.assertEqual(self.stage('patient_info')['patient_values'], {'ferritin': 400.0})
+        self.assertEqual(self.stage('treatment_plans')['input_hash'], self.stage('patient_info')['input_hash'])
+
+    def test_catalog_change_recomputes_the_stages(self):
+        self.run_flow(20)
+        bump_catalog_version()
+        self.run_flow(20)
+        self.assertEqual(self.llm_calls(), (2, 2))
+
+    def test_incomplete_plan_is_regenerated(self):
+        self.submit(20)
+        self.client.get(reverse('health_concerns'))
+        self.plan_llm.side_effect = RuntimeError('LLM down')
+        with self.assertLogs('bloodapp.views', 'ERROR'):
+            self.client.get(reverse('treatment_plans'))
+        self.assertTrue(self.stage('treatment_plans')['incomplete'])
+
+        self.plan_llm.side_effect = None
+        self.client.get(reverse('treatment_plans'))
+        self.assertEqual(self.plan_llm.await_count, 2)
+        self.assertNotIn('incomplete', self.stage('treatment_plans'))
+        self.client.get(reverse('treatment_plans'))
+        self.assertEqual(self.plan_llm.await_count, 2)
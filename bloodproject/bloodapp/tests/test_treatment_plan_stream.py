@@ -0,0 +1,142 @@
+import json
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from bloodapp.models import AIAnalysisResult, PatientProfile
+
+# One top-level plan section completes per chunk after the first
+PLAN_CHUNKS = [
+    '{"Nutrition": ["Eat greens"]',
+    ', "Lifestyle changes": ["Walk daily"]',
+    ', "Supplements": ["Vitamin D3"]',
+    '}',
+]
+
+
+def _chunk(content):
+    return SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+class ScriptedLLMClient:
+    """Streams PLAN_CHUNKS and counts how many the view has pulled so far."""
+
+    def __init__(self, asynchronous=False):
+        self.pulled = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(
+            create=self._acreate if asynchronous else self._create))
+
+    def _stream(self):
+        for content in PLAN_CHUNKS:
+            self.pulled += 1
+            yield _chunk(content)
+
+    async def _astream(self):
+        for content in PLAN_CHUNKS:
+            self.pulled += 1
+            yield _chunk(content)
+
+    def _create(self, **kwargs):
+        return self._stream()
+
+    async def _acreate(self, **kwargs):
+        return self._astream()
+
+
+@mock.patch('bloodapp.ai_analysis._record_call')
+class TreatmentPlanStreamTests(TestCase):
+    """Sections must reach the client one at a time under both WSGI and ASGI, not after the whole plan."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('streamer', password='pw')
+        PatientProfile.objects.create(user=self.user, current_stage='treatment_plans')
+        AIAnalysisResult.objects.create(user=self.user, stage='health_concerns', is_completed=True, analysis_data={
+            'input_hash': 'panel-1', 'likely_conditions': [], 'other_conditions': []})
+
+    def assert_streamed(self, events, client):
+        self.assertEqual([e.get('section') for e in events[:-1]], ['Nutrition', 'Lifestyle changes', 'Supplements'])
+        self.assertTrue(events[-1]['done'])
+        self.assertIn('Vitamin D3', events[-1]['html'])
+        self.assertEqual(client.pulled, len(PLAN_CHUNKS))
+        saved = AIAnalysisResult.objects.get(user=self.user, stage='treatment_plans').analysis_data
+        self.assertEqual(saved['input_hash'], 'panel-1')
+
+    def test_wsgi_streams_sections_as_they_arrive(self, record_call):
+        llm = ScriptedLLMClient()
+        self.client.force_login(self.user)
+        with mock.patch('bloodapp.ai_analysis.get_llm_client', return_value=llm):
+            response = self.client.get(reverse('treatment_plans_stream'))
+            self.assertFalse(response.is_async)
+            chunks = iter(response.streaming_content)
+            first = json.loads(next(chunks))
+            self.assertEqual(first['section'], 'Nutrition')
+            self.assertLess(llm.pulled, len(PLAN_CHUNKS))
+            events = [first] + [json.loads(chunk) for chunk in chunks]
+        self.assert_streamed(events, llm)
+
+    async def test_asgi_streams_sections_as_they_arrive(self, record_call):
+        llm = ScriptedLLMClient(asynchronous=True)
+        await self.async_client.aforce_login(self.user)
+        with mock.patch('bloodapp.ai_analysis.get_async_llm_client', return_value=llm):
+            response = await self.async_client.get(reverse('treatment_plans_stream'))
+            self.assertTrue(response.is_async)
+            chunks = aiter(response.streaming_content)
+            first = json.loads(await anext(chunks))
+            self.assertEqual(first['section'], 'Nutrition')
+            self.assertLess(llm.pulled, len(PLAN_CHUNKS))
+            events = [first] + [json.loads(chunk) async for chunk in chunks]
+        await sync_to_async(self.assert_streamed)(events, llm)
+
+
+class FailingLLMClient(ScriptedLLMClient):
+    """Delivers the first section, then the connection drops."""
+
+    def _stream(self):
+        yield from [_chunk(c) for c in PLAN_CHUNKS[:2]]
+        raise ConnectionError('stream dropped')
+
+    async def _astream(self):
+        for content in PLAN_CHUNKS[:2]:
+            yield _chunk(content)
+        raise ConnectionError('stream dropped')
+
+
+@mock.patch('bloodapp.ai_analysis._record_call')
+class TreatmentPlanStreamFailureTests(TestCase):
+    """A stream that fails midway must not be stored as the final plan for the panel."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('dropped', password='pw')
+        PatientProfile.objects.create(user=self.user, current_stage='treatment_plans')
+        AIAnalysisResult.objects.create(user=self.user, stage='health_concerns', is_completed=True, analysis_data={
+            'input_hash': 'panel-1', 'likely_conditions': [], 'other_conditions': []})
+        self.client.force_login(self.user)
+
+    def stream(self):
+        with mock.patch('bloodapp.ai_analysis.get_llm_client', return_value=FailingLLMClient()), \
+                self.assertLogs('bloodapp.views', 'ERROR'):
+            response = self.client.get(reverse('treatment_plans_stream'))
+            return [json.loads(chunk) for chunk in response.streaming_content]
+
+    def test_partial_plan_is_saved_incomplete_and_regenerated(self, record_call):
+        events = self.stream()
+        self.assertEqual(events[0]['section'], 'Nutrition')
+        self.assertTrue(events[-1]['done'] and events[-1]['incomplete'])
+        self.assertIn('Plan Incomplete', events[-1]['html'])
+        self.assertIn('Eat greens', events[-1]['html'])
+
+        saved = AIAnalysisResult.objects.get(user=self.user, stage='treatment_plans').analysis_data
+        self.assertTrue(saved['incomplete'])
+        self.assertEqual(saved['treatment_plan']['dietary_recommendations'][0]['description'], 'Eat greens')
+
+        # The next visit streams a new plan instead of serving the truncated one
+        llm = ScriptedLLMClient()
+        with mock.patch('bloodapp.ai_analysis.get_llm_client', return_value=llm):
+            events = [json.loads(c) for c in self.client.get(reverse('treatment_plans_stream')).streaming_content]
+        self.assertFalse(events[-1]['incomplete'])
+        self.assertEqual(llm.pulled, len(PLAN_CHUNKS))
+        self.assertNotIn('incomplete', AIAnalysisResult.objects.get(user=self.user, stage='treatment_plans').analysis_data)
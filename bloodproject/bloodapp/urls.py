@@ -17,8 +17,10 @@ urlpatterns = [
     path('patient-info/parse-pdf/', views.parse_pdf_markers, name='parse_pdf_markers'),
     path('health-concerns/', views.health_concerns_view, name='health_concerns'),
     path('treatment-plans/', views.treatment_plans_view, name='treatment_plans'),
+    path('treatment-plans/stream/', views.treatment_plans_stream, name='treatment_plans_stream'),
     path('completed/', views.completed_view, name='completed'),
     path('report/', views.report_view, name='report'),
+    path('report/pdf/', views.report_pdf_view, name='report_pdf'),
     
     # Legacy URLs (for backward compatibility)
     path('submit/', views.patient_info_view, name='submit_blood_test'),
@@ -29,5 +31,11 @@ urlpatterns = [
     path('clear-session/', views.clear_session, name='clear_session'),
     path('treatment-plan/', views.treatment_plans_view, name='treatment_plan'),
     path('health/', views.health_check, name='health_check'),
+    path('healthz', views.healthz, name='healthz'),
+    path('readyz', views.readyz, name='readyz'),
+    path('ops/db-connections/', views.db_connection_stats, name='db_connection_stats'),
+    path('ops/cache/', views.cache_stats_view, name='cache_stats'),
+    path('ops/profile/', views.profile_summary_view, name='profile_summary'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
 
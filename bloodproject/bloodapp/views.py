@@ -1,43 +1,65 @@
 from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.models import User
-from django.http import HttpResponse, JsonResponse
-from django.views.decorators.http import require_POST
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition, require_POST
+from django.utils.cache import patch_cache_control
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import sync_to_async
 
+import hashlib
+import hmac
 import json
+import logging
 import os
 import random
 import string
-import difflib
 import threading
 import time
 
 from .forms import SignUpForm, LoginForm, BloodTestForm
+from .cache import cache_stats, catalog_cache, report_cache
+from .catalog import get_catalog_version
+from .condition_markers import get_condition_display_names, get_health_condition
+from .db_connections import close_thread_connections, connection_stats, release_connections
+from .health import database_health, liveness, readiness
+from .llm_usage import llm_usage_context, record_llm_cache_hit
+from .metrics import RISK_TASK_SECONDS, render_metrics
+from .profiling import profile_summary, reset_profile_summary
+from .report_pdf import request_report_pdf
+from .screening import screen_conditions, screening_top_k
 from .models import Marker, HealthCondition, PatientProfile, AIAnalysisResult, RiskComputationTask
-from .utils import (
-    get_health_conditions_from_analysis,
-    safe_json_loads,
-    extract_text_from_pdf,
-    map_pdf_values_to_markers,
-    parse_signs_and_symptoms
-)
+from .ai_analysis import aget_health_conditions_from_analysis
+from .pdf_import import aextract_text_from_pdf, amap_pdf_values_to_markers, get_marker_meta_list
+
+logger = logging.getLogger(__name__)
 
 def _random_username(prefix='demo'):
     return f"{prefix}_{''.join(random.choices(string.ascii_lowercase + string.digits, k=6))}"
 
-def find_closest_condition_id(name, valid_ids):
-    closest = difflib.get_close_matches(name.lower(), valid_ids, n=1, cutoff=0.5)
-    return closest[0] if closest else None
-
 def load_markers_data():
     return {"markers": list(Marker.objects.all().values())}
 
 def load_health_conditions_data():
     return {"health_conditions": list(HealthCondition.objects.all().values())}
 
+# The session holds references only (condition IDs, the unit preference); stage
+# payloads are read from AIAnalysisResult
+AT_RISK_SESSION_KEY = 'at_risk_condition_ids'
+# Full payloads earlier versions kept in the session
+LEGACY_SESSION_KEYS = ('at_risk_conditions', 'patient_values', 'unit_systems', 'treatment_plan')
+
+def drop_legacy_session_keys(session):
+    """Remove payloads older versions stored in the session (saves it only if one was there)."""
+    for key in LEGACY_SESSION_KEYS:
+        session.pop(key, None)
+
 def clear_session(request):
     request.session.flush()
     return redirect('patient_info')
@@ -62,29 +84,87 @@ def get_ai_result(user, stage):
     except AIAnalysisResult.DoesNotExist:
         return None
 
+async def asave_ai_result(user, stage, analysis_data):
+    """Async variant of save_ai_result"""
+    result, created = await AIAnalysisResult.objects.aget_or_create(
+        user=user,
+        stage=stage,
+        defaults={'analysis_data': analysis_data, 'is_completed': True}
+    )
+    if not created:
+        result.analysis_data = analysis_data
+        result.is_completed = True
+        await result.asave()
+    return result
+
+async def aget_ai_result(user, stage):
+    """Async variant of get_ai_result"""
+    try:
+        return await AIAnalysisResult.objects.aget(user=user, stage=stage)
+    except AIAnalysisResult.DoesNotExist:
+        return None
+
+# Templates, context processors and the lazy request.user are sync-only
+arender = sync_to_async(render)
+
+# Awaited before an LLM call so requests parked on the LLM don't each hold a DB connection
+arelease_db_connections = sync_to_async(release_connections)
+
+def stage_input_hash(patient_values, unit_systems):
+    """Key for every stage derived from a panel: its values, unit systems and the catalog version read against."""
+    payload = json.dumps({
+        'patient_values': patient_values,
+        'unit_systems': unit_systems,
+        'catalog_version': get_catalog_version(),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def stage_result_is_current(result, input_hash):
+    """True if a stored stage result was computed, completely, from the panel identified by input_hash."""
+    return (result is not None and result.analysis_data.get('input_hash') == input_hash
+            and not result.analysis_data.get('incomplete'))
+
+# Stages a resubmission can take from their stored results: (stage, LLM call site, usage stage)
+REUSABLE_LLM_STAGES = (
+    ('health_concerns', 'health_conditions', 'health_concerns'),
+    ('treatment_plans', 'treatment_plan', 'treatment_plan'),
+)
+
+def record_reused_stages(user, input_hash):
+    """Count each LLM stage an identical resubmission gets from its stored result as one cache hit."""
+    for stage, call_site, usage_stage in REUSABLE_LLM_STAGES:
+        if stage_result_is_current(get_ai_result(user, stage), input_hash):
+            record_llm_cache_hit(call_site, user.pk, usage_stage)
+
+def _first_set(value, fallback):
+    return value if value is not None else fallback
+
+def get_marker_ranges():
+    """Every marker's ranges and narrative, as dicts, cached per catalog version."""
+    fields = ['name', 'background', 'discussion']
+    for kind in ('standard', 'optimal'):
+        for bound in ('min', 'max'):
+            fields += [f'{kind}_{bound}', f'{kind}_{bound}_conventional', f'{kind}_{bound}_international']
+    return catalog_cache.get_or_set('marker_ranges', lambda: list(Marker.objects.values(*fields)))
+
 def analyze_patient_results_db(patient_values_by_name, unit_system_by_name):
     """Analyze using Marker DB choosing ranges based on per-marker unit system."""
     report_lines = []
-    for m in Marker.objects.all():
-        value = patient_values_by_name.get(m.name)
+    for m in get_marker_ranges():
+        value = patient_values_by_name.get(m['name'])
         if value is None:
             continue
-        unit_sys = (unit_system_by_name.get(m.name) or 'standard').lower()
+        unit_sys = (unit_system_by_name.get(m['name']) or 'standard').lower()
         # Choose ranges
-        if unit_sys == 'international':
-            normal_min = m.standard_min_international if m.standard_min_international is not None else m.standard_min
-            normal_max = m.standard_max_international if m.standard_max_international is not None else m.standard_max
-            optimal_min = m.optimal_min_international if m.optimal_min_international is not None else m.optimal_min
-            optimal_max = m.optimal_max_international if m.optimal_max_international is not None else m.optimal_max
-        else:
-            normal_min = m.standard_min_conventional if m.standard_min_conventional is not None else m.standard_min
-            normal_max = m.standard_max_conventional if m.standard_max_conventional is not None else m.standard_max
-            optimal_min = m.optimal_min_conventional if m.optimal_min_conventional is not None else m.optimal_min
-            optimal_max = m.optimal_max_conventional if m.optimal_max_conventional is not None else m.optimal_max
+        suffix = 'international' if unit_sys == 'international' else 'conventional'
+        normal_min = _first_set(m[f'standard_min_{suffix}'], m['standard_min'])
+        normal_max = _first_set(m[f'standard_max_{suffix}'], m['standard_max'])
+        optimal_min = _first_set(m[f'optimal_min_{suffix}'], m['optimal_min'])
+        optimal_max = _first_set(m[f'optimal_max_{suffix}'], m['optimal_max'])
         in_normal = (normal_min is not None and normal_max is not None) and (normal_min <= value <= normal_max)
         in_optimal = (optimal_min is not None and optimal_max is not None) and (optimal_min <= value <= optimal_max)
         if not in_normal or not in_optimal:
-            report_lines.append(f"[{m.name}]\n - Normal range: {normal_min}-{normal_max}\n - Optimal range: {optimal_min}-{optimal_max}\n - Patient has: {value} ({'intl' if unit_sys=='international' else 'std'})\n{m.background} {m.discussion}")
+            report_lines.append(f"[{m['name']}]\n - Normal range: {normal_min}-{normal_max}\n - Optimal range: {optimal_min}-{optimal_max}\n - Patient has: {value} ({'intl' if unit_sys=='international' else 'std'})\n{m['background']} {m['discussion']}")
     return "\n\n".join(report_lines)
 
 @login_required
@@ -98,18 +178,20 @@ def patient_info_view(request):
     # Default unit system preference stored in session
     default_unit = request.session.get('default_unit', 'standard')
 
-    markers = list(Marker.objects.all().order_by('display_name').values(
-        'id','name','display_name','standard_unit','international_unit',
-        'standard_min_conventional','standard_max_conventional',
-        'standard_min_international','standard_max_international',
-        'optimal_min_conventional','optimal_max_conventional',
-        'optimal_min_international','optimal_max_international'
-    ))
+    markers = catalog_cache.get_or_set('patient_info_markers', lambda: list(
+        Marker.objects.all().order_by('display_name').values(
+            'id','name','display_name','standard_unit','international_unit',
+            'standard_min_conventional','standard_max_conventional',
+            'standard_min_international','standard_max_international',
+            'optimal_min_conventional','optimal_max_conventional',
+            'optimal_min_international','optimal_max_international'
+        )))
 
     if request.method == 'POST':
-        # Update default unit if provided
-        default_unit = request.POST.get('default_unit', default_unit)
-        request.session['default_unit'] = default_unit
+        # Update default unit if provided (the session is only written when it changes)
+        if request.POST.get('default_unit', default_unit) != default_unit:
+            default_unit = request.POST['default_unit']
+            request.session['default_unit'] = default_unit
 
         # Collect values
         patient_values = {}
@@ -124,18 +206,27 @@ def patient_info_view(request):
                 except ValueError:
                     continue
 
-        # Save in session for later steps
-        request.session['patient_values'] = patient_values
-        request.session['unit_systems'] = unit_systems
+        # Later steps read the panel from the patient_info AIAnalysisResult, not the session
+        drop_legacy_session_keys(request.session)
+
+        # An identical re-submission keeps the stored analysis and every downstream stage
+        input_hash = stage_input_hash(patient_values, unit_systems)
+        if stage_result_is_current(get_ai_result(request.user, 'patient_info'), input_hash):
+            record_reused_stages(request.user, input_hash)
+            if profile.current_stage == 'patient_info':
+                profile.current_stage = 'health_concerns'
+                profile.save()
+            return redirect('health_concerns')
 
         # Analyze
         analysis_report = analyze_patient_results_db(patient_values, unit_systems)
 
-        # Save AI analysis result to database
+        # Save AI analysis result to database; later stages recompute when their input_hash differs
         ai_result_data = {
             'patient_values': patient_values,
             'unit_systems': unit_systems,
-            'analysis_report': analysis_report
+            'analysis_report': analysis_report,
+            'input_hash': input_hash,
         }
         save_ai_result(request.user, 'patient_info', ai_result_data)
 
@@ -158,78 +249,88 @@ def patient_info_view(request):
 
 @require_POST
 @login_required
-def parse_pdf_markers(request):
+async def parse_pdf_markers(request):
     """Receive a PDF, extract text, map values to known markers via OpenAI, return JSON."""
     pdf_file = request.FILES.get('pdf')
     if not pdf_file:
         return JsonResponse({'error': 'No PDF uploaded'}, status=400)
     try:
-        pdf_text = extract_text_from_pdf(pdf_file)
+        pdf_text = await aextract_text_from_pdf(pdf_file)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+    marker_meta = await sync_to_async(get_marker_meta_list)()
+    user = await request.auser()
+    await arelease_db_connections()
     try:
-        mappings = map_pdf_values_to_markers(pdf_text)
+        with llm_usage_context(user.pk, 'patient_info_pdf'):
+            mappings = await amap_pdf_values_to_markers(pdf_text, marker_meta)
         # Expected: [{name, value, unit_system}]
         return JsonResponse({'mappings': mappings})
     except Exception as e:
         return JsonResponse({'error': f'LLM mapping failed: {e}'}, status=500)
 
 @login_required
-def health_concerns_view(request):
+async def health_concerns_view(request):
     """Stage 2: View AI-generated health concerns"""
-    profile, created = PatientProfile.objects.get_or_create(user=request.user)
+    user = await request.auser()
+    profile, created = await PatientProfile.objects.aget_or_create(user=user)
 
     # Check if user can access this stage
     if profile.current_stage == 'patient_info':
         return redirect('patient_info')
 
     # Get saved patient info
-    patient_info_result = get_ai_result(request.user, 'patient_info')
+    patient_info_result = await aget_ai_result(user, 'patient_info')
     if not patient_info_result:
         return redirect('patient_info')
 
-    # Check if we already have health concerns analysis
-    health_concerns_result = get_ai_result(request.user, 'health_concerns')
+    # Reuse the health concerns analysis if it was computed from the current panel
+    input_hash = patient_info_result.analysis_data.get('input_hash')
+    health_concerns_result = await aget_ai_result(user, 'health_concerns')
 
-    if not health_concerns_result:
-        # Generate health concerns analysis using AI
+    if not stage_result_is_current(health_concerns_result, input_hash):
+        # Generate health concerns analysis using AI, from the report stored with the panel
         patient_values = patient_info_result.analysis_data.get('patient_values', {})
-        analysis_report = analyze_patient_results_db(
+        analysis_report = patient_info_result.analysis_data.get('analysis_report')
+        if analysis_report is None:
+            analysis_report = await sync_to_async(analyze_patient_results_db)(
+                patient_values,
+                patient_info_result.analysis_data.get('unit_systems', {})
+            )
+
+        # Rank conditions locally from the marker associations; the LLM only refines the top few
+        top_k = screening_top_k()
+        shortlist = await sync_to_async(screen_conditions)(
             patient_values,
-            patient_info_result.analysis_data.get('unit_systems', {})
-        )
+            patient_info_result.analysis_data.get('unit_systems', {}),
+            limit=top_k,
+        ) if top_k else []
 
-        # Call LLM to get structured health conditions
-        try:
-            structured_conditions_json = get_health_conditions_from_analysis(analysis_report)
-        except Exception:
-            structured_conditions_json = ''
+        # Call LLM to get structured health conditions (parsed and validated, re-asked once if unusable)
+        await arelease_db_connections()
         try:
-            likely_conditions_raw = safe_json_loads(structured_conditions_json)
+            with llm_usage_context(user.pk, 'health_concerns'):
+                likely_conditions_raw = await aget_health_conditions_from_analysis(analysis_report, candidates=shortlist)
         except Exception:
-            likely_conditions_raw = []
-
-        # Get valid condition IDs for matching
-        valid_condition_ids = list(HealthCondition.objects.values_list('condition_id', flat=True))
-        
-        # Use enhanced matching with fallback for unmatched conditions
-        from .utils import match_conditions_with_fallback, condition_id_to_display_name
-        matched_conditions, other_conditions = match_conditions_with_fallback(
-            likely_conditions_raw or [], valid_condition_ids
-        )
+            # Fall back to the deterministic ranking so the stage still works without the LLM
+            likely_conditions_raw = [
+                {'condition_id': c.condition_id, 'level_of_risk': c.level_of_risk, 'explanation': c.explanation()}
+                for c in shortlist
+            ]
+
+        # Match against the catalog (trigram index, built once per catalog version)
+        from .matching import match_conditions_with_fallback, condition_id_to_display_name
+        matched_conditions, other_conditions = await sync_to_async(match_conditions_with_fallback)(
+            likely_conditions_raw or [])
 
         # Normalize matched conditions and attach display_name
+        catalog_names = await sync_to_async(get_condition_display_names)()
         normalized = []
         for item in matched_conditions:
             cond_id = item['condition_id']
-            try:
-                hc = HealthCondition.objects.get(condition_id=cond_id)
-                disp = hc.display_name or hc.name or condition_id_to_display_name(cond_id)
-            except HealthCondition.DoesNotExist:
-                disp = condition_id_to_display_name(cond_id)
             normalized.append({
                 'condition_id': cond_id,
-                'display_name': disp,
+                'display_name': catalog_names.get(cond_id) or condition_id_to_display_name(cond_id),
                 'level_of_risk': item.get('level_of_risk') or '',
                 'explanation': item.get('explanation') or '',
                 'original_ai_id': item.get('original_ai_id')  # Keep track of original AI response
@@ -241,14 +342,14 @@ def health_concerns_view(request):
             'other_conditions': other_conditions,  # Add other conditions
             'analysis_report': analysis_report,
             'patient_values': patient_values,
+            'screening': [{'condition_id': c.condition_id, 'score': c.score} for c in shortlist],
+            'input_hash': input_hash,
         }
-        save_ai_result(request.user, 'health_concerns', ai_result_data)
+        health_concerns_result = await asave_ai_result(user, 'health_concerns', ai_result_data)
 
         # Update user's stage
         profile.current_stage = 'treatment_plans' if not normalized else 'health_concerns'
-        profile.save()
-
-        health_concerns_result = get_ai_result(request.user, 'health_concerns')
+        await profile.asave()
 
     # Store in session for quiz flow
     likely = health_concerns_result.analysis_data.get('likely_conditions', [])
@@ -261,123 +362,278 @@ def health_concerns_view(request):
         except Exception:
             likely = []
     
-    # Combine matched and other conditions for session storage
-    all_conditions = likely + other_conditions
-    request.session['at_risk_conditions'] = all_conditions
+    # The session only references the conditions; their details stay in AIAnalysisResult
+    condition_ids = [c.get('condition_id') for c in likely + other_conditions if c.get('condition_id')]
+    if await request.session.aget(AT_RISK_SESSION_KEY) != condition_ids:
+        await request.session.aset(AT_RISK_SESSION_KEY, condition_ids)
+    for key in LEGACY_SESSION_KEYS:
+        await request.session.apop(key, None)
     
     # Compute quiz completion progress (only for matched conditions that need quizzes)
     quiz_completed_count = sum(1 for c in likely if c.get('detailed_analysis')) if likely else 0
     quiz_total_count = len(likely)  # Only count matched conditions that need quizzes
     all_detailed_done = quiz_total_count > 0 and quiz_completed_count == quiz_total_count
 
-    return render(request, 'bloodapp/health_concerns.html', {
+    return await arender(request, 'bloodapp/health_concerns.html', {
         'ai_result': {**health_concerns_result.analysis_data, 'likely_conditions': likely, 'other_conditions': other_conditions},
         'quiz_completed_count': quiz_completed_count,
         'quiz_total_count': quiz_total_count,
         'all_detailed_done': all_detailed_done,
     })
 
+# Predefined supplement list (example, replace with your real list)
+DEFAULT_SUPPLEMENT_LIST = [
+    {'name': 'Vitamin D3', 'link': 'https://example.com/vitamin-d3'},
+    {'name': 'Iron Bisglycinate', 'link': 'https://example.com/iron-bisglycinate'},
+    {'name': 'Magnesium Glycinate', 'link': 'https://example.com/magnesium-glycinate'},
+    {'name': 'Omega-3 Fish Oil', 'link': 'https://example.com/omega-3'},
+]
+
+def build_treatment_plan_inputs(health_concerns_result):
+    """Return (likely_conditions, detailed_analyses, other_conditions) for the treatment plan LLM call."""
+    likely_conditions = health_concerns_result.analysis_data.get('likely_conditions', [])
+    other_conditions = health_concerns_result.analysis_data.get('other_conditions', [])
+
+    # Build detailed analyses payload from completed quizzes
+    detailed_analyses = []
+    for cond in likely_conditions:
+        if cond.get('detailed_analysis') and cond.get('risk_score') is not None:
+            detailed_analyses.append({
+                'condition_id': cond.get('condition_id'),
+                'risk_score': cond.get('risk_score'),
+                'detailed_explanation': cond.get('detailed_explanation')
+            })
+    return likely_conditions, detailed_analyses, other_conditions
+
+def normalize_treatment_plan(plan_dict):
+    """Normalize LLM plan keys to match template expectations (also works on a partially streamed plan)."""
+    if not isinstance(plan_dict, dict):
+        return {'error': 'Invalid plan format'}
+    # If already normalized, return as-is
+    if any(k in plan_dict for k in ['lifestyle_recommendations', 'supplement_recommendations', 'dietary_recommendations']):
+        return plan_dict
+    normalized = {
+        'lifestyle_recommendations': [],
+        'supplement_recommendations': [],
+        'dietary_recommendations': [],
+        'follow_up_recommendations': plan_dict.get('Follow-up Recommendations') or plan_dict.get('follow_up_recommendations') or [],
+        'summary': plan_dict.get('Summary') or plan_dict.get('summary')
+    }
+    # Lifestyle
+    lifestyle_list = plan_dict.get('Lifestyle changes') or plan_dict.get('Lifestyle') or []
+    for item in lifestyle_list or []:
+        if isinstance(item, dict):
+            normalized['lifestyle_recommendations'].append(item)
+        else:
+            normalized['lifestyle_recommendations'].append({'title': None, 'description': str(item)})
+    # Diet/Nutrition
+    nutrition_list = plan_dict.get('Nutrition') or plan_dict.get('Dietary') or []
+    for item in nutrition_list or []:
+        if isinstance(item, dict):
+            normalized['dietary_recommendations'].append(item)
+        else:
+            normalized['dietary_recommendations'].append({'title': None, 'description': str(item)})
+    # Supplements
+    supplements_list = plan_dict.get('Supplements') or []
+    for supp in supplements_list:
+        if isinstance(supp, dict):
+            normalized['supplement_recommendations'].append(supp)
+        else:
+            normalized['supplement_recommendations'].append({'name': str(supp)})
+    return normalized
+
+def save_treatment_plan(user, profile, plan_json, likely_conditions, input_hash=None, incomplete=False):
+    """Persist the treatment plan stage result and mark the flow completed.
+
+    An incomplete plan (the LLM call failed, possibly after some sections) is
+    kept for display but never counts as current, so the next visit regenerates it.
+    """
+    ai_result_data = {
+        'treatment_plan': plan_json,
+        'likely_conditions': likely_conditions,
+        'input_hash': input_hash,
+    }
+    if incomplete:
+        ai_result_data['incomplete'] = True
+    result = save_ai_result(user, 'treatment_plans', ai_result_data)
+
+    # Update user's stage
+    profile.current_stage = 'completed'
+    profile.save()
+    return result
+
+async def asave_treatment_plan(user, profile, plan_json, likely_conditions, input_hash=None, incomplete=False):
+    """Async variant of save_treatment_plan."""
+    ai_result_data = {
+        'treatment_plan': plan_json,
+        'likely_conditions': likely_conditions,
+        'input_hash': input_hash,
+    }
+    if incomplete:
+        ai_result_data['incomplete'] = True
+    result = await asave_ai_result(user, 'treatment_plans', ai_result_data)
+    profile.current_stage = 'completed'
+    await profile.asave()
+    return result
+
 @login_required
-def treatment_plans_view(request):
+async def treatment_plans_view(request):
     """Stage 3: View AI-generated treatment plans"""
-    profile, created = PatientProfile.objects.get_or_create(user=request.user)
+    user = await request.auser()
+    profile, created = await PatientProfile.objects.aget_or_create(user=user)
     
     # Check if user can access this stage
     if profile.current_stage in ['patient_info', 'health_concerns']:
         return redirect('health_concerns')
     
     # Get saved health concerns
-    health_concerns_result = get_ai_result(request.user, 'health_concerns')
+    health_concerns_result = await aget_ai_result(user, 'health_concerns')
     if not health_concerns_result:
         return redirect('health_concerns')
     
-    # Check if we already have treatment plans
-    treatment_plans_result = get_ai_result(request.user, 'treatment_plans')
+    # Reuse the treatment plan if it was generated from the current panel
+    input_hash = health_concerns_result.analysis_data.get('input_hash')
+    treatment_plans_result = await aget_ai_result(user, 'treatment_plans')
     
-    if not treatment_plans_result:
+    if not stage_result_is_current(treatment_plans_result, input_hash):
+        if getattr(settings, 'TREATMENT_PLAN_STREAMING', False):
+            # Render the page shell right away; sections arrive from treatment_plans_stream
+            return await arender(request, 'bloodapp/treatment_plans.html', {
+                'ai_result': {},
+                'stream_url': reverse('treatment_plans_stream'),
+            })
+
         # Generate treatment plans using AI based on detailed quiz outputs
-        likely_conditions = health_concerns_result.analysis_data.get('likely_conditions', [])
-        other_conditions = health_concerns_result.analysis_data.get('other_conditions', [])
-
-        # Build detailed analyses payload from completed quizzes
-        detailed_analyses = []
-        for cond in likely_conditions:
-            if cond.get('detailed_analysis') and cond.get('risk_score') is not None:
-                detailed_analyses.append({
-                    'condition_id': cond.get('condition_id'),
-                    'risk_score': cond.get('risk_score'),
-                    'detailed_explanation': cond.get('detailed_explanation')
-                })
-
-        # Predefined supplement list (example, replace with your real list)
-        supplement_list = [
-            {'name': 'Vitamin D3', 'link': 'https://example.com/vitamin-d3'},
-            {'name': 'Iron Bisglycinate', 'link': 'https://example.com/iron-bisglycinate'},
-            {'name': 'Magnesium Glycinate', 'link': 'https://example.com/magnesium-glycinate'},
-            {'name': 'Omega-3 Fish Oil', 'link': 'https://example.com/omega-3'},
-        ]
-
-        from .utils import get_treatment_plan
+        likely_conditions, detailed_analyses, other_conditions = build_treatment_plan_inputs(health_concerns_result)
+
+        from .ai_analysis import aget_treatment_plan
+        await arelease_db_connections()
         try:
-            raw_plan = get_treatment_plan(detailed_analyses, supplement_list, other_conditions)
+            with llm_usage_context(user.pk, 'treatment_plan'):
+                raw_plan = await aget_treatment_plan(detailed_analyses, DEFAULT_SUPPLEMENT_LIST, other_conditions)
         except Exception as e:
+            logger.exception('Treatment plan generation failed for user %s', user.pk)
             raw_plan = {'error': str(e)}
 
-        # Normalize LLM plan keys to match template expectations
-        def normalize_plan(plan_dict):
-            if not isinstance(plan_dict, dict):
-                return {'error': 'Invalid plan format'}
-            # If already normalized, return as-is
-            if any(k in plan_dict for k in ['lifestyle_recommendations', 'supplement_recommendations', 'dietary_recommendations']):
-                return plan_dict
-            normalized = {
-                'lifestyle_recommendations': [],
-                'supplement_recommendations': [],
-                'dietary_recommendations': [],
-                'follow_up_recommendations': plan_dict.get('Follow-up Recommendations') or plan_dict.get('follow_up_recommendations') or [],
-                'summary': plan_dict.get('Summary') or plan_dict.get('summary')
-            }
-            # Lifestyle
-            lifestyle_list = plan_dict.get('Lifestyle changes') or plan_dict.get('Lifestyle') or []
-            for item in lifestyle_list or []:
-                if isinstance(item, dict):
-                    normalized['lifestyle_recommendations'].append(item)
-                else:
-                    normalized['lifestyle_recommendations'].append({'title': None, 'description': str(item)})
-            # Diet/Nutrition
-            nutrition_list = plan_dict.get('Nutrition') or plan_dict.get('Dietary') or []
-            for item in nutrition_list or []:
-                if isinstance(item, dict):
-                    normalized['dietary_recommendations'].append(item)
-                else:
-                    normalized['dietary_recommendations'].append({'title': None, 'description': str(item)})
-            # Supplements
-            supplements_list = plan_dict.get('Supplements') or []
-            for supp in supplements_list:
-                if isinstance(supp, dict):
-                    normalized['supplement_recommendations'].append(supp)
-                else:
-                    normalized['supplement_recommendations'].append({'name': str(supp)})
-            return normalized
+        plan_json = normalize_treatment_plan(raw_plan)
+        treatment_plans_result = await asave_treatment_plan(
+            user, profile, plan_json, likely_conditions, input_hash, incomplete='error' in raw_plan)
+    
+    return await arender(request, 'bloodapp/treatment_plans.html', {
+        'ai_result': treatment_plans_result.analysis_data
+    })
 
-        plan_json = normalize_plan(raw_plan)
+def _plan_event(payload):
+    return json.dumps(payload) + "\n"
 
-        # Save AI analysis result to database
-        ai_result_data = {
-            'treatment_plan': plan_json,
-            'likely_conditions': likely_conditions
-        }
-        save_ai_result(request.user, 'treatment_plans', ai_result_data)
+def _treatment_plan_events(request, user, profile, health_concerns_result):
+    """NDJSON events of treatment_plans_stream for WSGI: a sync generator over the blocking LLM stream."""
+    input_hash = health_concerns_result.analysis_data.get('input_hash')
 
-        # Update user's stage
-        profile.current_stage = 'completed'
-        profile.save()
+    def render_sections(plan_json, incomplete=False):
+        return render_to_string('bloodapp/treatment_plan_sections.html',
+                                {'plan': plan_json, 'incomplete': incomplete}, request=request)
 
-        treatment_plans_result = get_ai_result(request.user, 'treatment_plans')
-    
-    return render(request, 'bloodapp/treatment_plans.html', {
-        'ai_result': treatment_plans_result.analysis_data
-    })
+    existing = get_ai_result(user, 'treatment_plans')
+    if stage_result_is_current(existing, input_hash):
+        yield _plan_event({'done': True, 'html': render_sections(existing.analysis_data.get('treatment_plan') or {})})
+        return
+
+    likely_conditions, detailed_analyses, other_conditions = build_treatment_plan_inputs(health_concerns_result)
+
+    from .ai_analysis import stream_treatment_plan
+    raw_plan = {}
+    # Set per section: the context must not stay entered while the generator is suspended at a yield
+    sections = stream_treatment_plan(detailed_analyses, DEFAULT_SUPPLEMENT_LIST, other_conditions)
+    try:
+        while True:
+            with llm_usage_context(user.pk, 'treatment_plan'):
+                item = next(sections, None)
+            if item is None:
+                break
+            section, value = item
+            raw_plan[section] = value
+            yield _plan_event({'section': section, 'html': render_sections(normalize_treatment_plan(raw_plan))})
+        failed = False
+    except Exception:
+        logger.exception('Treatment plan stream failed for user %s after %d section(s)', user.pk, len(raw_plan))
+        failed = True
+
+    # A failed stream keeps the sections that arrived, marked incomplete so the next visit regenerates it
+    plan_json = normalize_treatment_plan(raw_plan)
+    save_treatment_plan(user, profile, plan_json, likely_conditions, input_hash, incomplete=failed)
+    yield _plan_event({'done': True, 'incomplete': failed, 'html': render_sections(plan_json, failed)})
+
+async def _atreatment_plan_events(request, user, profile, health_concerns_result):
+    """NDJSON events of treatment_plans_stream for ASGI: an async generator over the async LLM stream."""
+    input_hash = health_concerns_result.analysis_data.get('input_hash')
+    # Context processors and the lazy request.user are sync-only
+    arender_sections = sync_to_async(lambda plan_json, incomplete=False: render_to_string(
+        'bloodapp/treatment_plan_sections.html', {'plan': plan_json, 'incomplete': incomplete}, request=request))
+
+    existing = await aget_ai_result(user, 'treatment_plans')
+    if stage_result_is_current(existing, input_hash):
+        yield _plan_event({'done': True, 'html': await arender_sections(existing.analysis_data.get('treatment_plan') or {})})
+        return
+
+    likely_conditions, detailed_analyses, other_conditions = build_treatment_plan_inputs(health_concerns_result)
+
+    from .ai_analysis import astream_treatment_plan
+    await arelease_db_connections()
+    raw_plan = {}
+    sections = astream_treatment_plan(detailed_analyses, DEFAULT_SUPPLEMENT_LIST, other_conditions)
+    try:
+        while True:
+            with llm_usage_context(user.pk, 'treatment_plan'):
+                item = await anext(sections, None)
+            if item is None:
+                break
+            section, value = item
+            raw_plan[section] = value
+            yield _plan_event({'section': section, 'html': await arender_sections(normalize_treatment_plan(raw_plan))})
+        failed = False
+    except Exception:
+        logger.exception('Treatment plan stream failed for user %s after %d section(s)', user.pk, len(raw_plan))
+        failed = True
+
+    plan_json = normalize_treatment_plan(raw_plan)
+    await asave_treatment_plan(user, profile, plan_json, likely_conditions, input_hash, incomplete=failed)
+    yield _plan_event({'done': True, 'incomplete': failed, 'html': await arender_sections(plan_json, failed)})
+
+@login_required
+async def treatment_plans_stream(request):
+    """
+    Stream the treatment plan as newline-delimited JSON events.
+
+    Each event carries the re-rendered plan sections received so far, so the page
+    can show Nutrition/Lifestyle/Supplements as soon as each one is generated.
+    The last event has ``done: true``; the full plan is saved before it is sent.
+    If the LLM stream fails, the sections received so far are saved as an
+    incomplete plan (regenerated on the next visit) and the last event has
+    ``incomplete: true``.
+
+    Django drains an async iterator into a list before serving it over WSGI (and
+    a sync one over ASGI), so each server gets the generator it can stream: the
+    async LLM stream under ASGI, the blocking one under WSGI.
+    """
+    user = await request.auser()
+    profile, created = await PatientProfile.objects.aget_or_create(user=user)
+    if profile.current_stage in ['patient_info', 'health_concerns']:
+        return JsonResponse({'error': 'Health concerns are not complete yet'}, status=409)
+
+    health_concerns_result = await aget_ai_result(user, 'health_concerns')
+    if not health_concerns_result:
+        return JsonResponse({'error': 'Health concerns are not complete yet'}, status=409)
+
+    if isinstance(request, ASGIRequest):
+        events = _atreatment_plan_events(request, user, profile, health_concerns_result)
+    else:
+        events = _treatment_plan_events(request, user, profile, health_concerns_result)
+    response = StreamingHttpResponse(events, content_type='application/x-ndjson')
+    response['Cache-Control'] = 'no-cache'
+    # Ask proxies (nginx, Cloud Run front ends) not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 @login_required
 def completed_view(request):
@@ -409,19 +665,41 @@ def completed_view(request):
     })
 
 
-@login_required
-def report_view(request):
-    """Printable, detailed professional blood chemistry report."""
-    profile, _ = PatientProfile.objects.get_or_create(user=request.user)
+def _report_state(request):
+    """(etag, last_modified) of the report for the current user, or (None, None) before patient info exists.
 
-    # Fetch required analyses; if missing, redirect to start
-    patient_info_result = get_ai_result(request.user, 'patient_info')
-    health_concerns_result = get_ai_result(request.user, 'health_concerns')
-    treatment_plans_result = get_ai_result(request.user, 'treatment_plans')
-    if not patient_info_result:
-        return redirect('patient_info')
+    One query over the user's stage rows: the report only changes when one of them
+    is saved (updated_at), the catalog version changes, or the header/nav data
+    (name, current stage) does.
+    """
+    state = getattr(request, '_report_state', None)
+    if state is not None:
+        return state
+    state = (None, None)
+    if request.user.is_authenticated:
+        rows = sorted(AIAnalysisResult.objects.filter(user=request.user).values_list(
+            'stage', 'id', 'updated_at', 'user__patientprofile__current_stage'))
+        if any(stage == 'patient_info' for stage, _, _, _ in rows):
+            payload = json.dumps({
+                'user': [request.user.pk, request.user.username, request.user.get_full_name()],
+                'current_stage': rows[0][3],
+                'results': [[stage, pk, updated_at.isoformat()] for stage, pk, updated_at, _ in rows],
+                'catalog_version': get_catalog_version(),
+            })
+            etag = hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+            state = (etag, max(updated_at for _, _, updated_at, _ in rows))
+    request._report_state = state
+    return state
 
-    patient_name = (request.user.get_full_name() or '').strip() or request.user.username
+def _report_etag(request):
+    return _report_state(request)[0]
+
+def _report_last_modified(request):
+    return _report_state(request)[1]
+
+def build_report_context(user, patient_info_result, health_concerns_result, treatment_plans_result):
+    """Template context of the printable report, from the user's stored stage results."""
+    patient_name = (user.get_full_name() or '').strip() or user.username
     analysis_date = patient_info_result.created_at
 
     patient_values = patient_info_result.analysis_data.get('patient_values', {})
@@ -511,6 +789,7 @@ def report_view(request):
             'display_name': m.display_name,
             'background': m.background,
             'units': units,
+            'unit_system': unit_sys,
             'normal_min': normal_min,
             'normal_max': normal_max,
             'optimal_min': optimal_min,
@@ -550,17 +829,14 @@ def report_view(request):
                 likely_conditions = json.loads(likely_conditions)
             except Exception:
                 likely_conditions = []
+        cond_ids = [c.get('condition_id') or c.get('name') or c.get('display_name') for c in likely_conditions]
+        backgrounds = dict(HealthCondition.objects.filter(
+            condition_id__in=[cid for cid in cond_ids if cid]).values_list('condition_id', 'background'))
         for c in likely_conditions:
             cond_id = c.get('condition_id') or c.get('name') or c.get('display_name')
             display = c.get('display_name') or c.get('name') or cond_id or 'Health Condition'
             risk = c.get('risk_score')
-            background = ''
-            if cond_id:
-                try:
-                    hc = HealthCondition.objects.get(condition_id=cond_id)
-                    background = hc.background or ''
-                except HealthCondition.DoesNotExist:
-                    background = ''
+            background = backgrounds.get(cond_id) or ''
             # Color by risk
             risk_val = None
             try:
@@ -591,7 +867,7 @@ def report_view(request):
     # Treatment plan
     plan_ctx = treatment_plans_result.analysis_data.get('treatment_plan') if treatment_plans_result else None
 
-    return render(request, 'bloodapp/report.html', {
+    return {
         'patient_name': patient_name,
         'analysis_date': analysis_date,
         'markers': analyzed_markers,
@@ -601,18 +877,89 @@ def report_view(request):
         'highlights': highlights,
         'conditions': conditions_ctx,
         'plan': plan_ctx,
-    })
+    }
+
+
+def get_report_context(request):
+    """Report context for the current user, cached per report version; None before patient info exists."""
+    etag, _ = _report_state(request)
+    cache_key = f'{request.user.pk}:{etag}'
+    context = report_cache.get(cache_key) if etag else None
+    if context is None:
+        PatientProfile.objects.get_or_create(user=request.user)
+
+        # Fetch required analyses; if missing, there is no report yet
+        patient_info_result = get_ai_result(request.user, 'patient_info')
+        health_concerns_result = get_ai_result(request.user, 'health_concerns')
+        treatment_plans_result = get_ai_result(request.user, 'treatment_plans')
+        if not patient_info_result:
+            return None
+
+        context = build_report_context(request.user, patient_info_result, health_concerns_result,
+                                       treatment_plans_result)
+        if etag:
+            report_cache.set(cache_key, context)
+    return context
+
+
+@login_required
+@condition(etag_func=_report_etag, last_modified_func=_report_last_modified)
+def report_view(request):
+    """Printable, detailed professional blood chemistry report.
+
+    The context is cached per report version (see _report_state), and the page
+    carries an ETag so a browser re-opening an unchanged report gets a 304.
+    """
+    context = get_report_context(request)
+    if context is None:
+        return redirect('patient_info')
+
+    response = render(request, 'bloodapp/report.html', context)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@login_required
+def report_pdf_view(request):
+    """The report as a PDF download.
+
+    Rendering happens on the report_pdf worker pool; until the PDF exists this
+    answers 202 with a Retry-After, and the same URL serves the file once ready.
+    """
+    context = get_report_context(request)
+    if context is None:
+        return JsonResponse({'error': 'No report available yet'}, status=404)
+
+    status, path, error = request_report_pdf(context)
+    if status == 'error':
+        return JsonResponse({'status': 'error', 'error': error}, status=500)
+    if status == 'ready':
+        try:
+            pdf_file = open(path, 'rb')
+        except FileNotFoundError:
+            # Pruned between the check and the open: queue it again
+            status, path, error = request_report_pdf(context)
+            status = 'pending'
+    if status == 'pending':
+        response = JsonResponse({'status': 'pending'}, status=202)
+        response['Retry-After'] = '1'
+        return response
+
+    analysis_date = context.get('analysis_date')
+    filename = f"blood-report-{analysis_date:%Y-%m-%d}.pdf" if analysis_date else 'blood-report.pdf'
+    response = FileResponse(pdf_file, as_attachment=True, filename=filename, content_type='application/pdf')
+    patch_cache_control(response, private=True, max_age=0)
+    return response
 
 
 def quiz_condition(request, condition_name):
-    try:
-        condition = HealthCondition.objects.get(condition_id=condition_name)
-    except HealthCondition.DoesNotExist:
+    if not request.user.is_authenticated:
+        return HttpResponse("Unauthorized", status=401)
+    condition = get_health_condition(condition_name)
+    if condition is None:
         return HttpResponse("Condition not found", status=404)
 
     # Fetch saved patient inputs from DB
-    if not request.user.is_authenticated:
-        return HttpResponse("Unauthorized", status=401)
     patient_info_ai = get_ai_result(request.user, 'patient_info')
     if not patient_info_ai:
         return HttpResponse("Missing patient info. Please start over.", status=400)
@@ -620,13 +967,14 @@ def quiz_condition(request, condition_name):
     unit_systems = patient_info_ai.analysis_data.get('unit_systems', {})
 
     if request.method == 'POST':
-        # Build structured responses from POST if any
+        # Build structured responses from POST if any (fields are keyed by symptom ID)
+        symptom_text = {s['id']: s['text'] for s in condition.symptoms}
         symptom_answers = {}
         for key, val in request.POST.items():
             if key.endswith('_answer'):
                 symptom = key[:-7]
                 info = request.POST.get(f"{symptom}_info", "").strip()
-                symptom_answers[symptom] = {"answer": val, "info": info}
+                symptom_answers[symptom_text.get(symptom, symptom)] = {"answer": val, "info": info}
 
         # Persist the raw answers temporarily on the task for reproducibility
         task = RiskComputationTask.objects.create(
@@ -638,17 +986,6 @@ def quiz_condition(request, condition_name):
             }
         )
 
-        # Mark this condition as in-progress in session (non-blocking for others)
-        try:
-            at_risk_conditions = request.session.get('at_risk_conditions', [])
-            for cond in at_risk_conditions:
-                if cond.get('condition_id') == condition.condition_id:
-                    cond['in_progress'] = True
-            request.session['at_risk_conditions'] = at_risk_conditions
-            request.session.modified = True
-        except Exception:
-            pass
-
         # Mark in DB health concerns result as in-progress for this condition
         try:
             health_ai = get_ai_result(request.user, 'health_concerns')
@@ -665,9 +1002,6 @@ def quiz_condition(request, condition_name):
 
         return redirect('quiz_condition', condition_name=condition.condition_id)
 
-    # Parse signs and symptoms into individual bullet points
-    symptoms_list = parse_signs_and_symptoms(condition.signs_and_symptoms)
-
     # Load any existing detailed analysis for this condition (to show saved results)
     existing_detail = None
     health_ai = get_ai_result(request.user, 'health_concerns')
@@ -682,7 +1016,7 @@ def quiz_condition(request, condition_name):
 
     return render(request, 'bloodapp/quiz.html', {
         'condition': condition,
-        'symptoms': symptoms_list,
+        'symptoms': condition.symptoms,
         'existing_detail': existing_detail,
     })
 
@@ -710,6 +1044,8 @@ def api_start_risk_task(request, condition_id):
     user_id = request.user.id
 
     def _compute():
+        started = time.perf_counter()
+        status = 'error'
         try:
             # Re-fetch objects inside thread
             t = RiskComputationTask.objects.get(id=task.id)
@@ -721,7 +1057,8 @@ def api_start_risk_task(request, condition_id):
             patient_values = patient_info_ai.analysis_data.get('patient_values', {}) if patient_info_ai else {}
             unit_systems = patient_info_ai.analysis_data.get('unit_systems', {}) if patient_info_ai else {}
 
-            from .utils import build_condition_marker_context, get_risk_score_for_condition
+            from .condition_markers import build_condition_marker_context
+            from .ai_analysis import get_risk_score_for_condition
             patient_markers_analysis = build_condition_marker_context(
                 condition=cond,
                 patient_values_by_name=patient_values,
@@ -743,12 +1080,14 @@ def api_start_risk_task(request, condition_id):
                 f"Relevant markers context (associated high/low, background, discussion, and patient vs ranges):\n{patient_markers_analysis}\n"
                 "Return JSON like: {'risk_score': 55, 'explanation': '...'}"
             )
-            risk_json = get_risk_score_for_condition(prompt, condition_name=cond.condition_id)
+            with llm_usage_context(user_id, 'risk_task'):
+                risk_json = get_risk_score_for_condition(prompt, condition_name=cond.condition_id)
 
             # Save result on task
             t.result = {'risk_score': risk_json.get('risk_score'), 'explanation': risk_json.get('explanation')}
             t.status = 'done'
             t.save()
+            status = 'done'
 
             # Update DB saved health concerns result (clear in_progress and set final values)
             health_ai = get_ai_result(user, 'health_concerns')
@@ -785,6 +1124,10 @@ def api_start_risk_task(request, condition_id):
                 t.save()
             except Exception:
                 pass
+        finally:
+            RISK_TASK_SECONDS.observe(time.perf_counter() - started, status=status)
+            # Not a request thread: nothing else would close (or return to the pool) its connections
+            close_thread_connections()
 
     threading.Thread(target=_compute, daemon=True).start()
 
@@ -865,7 +1208,12 @@ def demo_signup_view(request):
 
 def treatment_plan_view(request):
     # Only allow if all at-risk conditions have detailed_analysis True
-    at_risk_conditions = request.session.get('at_risk_conditions', [])
+    at_risk_ids = set(request.session.get(AT_RISK_SESSION_KEY, []))
+    health_ai = get_ai_result(request.user, 'health_concerns') if request.user.is_authenticated else None
+    at_risk_conditions = [
+        c for c in (health_ai.analysis_data.get('likely_conditions', []) if health_ai else [])
+        if c.get('condition_id') in at_risk_ids
+    ]
     if not at_risk_conditions or not all(c.get('detailed_analysis') for c in at_risk_conditions):
         return redirect('home')
 
@@ -879,42 +1227,73 @@ def treatment_plan_view(request):
         for c in at_risk_conditions
     ]
 
-    # Predefined supplement list (example, replace with your real list)
-    supplement_list = [
-        {'name': 'Vitamin D3', 'link': 'https://example.com/vitamin-d3'},
-        {'name': 'Iron Bisglycinate', 'link': 'https://example.com/iron-bisglycinate'},
-        {'name': 'Magnesium Glycinate', 'link': 'https://example.com/magnesium-glycinate'},
-        {'name': 'Omega-3 Fish Oil', 'link': 'https://example.com/omega-3'},
-    ]
-
-    from .utils import get_treatment_plan
+    from .ai_analysis import get_treatment_plan
     try:
-        plan_json = get_treatment_plan(detailed_analyses, supplement_list)
+        with llm_usage_context(request.user.pk, 'treatment_plan'):
+            plan_json = get_treatment_plan(detailed_analyses, DEFAULT_SUPPLEMENT_LIST)
     except Exception as e:
         return HttpResponse(f"Error generating treatment plan: {e}", status=500)
 
-    # Store in session for possible re-display
-    request.session['treatment_plan'] = plan_json
     return render(request, 'bloodapp/treatment_plan.html', {'plan': plan_json})
 
 
+@staff_member_required
+def db_connection_stats(request):
+    """Connection churn counters and pool statistics of the process serving this request."""
+    return JsonResponse(connection_stats())
+
+
+@staff_member_required
+def cache_stats_view(request):
+    """Per-namespace two-tier cache hit ratios of the process serving this request."""
+    return JsonResponse({'backend': settings.CACHES['default']['BACKEND'], 'namespaces': cache_stats()})
+
+
+@staff_member_required
+def profile_summary_view(request):
+    """Rolling percentiles of profiled requests per view in the serving process; POST resets them."""
+    if request.method == 'POST':
+        reset_profile_summary()
+    return JsonResponse({
+        'sample_rate': settings.PROFILING_SAMPLE_RATE,
+        'header': settings.PROFILING_HEADER or None,
+        'views': profile_summary(),
+    })
+
+def metrics_view(request):
+    """Prometheus text exposition of the app metrics; needs the METRICS_TOKEN bearer token, or staff when unset."""
+    token = settings.METRICS_TOKEN
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    elif not (request.user.is_active and request.user.is_staff):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def healthz(request):
+    """Liveness probe: the process is up and serving; no database or cache access."""
+    return JsonResponse(liveness())
+
+
+def readyz(request):
+    """Readiness probe: the last background dependency check (bloodapp.health); 503 until ready."""
+    status = readiness()
+    return JsonResponse(status, status=200 if status['ready'] else 503)
+
+
 @csrf_exempt
 def health_check(request):
-    """Health check endpoint for Cloud Run"""
-    try:
-        # Check database connection
-        from django.db import connection
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT 1")
-        
+    """Health check endpoint for Cloud Run: healthy while the database answers (see bloodapp.health.database_health)"""
+    database = database_health()
+    if database['ok']:
         return JsonResponse({
             'status': 'healthy',
             'database': 'connected',
             'timestamp': time.time()
         })
-    except Exception as e:
-        return JsonResponse({
-            'status': 'unhealthy',
-            'error': str(e),
-            'timestamp': time.time()
-        }, status=500)
+    return JsonResponse({
+        'status': 'unhealthy',
+        'error': database.get('error', ''),
+        'timestamp': time.time()
+    }, status=500)
@@ -14,3 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bloodproject.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, 'TEMPLATE_PREWARM', False):
+    # Same as wsgi.py: compile templates once, before gunicorn forks the workers
+    from bloodapp.template_warmup import prewarm_templates  # noqa: E402
+
+    prewarm_templates()
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,6 +45,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'bloodapp.metrics.MetricsMiddleware',
+    'bloodapp.profiling.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -54,7 +59,9 @@ ROOT_URLCONF = 'bloodproject.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that reports render time to bloodapp.profiling
+        'BACKEND': 'bloodapp.profiling.ProfiledDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -62,6 +69,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'bloodapp.context_processors.catalog',
             ],
         },
     },
@@ -69,6 +77,49 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'bloodproject.wsgi.application'
 
+# Per-request profiling (bloodapp.profiling): requests sending PROFILING_HEADER
+# ("X-Profile: 1"; empty disables the header) or drawn at PROFILING_SAMPLE_RATE
+# are logged with their DB/LLM/PDF/template time; the last PROFILING_WINDOW
+# records per view feed the percentiles at /ops/profile/.
+PROFILING_HEADER = os.environ.get('PROFILING_HEADER', 'X-Profile')
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_WINDOW = int(os.environ.get('PROFILING_WINDOW', '500'))
+
+# /metrics (bloodapp.metrics): each gunicorn worker writes its metrics to
+# METRICS_DIR every METRICS_FLUSH_INTERVAL seconds and a scrape sums them;
+# unset, a scrape only covers the worker serving it. Scrapers authenticate
+# with "Authorization: Bearer <METRICS_TOKEN>"; without a token only staff
+# sessions may read the endpoint.
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '5'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# LLM usage accounting (bloodapp.llm_usage): rows are buffered and written in
+# bulk every LLM_USAGE_FLUSH_INTERVAL seconds or LLM_USAGE_BATCH_SIZE rows.
+# LLM_PRICES (USD per million prompt / completion tokens) prices the
+# llm_usage_report command's cost column.
+LLM_USAGE_FLUSH_INTERVAL = float(os.environ.get('LLM_USAGE_FLUSH_INTERVAL', '5'))
+LLM_USAGE_BATCH_SIZE = int(os.environ.get('LLM_USAGE_BATCH_SIZE', '100'))
+LLM_USAGE_MAX_BUFFER = 10000
+LLM_PRICES = {
+    'gpt-4o-mini': (0.15, 0.60),
+}
+
+# Probes (bloodapp.health): /healthz answers without I/O; /readyz serves the
+# dependency checks a background thread refreshes every
+# READINESS_REFRESH_INTERVAL seconds, and reports not ready once that result
+# is older than READINESS_TTL. Gunicorn workers wait up to
+# READINESS_STARTUP_WAIT seconds for the first result before serving. Running
+# risk tasks older than RISK_TASK_STUCK_SECONDS are reported as stuck.
+READINESS_REFRESH_INTERVAL = float(os.environ.get('READINESS_REFRESH_INTERVAL', '5'))
+READINESS_TTL = float(os.environ.get('READINESS_TTL', '30'))
+READINESS_STARTUP_WAIT = float(os.environ.get('READINESS_STARTUP_WAIT', '10'))
+RISK_TASK_STUCK_SECONDS = 600
+
+# Compile all bloodapp templates when the WSGI app loads instead of on first use
+# (bloodapp.template_warmup); enabled in settings_production.
+TEMPLATE_PREWARM = os.environ.get('TEMPLATE_PREWARM', 'False').lower() == 'true'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -85,6 +136,41 @@ DATABASES = {
 }
 
 
+def configure_db_connections(database):
+    """
+    Connection reuse for a DATABASES entry, from the environment.
+
+    - DB_POOL=true: psycopg 3 connection pool per process (DB_POOL_MIN_SIZE,
+      DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT); connections go back to the pool when
+      Django closes them. Recommended under ASGI.
+    - otherwise persistent connections kept DB_CONN_MAX_AGE seconds (default
+      60, or 0 under ASGI where Django advises against them).
+    - DB_PGBOUNCER=true: a transaction-pooling PgBouncer sits in front of
+      PostgreSQL, which can't keep server-side cursors between transactions.
+
+    CONN_HEALTH_CHECKS makes Django ping a reused connection before handing it
+    to a request, so a connection dropped by the server is replaced instead of
+    failing the request.
+    """
+    asgi = os.environ.get('GUNICORN_MODE') == 'uvicorn' or os.environ.get('ASGI', 'false').lower() == 'true'
+    database['CONN_HEALTH_CHECKS'] = True
+    if os.environ.get('DB_POOL', 'false').lower() == 'true':
+        database['CONN_MAX_AGE'] = 0  # Django requires it with a pool; the pool keeps the connections
+        database.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+        }
+    else:
+        database['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', '0' if asgi else '60'))
+    if os.environ.get('DB_PGBOUNCER', 'false').lower() == 'true':
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+    return database
+
+
+configure_db_connections(DATABASES['default'])
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -125,3 +211,90 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Stream the treatment plan to the page section by section instead of blocking
+# the request until the whole LLM completion has arrived.
+TREATMENT_PLAN_STREAMING = True
+
+# LLM backend: 'openai' (default) or 'fake', the offline stand-in in bloodapp.llm_fake
+# used for load and regression tests. LLM_BASE_URL points the OpenAI SDK at any
+# OpenAI-compatible server, e.g. `python manage.py run_llm_stub`.
+LLM_BACKEND = os.environ.get('LLM_BACKEND', 'openai')
+LLM_BASE_URL = os.environ.get('OPENAI_BASE_URL') or None
+LLM_FAKE = {
+    'LATENCY_MS': float(os.environ.get('LLM_FAKE_LATENCY_MS', '0')),
+    'LATENCY_JITTER_MS': float(os.environ.get('LLM_FAKE_JITTER_MS', '0')),
+    'ERROR_RATE': float(os.environ.get('LLM_FAKE_ERROR_RATE', '0')),
+    'MALFORMED_RATE': float(os.environ.get('LLM_FAKE_MALFORMED_RATE', '0')),
+}
+
+# Seconds each process trusts its cached catalog version (bloodapp.catalog) before
+# re-reading it; catalog-derived structures rebuild at most this long after an import.
+CATALOG_VERSION_TTL = 5
+
+# Conditions ranked by the local marker-association pre-screen (bloodapp.screening)
+# that the LLM is asked to refine; 0 sends the whole catalog to the LLM instead.
+HEALTH_SCREENING_TOP_K = 8
+
+# Seconds a built report context stays in the cache; entries are keyed by the
+# report version, so a saved stage result or catalog change never serves stale data.
+REPORT_CACHE_TIMEOUT = 3600
+
+# Server-side PDF export (bloodapp.report_pdf): rendered PDFs are stored here by
+# content hash, and rendered by this many background worker threads per process.
+REPORT_PDF_DIR = os.environ.get('REPORT_PDF_DIR', str(BASE_DIR / 'report_pdfs'))
+REPORT_PDF_WORKERS = int(os.environ.get('REPORT_PDF_WORKERS', '2'))
+# They are patient health data: each is deleted REPORT_PDF_MAX_AGE seconds after
+# it was rendered, and at most REPORT_PDF_MAX_FILES are kept (oldest deleted
+# first). The render pool prunes at most every REPORT_PDF_PRUNE_INTERVAL seconds.
+REPORT_PDF_MAX_AGE = int(os.environ.get('REPORT_PDF_MAX_AGE', '86400'))
+REPORT_PDF_MAX_FILES = int(os.environ.get('REPORT_PDF_MAX_FILES', '1000'))
+REPORT_PDF_PRUNE_INTERVAL = 600
+
+# The default cache is the shared tier behind bloodapp.cache's per-process LRU
+# (SHARED_CACHE): 'locmem' (default; per process, the stand-in for development
+# and tests), 'file' (a directory every worker on the host shares,
+# SHARED_CACHE_LOCATION) or 'redis' (SHARED_CACHE_LOCATION=redis://host:6379/0).
+SHARED_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'shared'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / 'cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://localhost:6379/0'),
+}
+SHARED_CACHE = os.environ.get('SHARED_CACHE', 'locmem')
+_shared_backend, _shared_location = SHARED_CACHE_BACKENDS[SHARED_CACHE]
+
+# {% cache %} fragments of reference content (marker cards, quiz symptom rows) get
+# their own cache so they don't evict report contexts from the default one. Their
+# keys include the catalog version, so stale entries are simply never read again.
+CACHES = {
+    'default': {
+        'BACKEND': _shared_backend,
+        'LOCATION': os.environ.get('SHARED_CACHE_LOCATION', _shared_location),
+        'KEY_PREFIX': 'bloodapp',
+    },
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template-fragments',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+FRAGMENT_CACHE_TIMEOUT = 86400
+
+# Per-process LRU tier of bloodapp.cache: entries kept, and seconds before a
+# local entry is re-read from the shared cache.
+TWO_TIER_CACHE_LOCAL_MAX_ENTRIES = int(os.environ.get('CACHE_LOCAL_MAX_ENTRIES', '1000'))
+TWO_TIER_CACHE_LOCAL_TIMEOUT = int(os.environ.get('CACHE_LOCAL_TIMEOUT', '300'))
+
+# Session storage (SESSION_STORE): 'db', 'cached_db' (reads served from the
+# default cache, writes go through to the DB), 'cache' or 'signed_cookies' (no
+# server-side storage; the session only holds IDs and the unit preference, stage
+# payloads stay in AIAnalysisResult). The cache-backed stores need a cache every
+# worker and instance shares (SHARED_CACHE=redis): with a per-process or
+# per-host cache a worker keeps serving a session another one has changed or
+# flushed (logout, stage progress). Default: 'cached_db' with Redis, else 'db'.
+SESSION_STORE = os.environ.get('SESSION_STORE') or ('cached_db' if SHARED_CACHE == 'redis' else 'db')
+if SESSION_STORE in ('cached_db', 'cache') and SHARED_CACHE != 'redis':
+    raise ImproperlyConfigured(
+        f"SESSION_STORE={SESSION_STORE} needs SHARED_CACHE=redis; the {SHARED_CACHE} cache is not shared by "
+        "every worker, so sessions changed or flushed by one would still be served by another")
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + SESSION_STORE
@@ -31,6 +31,7 @@ DATABASES = {
         'PORT': os.environ.get('DB_PORT', '5432'),
     }
 }
+configure_db_connections(DATABASES['default'])
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
@@ -38,9 +39,32 @@ DATABASES = {
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
-# Add whitenoise for static file serving
+# Add whitenoise for static file serving. collectstatic writes content-hashed
+# copies of every asset (bloodapp/css/base.css -> base.<hash>.css) plus gzip and,
+# with the Brotli package installed, .br variants; WhiteNoise serves the hashed
+# names with a one-year immutable Cache-Control and picks the variant from
+# Accept-Encoding. WHITENOISE_MAX_AGE only applies to unhashed URLs.
 MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+WHITENOISE_MAX_AGE = int(os.environ.get('WHITENOISE_MAX_AGE', '3600'))
+
+# Templates: always use the cached loader (independent of DEBUG), and compile
+# every bloodapp template when the WSGI app loads (see bloodapp.template_warmup).
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+TEMPLATE_PREWARM = os.environ.get('TEMPLATE_PREWARM', 'True').lower() == 'true'
 
 # Security settings
 SECURE_BROWSER_XSS_FILTER = True
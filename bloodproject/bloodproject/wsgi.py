@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bloodproject.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, 'TEMPLATE_PREWARM', False):
+    # Compile templates now rather than on each worker's first requests; with
+    # gunicorn --preload this runs once in the master, before the workers fork.
+    from bloodapp.template_warmup import prewarm_templates  # noqa: E402
+
+    prewarm_templates()
@@ -15,6 +15,12 @@ python manage.py migrate
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
+# Delete cached report PDFs past their retention (REPORT_PDF_MAX_AGE / REPORT_PDF_MAX_FILES)
+echo "Pruning cached report PDFs..."
+python manage.py prune_report_pdfs
+
 # Start the application
 echo "Starting application..."
-exec gunicorn --bind 0.0.0.0:8080 --workers 2 --timeout 120 bloodproject.wsgi:application
+# Worker mode, counts and preloading are set in gunicorn.conf.py from the
+# environment (GUNICORN_MODE, ASGI, WEB_CONCURRENCY, GUNICORN_PRELOAD, ...).
+exec gunicorn --config gunicorn.conf.py
@@ -0,0 +1,175 @@
+"""
+Gunicorn configuration, sized from the container it runs in.
+
+Worker mode (GUNICORN_MODE):
+
+- ``sync``: one request per worker process (bloodproject.wsgi).
+- ``gthread``: GUNICORN_THREADS threads per worker (bloodproject.wsgi); threads
+  mostly wait on the LLM, so a few workers with several threads each go a long
+  way in little memory.
+- ``uvicorn``: event-loop workers serving bloodproject.asgi; the async
+  LLM-bound views wait on the LLM without holding a worker or a thread.
+
+The default is ``uvicorn`` when ASGI=true and ``sync`` otherwise. Worker
+counts come from the CPUs and memory the cgroup actually grants (Cloud Run
+caps both), unless WEB_CONCURRENCY / GUNICORN_WORKERS is set. The app is
+preloaded in the master (GUNICORN_PRELOAD, default on) with templates and
+catalog reference data built before forking, so workers share them
+copy-on-write; workers are recycled after max_requests +/- jitter.
+
+Workers write their metrics to METRICS_DIR (default: a directory under the
+system temp dir), which /metrics aggregates; the hooks below reset it at
+startup and keep the counts of exited workers (bloodapp.metrics). Each worker
+runs its first readiness checks (bloodapp.health) before it accepts requests.
+
+``python manage.py benchmark_servers`` compares the modes under load.
+"""
+
+import gc
+import math
+import os
+import tempfile
+
+MODES = {
+    'sync': ('sync', 'bloodproject.wsgi:application'),
+    'gthread': ('gthread', 'bloodproject.wsgi:application'),
+    'uvicorn': ('uvicorn.workers.UvicornWorker', 'bloodproject.asgi:application'),
+}
+
+
+def _env_int(name, default=None):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def _env_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def available_cpus():
+    """CPUs this process may use: the affinity mask, capped by a cgroup CPU quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = period = None
+    cpu_max = _read('/sys/fs/cgroup/cpu.max')  # cgroup v2: "<quota|max> <period>"
+    if cpu_max:
+        fields = cpu_max.split()
+        if fields[0] != 'max':
+            quota, period = int(fields[0]), int(fields[1])
+    else:  # cgroup v1
+        v1_quota, v1_period = _read('/sys/fs/cgroup/cpu/cpu.cfs_quota_us'), _read('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+        if v1_quota and v1_period and int(v1_quota) > 0:
+            quota, period = int(v1_quota), int(v1_period)
+    if quota and period:
+        cpus = min(cpus, max(1, math.ceil(quota / period)))
+    return max(1, cpus)
+
+
+def available_memory_mb():
+    """Memory limit of the cgroup, or physical memory when unlimited."""
+    physical = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        value = _read(path)
+        if value and value.isdigit():
+            return min(physical, int(value) // (1024 * 1024))
+    return physical
+
+
+def default_workers(mode, cpus, memory_mb, worker_memory_mb):
+    """Workers per mode from the CPU count, capped by what fits in memory."""
+    if mode == 'sync':
+        by_cpu = 2 * cpus + 1
+    elif mode == 'gthread':
+        by_cpu = cpus + 1
+    else:
+        by_cpu = cpus
+    # Keep a fifth of the memory for the master, page cache and per-request peaks
+    by_memory = max(1, int(memory_mb * 0.8) // worker_memory_mb)
+    return max(1, min(by_cpu, by_memory))
+
+
+mode = os.environ.get('GUNICORN_MODE') or ('uvicorn' if _env_bool('ASGI', False) else 'sync')
+if mode not in MODES:
+    raise ValueError(f"Unknown GUNICORN_MODE {mode!r}; expected one of {', '.join(MODES)}")
+worker_class, wsgi_app = MODES[mode]
+
+cpus = available_cpus()
+memory_mb = available_memory_mb()
+workers = _env_int('GUNICORN_WORKERS', _env_int('WEB_CONCURRENCY')) or default_workers(
+    mode, cpus, memory_mb, _env_int('GUNICORN_WORKER_MEMORY_MB', 150))
+threads = _env_int('GUNICORN_THREADS', 8) if mode == 'gthread' else 1
+
+bind = os.environ.get('GUNICORN_BIND') or f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+timeout = _env_int('GUNICORN_TIMEOUT', 120)
+graceful_timeout = 30
+keepalive = 5
+preload_app = _env_bool('GUNICORN_PRELOAD', True)
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', max(1, max_requests // 10) if max_requests else 0)
+accesslog = os.environ.get('GUNICORN_ACCESSLOG') or None
+
+# Set before the app is loaded, so the workers' settings see it too
+metrics_dir = os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'bloodapp-metrics'))
+
+
+def on_starting(server):
+    from bloodapp.metrics import clear_metrics_dir
+
+    os.makedirs(metrics_dir, exist_ok=True)
+    clear_metrics_dir(metrics_dir)
+
+
+def when_ready(server):
+    server.log.info('Mode %s: %d worker(s) x %d thread(s), %s (%d CPU(s), %d MB)',
+                    mode, workers, threads, worker_class, cpus, memory_mb)
+    if not preload_app:
+        return
+    # Build the catalog reference data in the master so every worker inherits it
+    from bloodapp.db_connections import close_connections_before_fork
+
+    try:
+        from bloodapp.associations import get_association_matrix
+        from bloodapp.matching import get_condition_matcher
+
+        get_condition_matcher()
+        get_association_matrix()
+    except Exception:
+        server.log.exception('Could not preload catalog reference data')
+    finally:
+        # Forked workers must not share the master's DB sockets or connection pool
+        close_connections_before_fork()
+    # Move everything loaded so far out of the GC's reach, so collections in
+    # the workers don't write to (and un-share) the inherited pages
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # Before the worker accepts requests: its first /readyz probe gets a real result, not "starting"
+    from bloodapp.health import start_readiness_checks
+
+    if not start_readiness_checks():
+        worker.log.warning('First readiness checks did not finish in time; /readyz reports "starting"')
+
+
+def worker_exit(server, worker):
+    from bloodapp.llm_usage import flush_llm_usage
+    from bloodapp.metrics import write_snapshot
+
+    write_snapshot(metrics_dir)
+    flush_llm_usage()
+
+
+def child_exit(server, worker):
+    from bloodapp.metrics import mark_process_dead
+
+    mark_process_dead(worker.pid, metrics_dir)